@@ -0,0 +1,203 @@
+"""
+Endpoint benchmark suite.
+
+Every GET route of the API router, plus the representative catalog
+queries of the index advisor, is requested against a dataset seeded by
+`ScaleSeeder`. For each endpoint the suite records:
+
+- the number of SQL queries (cold: the cache is emptied before every request)
+- p50 / p95 latency over repeated requests
+- peak memory allocated while serving one request (tracemalloc)
+
+Results are compared with a JSON baseline. Any extra query fails, as does
+latency or memory beyond the baseline's relative budget plus a small
+absolute slack that absorbs timer noise on fast endpoints. p95 gets a
+wider budget than p50 since a single slow request can move it.
+"""
+import gc
+import json
+import math
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.permissions import IsAuthenticated
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+BASELINE_PATH = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+# Relative budgets on top of the baseline, and absolute slack for tiny numbers
+DEFAULT_BUDGET = {
+    'queries': 0,
+    'latency': 0.5,  # on p50
+    'tail_latency': 1.0,  # on p95, which a single slow request can move
+    'latency_slack_ms': 5.0,
+    'memory': 0.25,
+    'memory_slack_kb': 64,
+}
+
+BENCHMARK_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'endpoint-benchmarks',
+}}
+
+
+def benchmark_user():
+    """A seeded customer with a cart, orders and a wishlist when there is one"""
+    users = get_user_model().objects.order_by('pk')
+    return (
+        users.filter(cart__items__isnull=False, orders__isnull=False, wishlist_items__isnull=False).first()
+        or users.first()
+    )
+
+
+def sample_lookup(viewset, user):
+    """Lookup value of an object the viewset's detail route can serve, or None"""
+    queryset = getattr(viewset, 'queryset', None)
+    if queryset is None:
+        serializer_class = getattr(viewset, 'serializer_class', None)
+        if serializer_class is None:
+            return None
+        queryset = serializer_class.Meta.model._default_manager.all()
+    if any(field.name == 'user' for field in queryset.model._meta.fields):
+        queryset = queryset.filter(user=user)
+    instance = queryset.order_by('pk').first()
+    return getattr(instance, viewset.lookup_field or 'pk') if instance else None
+
+
+def router_paths(user):
+    """(name, path, authenticated) for every GET route registered on the API router"""
+    from config.urls import router
+
+    paths = []
+    for prefix, viewset, basename in router.registry:
+        authenticated = any(
+            issubclass(permission, IsAuthenticated) for permission in viewset.permission_classes
+        )
+        for route in router.get_routes(viewset):
+            # Action mappings are MethodMappers, whose .get() is a decorator
+            handler = dict(route.mapping).get('get')
+            if handler is None or not hasattr(viewset, handler):
+                continue
+            lookup = ''
+            if '{lookup}' in route.url:
+                lookup = sample_lookup(viewset, user)
+                if lookup is None:
+                    continue
+            url = route.url.format(prefix=prefix, lookup=lookup, trailing_slash='/')
+            paths.append((route.name.format(basename=basename), f'/api/{url.strip("^$")}', authenticated))
+    return paths
+
+
+def endpoint_paths(user):
+    """Router routes plus the catalog queries the index advisor replays"""
+    from products.index_advisor import representative_paths
+
+    paths = router_paths(user)
+    seen = {path for _, path, _ in paths}
+    for path in representative_paths():
+        if path not in seen and '?' in path:
+            seen.add(path)
+            paths.append((path.split('/api/', 1)[1], path, False))
+    return paths
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def measure(client, path, repeat, headers):
+    """Query count, latency percentiles and peak memory of one endpoint"""
+    timings, queries, status = [], None, None
+    for _ in range(repeat):
+        cache.clear()
+        # Like timeit: a collection triggered by earlier garbage is not this endpoint's cost
+        gc.collect()
+        gc.disable()
+        try:
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(path, **headers)
+                timings.append(time.perf_counter() - started)
+        finally:
+            gc.enable()
+        if queries is None:
+            queries, status = len(captured), response.status_code
+
+    cache.clear()
+    tracemalloc.start()
+    try:
+        client.get(path, **headers)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': status,
+        'queries': queries,
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        'peak_kb': round(peak / 1024),
+    }
+
+
+def run_benchmarks(repeat=20, progress=None):
+    """Benchmark every endpoint against the current database; returns {name: result}"""
+    user = benchmark_user()
+    authorization = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+    client = Client(HTTP_HOST='localhost')
+    results = {}
+
+    with override_settings(CACHES=BENCHMARK_CACHES):
+        for name, path, authenticated in endpoint_paths(user):
+            # Public endpoints run anonymously, like most catalog traffic
+            headers = authorization if authenticated else {}
+            client.get(path, **headers)  # warm up imports and lazy singletons
+            results[name] = dict(measure(client, path, repeat, headers), path=path)
+            if progress:
+                progress(name, results[name])
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def write_baseline(results, meta, path=BASELINE_PATH, budget=None):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    baseline = {'meta': meta, 'budget': budget or DEFAULT_BUDGET, 'endpoints': results}
+    path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+
+
+def compare(results, baseline, metrics=('status', 'queries', 'latency', 'memory')):
+    """Return a list of human-readable budget violations"""
+    budget = dict(DEFAULT_BUDGET, **baseline.get('budget', {}))
+    violations = []
+    for name, result in sorted(results.items()):
+        base = baseline['endpoints'].get(name)
+        if base is None:
+            continue
+        if 'status' in metrics and result['status'] != base['status']:
+            violations.append(f'{name}: status {result["status"]}, baseline {base["status"]}')
+        if 'queries' in metrics and result['queries'] > base['queries'] + budget['queries']:
+            violations.append(f'{name}: {result["queries"]} queries, budget {base["queries"] + budget["queries"]}')
+        if 'latency' in metrics:
+            for key, share in (('p50_ms', budget['latency']), ('p95_ms', budget['tail_latency'])):
+                limit = base[key] * (1 + share) + budget['latency_slack_ms']
+                if result[key] > limit:
+                    violations.append(f'{name}: {key[:3]} {result[key]:.1f} ms, budget {limit:.1f} ms')
+        if 'memory' in metrics:
+            limit = base['peak_kb'] * (1 + budget['memory']) + budget['memory_slack_kb']
+            if result['peak_kb'] > limit:
+                violations.append(f'{name}: peak {result["peak_kb"]} KB, budget {limit:.0f} KB')
+    return violations
@@ -0,0 +1,54 @@
+"""
+Media URLs for API payloads.
+
+Serializers used to call request.build_absolute_uri(field.url) for every
+image, resolving the scheme and host and asking the storage for a URL each
+time. A resolver works out the media prefix once per request, either the
+configured MEDIA_BASE_URL (e.g. a CDN) or the request's absolute MEDIA_URL,
+and memoizes the URL of every storage name it has seen.
+"""
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.encoding import filepath_to_uri
+
+
+class MediaURLResolver:
+    """Callable turning a storage name into the URL the API emits"""
+
+    def __init__(self, request=None, storage=None):
+        self.request = request
+        self.storage = storage or default_storage
+        self.urls = {}
+        base_url = settings.MEDIA_BASE_URL
+        if base_url:
+            self.prefix = base_url if base_url.endswith('/') else base_url + '/'
+        elif isinstance(self.storage, FileSystemStorage):
+            # FileSystemStorage.url() is base_url + quoted name
+            self.prefix = self.absolute(self.storage.base_url)
+        else:
+            # Other storages may sign or otherwise vary their URLs per name
+            self.prefix = None
+
+    def absolute(self, url):
+        return self.request.build_absolute_uri(url) if self.request is not None else url
+
+    def __call__(self, name):
+        url = self.urls.get(name)
+        if url is None:
+            if self.prefix is not None:
+                url = self.prefix + filepath_to_uri(name).lstrip('/')
+            else:
+                url = self.absolute(self.storage.url(name))
+            self.urls[name] = url
+        return url
+
+
+def media_url_resolver(request=None):
+    """Return the resolver shared by all serializers of a request"""
+    if request is None:
+        return MediaURLResolver()
+    http_request = getattr(request, '_request', request)
+    resolver = getattr(http_request, '_media_url_resolver', None)
+    if resolver is None:
+        resolver = http_request._media_url_resolver = MediaURLResolver(request)
+    return resolver
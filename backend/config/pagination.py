@@ -0,0 +1,158 @@
+"""
+Shared pagination classes.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Model, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination by default, keyset (cursor) pagination on request.
+
+    `?page=N` works as before for the web UI. Passing `?cursor=` (empty to
+    start) switches to keyset mode: the queryset's ordering plus the primary
+    key as tie-breaker forms the key, and each page is fetched with
+    `WHERE (key) > (last key) ... LIMIT n`. Keyset pages skip the COUNT(*)
+    and the OFFSET, so deep pages cost the same as the first one when a
+    matching (ordering, id) index exists.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.base_url = request.build_absolute_uri()
+
+        reverse, position = self.decode_cursor(request)
+        if position is not None:
+            position = self.clean_position(queryset, position)
+        ordering = [self.invert(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        # Walking backwards there is always a next page and maybe a previous one
+        has_next = True if reverse else has_more
+        has_previous = has_more if reverse else position is not None
+        self.next_position = self.position(results[-1]) if results and has_next else None
+        self.previous_position = self.position(results[0]) if results and has_previous else None
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.encode_cursor(self.next_position, reverse=False)),
+            ('previous', self.encode_cursor(self.previous_position, reverse=True)),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties'].pop('count')
+        return schema
+
+    # Keyset helpers
+
+    def get_ordering(self, queryset):
+        """The queryset ordering, made unique with the primary key"""
+        ordering = [
+            field for field in (queryset.query.order_by or queryset.model._meta.ordering)
+            if isinstance(field, str)
+        ]
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            descending = ordering[-1].startswith('-') if ordering else False
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def after(ordering, position):
+        """Q for rows strictly after `position` in `ordering`"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def position(self, instance):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if isinstance(value, Model):
+                value = value.pk
+            values.append(value if isinstance(value, (int, float, bool, type(None))) else str(value))
+        return values
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if cursor['o'] != self.ordering:
+                raise ValueError('ordering changed')
+            if not isinstance(cursor['p'], list) or len(cursor['p']) != len(self.ordering):
+                raise ValueError('malformed position')
+            return bool(cursor['r']), cursor['p']
+        except (TypeError, ValueError, KeyError):
+            raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+
+    def clean_position(self, queryset, position):
+        """Convert the cursor values to the Python types of their ordering fields"""
+        opts = queryset.model._meta
+        cleaned = []
+        try:
+            for field, value in zip(self.ordering, position):
+                name = field.lstrip('-')
+                if value is None:
+                    raise ValueError('null position')
+                if name in queryset.query.annotations:
+                    target = queryset.query.annotations[name].output_field
+                else:
+                    try:
+                        target = opts.pk if name == 'pk' else opts.get_field(name)
+                    except FieldDoesNotExist:
+                        # Lookups across relations are compared as sent
+                        cleaned.append(value)
+                        continue
+                    if target.is_relation:
+                        target = target.target_field
+                cleaned.append(target.to_python(value))
+        except (TypeError, ValueError, DjangoValidationError):
+            raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+        return cleaned
+
+    def encode_cursor(self, position, reverse):
+        if position is None:
+            return None
+        cursor = {'o': self.ordering, 'p': position, 'r': int(reverse)}
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        url = remove_query_param(self.base_url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.timing.ServerTimingMiddleware',  # first, so its total covers the others
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS should be at the top
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -99,6 +100,20 @@ DATABASES = {
 }
 
 
+# Cache
+# Local memory by default, which only suits a single process (runserver,
+# tests). With several workers, point CACHE_BACKEND/CACHE_LOCATION at Redis or
+# Memcached: catalog version stamps live in this cache, and a worker only
+# sees the bumps of other workers through a shared backend.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='brand-store'),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -139,6 +154,15 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Media files (uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Absolute prefix for media URLs in API payloads, e.g. a CDN
+# (https://cdn.example.com/media/); empty means the request's host + MEDIA_URL
+MEDIA_BASE_URL = config('MEDIA_BASE_URL', default='')
+
+# Sized WebP/JPEG derivatives of product images (see products/images.py):
+# 'background' renders them in a process pool after upload, 'inline' within
+# the request, 'off' leaves them to the generate_image_derivatives command
+IMAGE_DERIVATIVES = config('IMAGE_DERIVATIVES', default='background')
+IMAGE_DERIVATIVE_WORKERS = config('IMAGE_DERIVATIVE_WORKERS', default=2, cast=int)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -170,6 +194,56 @@ REST_FRAMEWORK = {
 }
 
 
+# ================================
+# Catalog Caching
+# ================================
+# Cached catalog responses are versioned and invalidated on every catalog
+# change, so the timeout only bounds how long unused entries are kept.
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=60 * 60, cast=int)
+# With a process-local cache backend (locmem, dummy) a change made by another
+# worker goes unseen, so cached responses and per-process copies (category
+# tree, search index, listing snapshot) are kept this many seconds at most
+# and conditional GETs are not answered with 304.
+CATALOG_LOCAL_CACHE_TIMEOUT = config('CATALOG_LOCAL_CACHE_TIMEOUT', default=5, cast=int)
+
+
+# ================================
+# Product View Counter
+# ================================
+# Product views are buffered per process and written in batches by a
+# background thread when the interval elapses or too many products are
+# pending (0 writes every view in the request that records it).
+VIEW_COUNT_FLUSH_INTERVAL = config('VIEW_COUNT_FLUSH_INTERVAL', default=30, cast=int)
+VIEW_COUNT_MAX_PENDING = 1000
+
+
+# ================================
+# Product Search
+# ================================
+# 'auto' picks SQLite FTS5 or PostgreSQL tsvector from the database engine
+# and falls back to the in-process index ('python') elsewhere.
+PRODUCT_SEARCH_BACKEND = config('PRODUCT_SEARCH_BACKEND', default='auto')
+# The in-process index ranks this many best matches individually; further
+# matches are still returned, tied after them
+PRODUCT_SEARCH_MAX_RESULTS = 1000
+
+# Lower bounds (UZS) of the price ranges reported by /api/products/facets/
+PRODUCT_PRICE_BUCKETS = [0, 50000, 100000, 200000, 500000]
+
+# Filter, order and page product listings over an in-process NumPy snapshot
+# of the active catalog (see products/snapshot.py), kept in step with the
+# catalog version; other workers' changes need a shared cache to be seen
+CATALOG_SNAPSHOT = config('CATALOG_SNAPSHOT', default=False, cast=bool)
+
+
+# ================================
+# Request Timings
+# ================================
+# Share of requests (0-1) answered with a Server-Timing header (db, serialize,
+# render, total) and logged to config.timing; 0 disables the middleware.
+SERVER_TIMING_SAMPLE_RATE = config('SERVER_TIMING_SAMPLE_RATE', default=0.0, cast=float)
+
+
 # ================================
 # JWT Configuration
 # ================================
@@ -191,6 +265,8 @@ CORS_ALLOWED_ORIGINS = [
     'http://127.0.0.1:3000',
 ]
 CORS_ALLOW_CREDENTIALS = True
+# Let browser clients revalidate catalog responses
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified']
 
 
 # ================================
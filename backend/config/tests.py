@@ -0,0 +1,171 @@
+import csv
+import io
+import json
+import shutil
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from products.models import Product
+from products.seeding import ScaleSeeder
+
+from .benchmarks import compare, load_baseline, run_benchmarks
+from .exports import ExportView
+from .timing import current_timings
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_DERIVATIVES='off')
+class EndpointQueryBudgetTests(TestCase):
+    """Every API endpoint stays within the query counts of benchmarks/baseline.json"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_query_budgets(self):
+        baseline = load_baseline()
+        meta = baseline['meta']
+        ScaleSeeder(meta['scale'], seed=meta['seed'], log=lambda message: None).run()
+
+        # Timings are left to the benchmark_endpoints command: they depend on the machine
+        results = run_benchmarks(repeat=1)
+        self.assertEqual(compare(results, baseline, metrics=('status', 'queries')), [])
+        self.assertEqual(
+            sorted(set(results) - set(baseline['endpoints'])), [],
+            'New endpoints: record them with "manage.py benchmark_endpoints --update"'
+        )
+
+
+class ServerTimingTests(TestCase):
+    """Sampled requests carry db, serialize and render timings"""
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_sampled_request(self):
+        with self.assertLogs('config.timing', 'INFO') as logs:
+            response = self.client.get('/api/products/')
+
+        spans = {span.split(';')[0]: span for span in response['Server-Timing'].split(', ')}
+        self.assertEqual(list(spans), ['db', 'serialize', 'render', 'total'])
+        record = logs.records[0]
+        self.assertGreater(record.db_queries, 0)
+        self.assertIn(f'desc="{record.db_queries} queries"', spans['db'])
+        self.assertGreater(record.serialize_ms, 0)
+        self.assertGreater(record.render_ms, 0)
+        self.assertEqual(record.path, '/api/products/')
+        self.assertIsNone(current_timings.get())
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_disabled(self):
+        response = self.client.get('/api/products/')
+        self.assertNotIn('Server-Timing', response)
+
+
+class ExportTests(TestCase):
+    """Staff exports stream every selected row as CSV or NDJSON"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.staff = User.objects.create_superuser(username='staff', email='staff@example.com', password='x')
+        cls.customer = User.objects.create_user(username='customer', email='customer@example.com', password='x')
+        cls.old = Product.objects.create(name='Old tee', description='Tee', price=Decimal('10.00'))
+        cls.new = Product.objects.create(name='Ваза, "new"', description='Vase', price=Decimal('25.50'),
+                                         discount_percentage=10)
+        Product.objects.filter(pk=cls.old.pk).update(created_at=datetime(2026, 1, 1, 12, 0, tzinfo=dt_timezone.utc))
+        Product.objects.filter(pk=cls.new.pk).update(created_at=datetime(2026, 3, 1, 12, 0, tzinfo=dt_timezone.utc))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def body(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def assertAttachment(self, response, extension):
+        disposition = response['Content-Disposition']
+        self.assertTrue(disposition.startswith('attachment; filename="products-'), disposition)
+        self.assertTrue(disposition.endswith(f'.{extension}"'), disposition)
+
+    def test_csv(self):
+        response = self.client.get('/api/exports/products.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertAttachment(response, 'csv')
+
+        rows = list(csv.DictReader(io.StringIO(self.body(response))))
+        self.assertEqual([row['name'] for row in rows], ['Old tee', 'Ваза, "new"'])
+        self.assertEqual((rows[1]['price'], rows[1]['effective_price']), ('25.50', '22.95'))
+        self.assertEqual(rows[0]['created_at'], '2026-01-01T12:00:00+00:00')
+
+    def test_ndjson(self):
+        response = self.client.get('/api/exports/products.ndjson', {'since': '2026-02-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertAttachment(response, 'ndjson')
+
+        lines = self.body(response).splitlines()
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual((row['id'], row['name'], row['price']), (self.new.pk, 'Ваза, "new"', '25.50'))
+        self.assertEqual(row['created_at'], '2026-03-01T12:00:00Z')
+
+    def test_time_bounds(self):
+        for params, names in (
+            ({'until': '2026-02-01T00:00:00'}, ['Old tee']),
+            ({'since': '2026-03-01T12:00:00+00:00'}, ['Ваза, "new"']),
+            ({'since': '2026-03-01T12:00:01Z'}, []),
+        ):
+            with self.subTest(**params):
+                response = self.client.get('/api/exports/products.csv', params)
+                rows = list(csv.DictReader(io.StringIO(self.body(response))))
+                self.assertEqual([row['name'] for row in rows], names)
+
+    def test_bad_requests(self):
+        for param, value in (('since', 'yesterday'), ('until', '2026-13-01')):
+            with self.subTest(**{param: value}):
+                response = self.client.get('/api/exports/products.csv', {param: value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(param, response.json())
+        self.assertEqual(self.client.get('/api/exports/products.xml').status_code, 404)
+        self.assertEqual(self.client.get('/api/exports/users.csv').status_code, 404)
+
+    def test_parse_moment(self):
+        # Naive values are read in the current time zone
+        self.assertEqual(
+            ExportView.parse_moment('since', '2026-02-01'),
+            datetime(2026, 2, 1, tzinfo=dt_timezone.utc)
+        )
+        with self.assertRaises(ValidationError):
+            ExportView.parse_moment('since', '2026-02-30T10:00')
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/exports/products.csv').status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/exports/products.csv').status_code, 401)
+
+    def test_admin_actions(self):
+        self.client.force_login(self.staff)
+        for action, extension in (('export_csv', 'csv'), ('export_ndjson', 'ndjson')):
+            with self.subTest(action=action):
+                response = self.client.post('/admin/products/product/', {
+                    'action': action, '_selected_action': [self.old.pk]
+                })
+                self.assertEqual(response.status_code, 200)
+                self.assertAttachment(response, extension)
+                body = self.body(response)
+                self.assertIn('Old tee', body)
+                self.assertNotIn('Ваза', body)
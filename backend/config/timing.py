@@ -0,0 +1,134 @@
+"""
+Per-request timings in a Server-Timing header.
+
+For a sampled share of requests (SERVER_TIMING_SAMPLE_RATE) the middleware
+measures:
+
+- db: query count and total SQL time, through connection.execute_wrapper
+- serialize: time spent in the outermost `serializer.data` of the request
+- render: time the response's renderer takes (DRF and template responses)
+- total: the whole request as seen by the middleware
+
+They are sent as `Server-Timing: db;dur=4.2;desc="3 queries", ...` and
+logged to `config.timing` with the numbers as structured `extra` fields.
+Spans may overlap: SQL run by lazy querysets during serialization counts
+towards both db and serialize.
+
+Unsampled requests only cost a random() call; with a rate of 0 the
+middleware removes itself.
+"""
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+# Timings of the sampled request being served, None otherwise
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    """Query count and accumulated seconds per span of one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.durations = {'db': 0.0, 'serialize': 0.0, 'render': 0.0}
+        self.depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += time.perf_counter() - started
+            self.queries += 1
+
+    def header(self, total):
+        spans = [f'db;dur={self.durations["db"] * 1000:.1f};desc="{self.queries} queries"']
+        spans += [f'{name};dur={self.durations[name] * 1000:.1f}' for name in ('serialize', 'render')]
+        spans.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(spans)
+
+    def fields(self, total):
+        fields = {f'{name}_ms': round(seconds * 1000, 2) for name, seconds in self.durations.items()}
+        fields.update(db_queries=self.queries, total_ms=round(total * 1000, 2))
+        return fields
+
+
+def timed_data(data):
+    """Wrap the BaseSerializer.data getter to time the outermost call"""
+
+    def get_data(serializer):
+        timings = current_timings.get()
+        if timings is None:
+            return data(serializer)
+        # Serializer.data calls BaseSerializer.data, and views may nest serializers
+        timings.depth += 1
+        started = time.perf_counter()
+        try:
+            return data(serializer)
+        finally:
+            timings.depth -= 1
+            if not timings.depth:
+                timings.durations['serialize'] += time.perf_counter() - started
+    get_data.timed = True
+    return get_data
+
+
+def instrument_serializers():
+    if not getattr(BaseSerializer.data.fget, 'timed', False):
+        BaseSerializer.data = property(timed_data(BaseSerializer.data.fget))
+
+
+class ServerTimingMiddleware:
+    """Adds a Server-Timing header and a log record to sampled requests"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.SERVER_TIMING_SAMPLE_RATE
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        instrument_serializers()
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = timings.header(total)
+        logger.info(
+            '%s %s %s', request.method, request.path, response.status_code,
+            extra=dict(timings.fields(total), method=request.method, path=request.path,
+                       status=response.status_code)
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        """Time rendering from here, just before render(), to its post-render callbacks"""
+        timings = current_timings.get()
+        if timings is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                timings.durations['render'] += time.perf_counter() - started
+            response.add_post_render_callback(rendered)
+        return response
@@ -14,10 +14,15 @@ from products.views import (
     ColorViewSet,
     SizeViewSet,
     ProductViewSet,
-    ReviewViewSet
+    ReviewViewSet,
+    HomeViewSet
 )
 from orders.views import CartViewSet, OrderViewSet, PromoCodeViewSet
 from wishlist.views import WishlistViewSet
+from products.exports import PRODUCT_EXPORT
+from orders.exports import ORDER_EXPORT
+from payments.exports import PAYMENT_EXPORT
+from config.exports import ExportView
 from payments.views import (
     initiate_payment,
     click_prepare,
@@ -35,6 +40,7 @@ router.register(r'colors', ColorViewSet, basename='color')
 router.register(r'sizes', SizeViewSet, basename='size')
 router.register(r'products', ProductViewSet, basename='product')
 router.register(r'reviews', ReviewViewSet, basename='review')
+router.register(r'home', HomeViewSet, basename='home')
 
 # Cart and Orders routes
 router.register(r'cart', CartViewSet, basename='cart')
@@ -65,6 +71,13 @@ urlpatterns = [
     path('api/payments/click/prepare/', click_prepare, name='click-prepare'),
     path('api/payments/click/complete/', click_complete, name='click-complete'),
     path('api/payments/payme/callback/', payme_callback, name='payme-callback'),
+
+    # Staff exports (streamed CSV / NDJSON)
+    path(
+        'api/exports/<str:name>.<str:export_format>',
+        ExportView.as_view(exports=(PRODUCT_EXPORT, ORDER_EXPORT, PAYMENT_EXPORT)),
+        name='export'
+    ),
 ]
 
 # Media files (only in development)
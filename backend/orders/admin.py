@@ -1,5 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from config.exports import ExportAdminMixin
+from .exports import ORDER_EXPORT
 from .models import Order, OrderItem, PromoCode, Cart, CartItem
 
 
@@ -11,7 +13,7 @@ class OrderItemInline(admin.TabularInline):
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ExportAdminMixin, admin.ModelAdmin):
     """Admin for Order model"""
 
     list_display = (
@@ -77,11 +79,15 @@ class OrderAdmin(admin.ModelAdmin):
 
     ordering = ('-created_at',)
 
+    export = ORDER_EXPORT
+
     actions = [
         'mark_as_processing',
         'mark_as_shipped',
         'mark_as_delivered',
-        'mark_as_completed'
+        'mark_as_completed',
+        'export_csv',
+        'export_ndjson'
     ]
 
     def mark_as_processing(self, request, queryset):
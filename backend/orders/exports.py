@@ -0,0 +1,26 @@
+from config.exports import Export
+
+from .models import Order
+
+
+ORDER_EXPORT = Export('orders', Order, (
+    ('id', 'id'),
+    ('order_number', 'order_number'),
+    ('user_email', 'user__email'),
+    ('full_name', 'full_name'),
+    ('email', 'email'),
+    ('phone_number', 'phone_number'),
+    ('city', 'city'),
+    ('postal_code', 'postal_code'),
+    ('status', 'status'),
+    ('payment_status', 'payment_status'),
+    ('payment_method', 'payment_method'),
+    ('subtotal', 'subtotal'),
+    ('discount_amount', 'discount_amount'),
+    ('total', 'total'),
+    ('payment_transaction_id', 'payment_transaction_id'),
+    ('created_at', 'created_at'),
+    ('paid_at', 'paid_at'),
+    ('shipped_at', 'shipped_at'),
+    ('delivered_at', 'delivered_at'),
+))
@@ -1,14 +1,30 @@
 from rest_framework import serializers
+
+from config.fastpath import CompiledListSerializer, decimal_formatter, format_datetime
+
 from .models import Order, OrderItem, PromoCode, Cart, CartItem
-from products.serializers import ProductListSerializer
+from products.serializers import ProductListSerializer, SparseFieldsMixin
 
 
 # ============================================
 # CART SERIALIZERS
 # ============================================
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for cart items"""
+    expandable_fields = {
+        'product': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+    }
+    related_lookups = {
+        'product': ('select', 'product'),
+        'unit_price': ('select', 'product'),
+        'total_price': ('select', 'product'),
+        'color_name': ('select', 'color'),
+        'size_name': ('select', 'size'),
+    }
+    nested_serializers = {
+        'product': ProductListSerializer,
+    }
     product = ProductListSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
     color_id = serializers.IntegerField(required=False, allow_null=True)
@@ -97,6 +113,57 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'subtotal')
 
 
+class CompiledOrderListSerializer(CompiledListSerializer):
+    """Renders order listings without DRF's per-field machinery"""
+
+    def compile(self):
+        money = decimal_formatter(10, 2)
+
+        def text(value):
+            return None if value is None else str(value)
+
+        def render(order):
+            return {
+                'id': order.pk,
+                'order_number': str(order.order_number),
+                'user': order.user_id,
+                'email': order.email,
+                'phone_number': order.phone_number,
+                'full_name': order.full_name,
+                'address': order.address,
+                'city': order.city,
+                'postal_code': order.postal_code,
+                'status': order.status,
+                'payment_status': order.payment_status,
+                'payment_method': order.payment_method,
+                'subtotal': money(order.subtotal),
+                'discount_amount': money(order.discount_amount),
+                'total': money(order.total),
+                'payment_transaction_id': text(order.payment_transaction_id),
+                'customer_notes': text(order.customer_notes),
+                'items': [
+                    {
+                        'id': item.pk,
+                        'product_name': item.product_name,
+                        'product_price': money(item.product_price),
+                        'color': item.color,
+                        'size': item.size,
+                        'quantity': item.quantity,
+                        'discount_percentage': item.discount_percentage,
+                        'subtotal': money(item.subtotal),
+                    }
+                    for item in order.items.all()
+                ],
+                'can_be_cancelled': order.can_be_cancelled,
+                'created_at': format_datetime(order.created_at),
+                'updated_at': format_datetime(order.updated_at),
+                'paid_at': format_datetime(order.paid_at),
+                'shipped_at': format_datetime(order.shipped_at),
+                'delivered_at': format_datetime(order.delivered_at),
+            }
+        return render
+
+
 class OrderSerializer(serializers.ModelSerializer):
     """Serializer for orders"""
     items = OrderItemSerializer(many=True, read_only=True)
@@ -141,6 +208,10 @@ class OrderSerializer(serializers.ModelSerializer):
             'shipped_at',
             'delivered_at'
         )
+        list_serializer_class = CompiledOrderListSerializer
+
+
+CompiledOrderListSerializer.compiled_child_class = OrderSerializer
 
 
 class OrderCreateSerializer(serializers.ModelSerializer):
@@ -1,3 +1,74 @@
+from decimal import Decimal
+
+from django.db.models import F
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from products.cache import get_version
+from products.models import Product
+from .models import Cart, CartItem, Order, OrderItem
+from .serializers import OrderSerializer
+
+
+class CompiledOrderListSerializerTests(TestCase):
+    """The compiled order listing must render exactly what DRF renders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='x')
+        paid = Order.objects.create(
+            user=user, email='buyer@example.com', phone_number='+998901234567',
+            full_name='Buyer', address='Street 1', city='Tashkent', payment_method='CLICK',
+            subtotal=Decimal('250000.00'), discount_amount=Decimal('25000.50'),
+            total=Decimal('224999.50'), payment_status='COMPLETED',
+            payment_transaction_id='tx-1', paid_at=timezone.now()
+        )
+        OrderItem.objects.create(
+            order=paid, product_name='Hoodie', product_price=Decimal('125000.00'),
+            color='Red', size='L', quantity=2, discount_percentage=10
+        )
+        Order.objects.create(
+            email='guest@example.com', phone_number='+998901234568', full_name='Guest',
+            address='Street 2', city='Samarkand', payment_method='COD',
+            subtotal=Decimal('1.00'), total=Decimal('1.00'), customer_notes=None
+        )
+
+    def test_parity(self):
+        orders = list(Order.objects.prefetch_related('items').order_by('pk'))
+        compiled = OrderSerializer(orders, many=True).data
+        generic = serializers.ListSerializer(orders, child=OrderSerializer()).data
+        self.assertEqual(JSONRenderer().render(compiled), JSONRenderer().render(generic))
+
+
+class OrderStockTests(TestCase):
+    """Checkout and cancellation adjust stock relative to the stored count"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='x')
+        self.product = Product.objects.create(name='Hoodie', description='Hoodie', price=Decimal('50.00'), stock=10)
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.product, quantity=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stock(self):
+        return Product.objects.get(pk=self.product.pk).stock
+
+    def test_checkout_and_cancel(self):
+        version = get_version('catalog')
+        response = self.client.post('/api/orders/', {
+            'payment_method': 'COD', 'phone_number': '+998901234567',
+            'address': 'Street 1', 'city': 'Tashkent', 'postal_code': '100000'
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.stock(), 8)
+        self.assertNotEqual(get_version('catalog'), version)
 
-# Create your tests here.
+        # A sale made elsewhere in the meantime is kept
+        Product.objects.filter(pk=self.product.pk).update(stock=F('stock') - 3)
+        response = self.client.post(f'/api/orders/{response.json()["id"]}/cancel/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.stock(), 7)
@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.db.models import prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
@@ -15,6 +16,8 @@ from .serializers import (
     CartItemSerializer
 )
 from products.models import Product
+from products.stock import adjust_stock
+from config.pagination import KeysetPagination
 
 
 class CartViewSet(viewsets.ViewSet):
@@ -24,6 +27,14 @@ class CartViewSet(viewsets.ViewSet):
     def list(self, request):
         """Get user's cart"""
         cart, created = Cart.objects.get_or_create(user=request.user)
+        select, prefetch = CartItemSerializer.get_lookups(request)
+        # Cart totals always need the products, whatever fields were requested
+        prefetch_related_objects(
+            [cart],
+            'promo_code',
+            'items__product',
+            *[f'items__{lookup}' for lookup in select + prefetch]
+        )
         serializer = CartSerializer(cart, context={'request': request})
         return Response(serializer.data)
 
@@ -206,12 +217,14 @@ class OrderViewSet(viewsets.ModelViewSet):
     """ViewSet for order management"""
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """Get orders for current user or all if admin"""
+        queryset = Order.objects.prefetch_related('items')
         if self.request.user.is_staff:
-            return Order.objects.all()
-        return Order.objects.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -272,7 +285,8 @@ class OrderViewSet(viewsets.ModelViewSet):
         order = Order.objects.create(**order_data)
 
         # Create order items from cart
-        for cart_item in cart.items.all():
+        cart_items = list(cart.items.all())
+        for cart_item in cart_items:
             OrderItem.objects.create(
                 order=order,
                 product=cart_item.product,
@@ -284,9 +298,8 @@ class OrderViewSet(viewsets.ModelViewSet):
                 discount_percentage=cart_item.product.discount_percentage
             )
 
-            # Reduce stock
-            cart_item.product.stock -= cart_item.quantity
-            cart_item.product.save()
+        # Reduce stock
+        adjust_stock([(cart_item.product_id, cart_item.quantity) for cart_item in cart_items], -1)
 
         # Clear cart
         cart.items.all().delete()
@@ -306,10 +319,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             )
 
         # Restore stock
-        for item in order.items.all():
-            if item.product:
-                item.product.stock += item.quantity
-                item.product.save()
+        adjust_stock(order.items.values_list('product_id', 'quantity'), 1)
 
         order.status = 'CANCELLED'
         order.payment_status = 'CANCELLED'
@@ -1,9 +1,11 @@
 from django.contrib import admin
+from config.exports import ExportAdminMixin
+from .exports import PAYMENT_EXPORT
 from .models import Payment
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(ExportAdminMixin, admin.ModelAdmin):
     """Admin for Payment model"""
 
     list_display = (
@@ -38,3 +40,6 @@ class PaymentAdmin(admin.ModelAdmin):
     )
 
     ordering = ('-created_at',)
+
+    export = PAYMENT_EXPORT
+    actions = ['export_csv', 'export_ndjson']
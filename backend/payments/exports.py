@@ -0,0 +1,16 @@
+from config.exports import Export
+
+from .models import Payment
+
+
+PAYMENT_EXPORT = Export('payments', Payment, (
+    ('id', 'id'),
+    ('order_number', 'order__order_number'),
+    ('payment_method', 'payment_method'),
+    ('amount', 'amount'),
+    ('currency', 'currency'),
+    ('status', 'status'),
+    ('transaction_id', 'transaction_id'),
+    ('created_at', 'created_at'),
+    ('completed_at', 'completed_at'),
+))
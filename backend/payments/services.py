@@ -10,6 +10,7 @@ from django.utils import timezone
 
 from .models import Payment
 from orders.models import Order
+from products.stock import adjust_stock
 
 
 class ClickPaymentService:
@@ -385,10 +386,7 @@ class PayMePaymentService:
             order.save()
 
             # Restore stock
-            for item in order.items.all():
-                if item.product:
-                    item.product.stock += item.quantity
-                    item.product.save()
+            adjust_stock(order.items.values_list('product_id', 'quantity'), 1)
 
             return {
                 'result': {
@@ -1,6 +1,10 @@
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
-from .models import Category, Color, Size, Product, ProductImage, Review
+from config.exports import ExportAdminMixin
+from .cache import bump_version
+from .exports import PRODUCT_EXPORT
+from .models import Category, Color, Size, Tag, Product, ProductImage, Review
 
 
 @admin.register(Category)
@@ -38,6 +42,15 @@ class SizeAdmin(admin.ModelAdmin):
     ordering = ('order', 'name')
 
 
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    """Admin for Tag model"""
+
+    list_display = ('name', 'slug')
+    search_fields = ('name', 'slug')
+    prepopulated_fields = {'slug': ('name',)}
+
+
 class ProductImageInline(admin.TabularInline):
     """Inline for product images"""
     model = ProductImage
@@ -46,7 +59,7 @@ class ProductImageInline(admin.TabularInline):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ExportAdminMixin, admin.ModelAdmin):
     """Admin for Product model with comprehensive features"""
 
     list_display = (
@@ -99,6 +112,8 @@ class ProductAdmin(admin.ModelAdmin):
 
     ordering = ('-created_at',)
 
+    export = PRODUCT_EXPORT
+
     def stock_status(self, obj):
         """Display stock status with color"""
         if obj.stock == 0:
@@ -118,22 +133,29 @@ class ProductAdmin(admin.ModelAdmin):
         )
     stock_status.short_description = 'Stock Status'
 
-    actions = ['mark_as_new', 'mark_as_featured', 'mark_as_active', 'mark_as_inactive']
+    actions = [
+        'mark_as_new', 'mark_as_featured', 'mark_as_active', 'mark_as_inactive',
+        'export_csv', 'export_ndjson'
+    ]
 
     def mark_as_new(self, request, queryset):
         queryset.update(is_new=True)
+        bump_version('catalog')
     mark_as_new.short_description = "Mark selected products as NEW"
 
     def mark_as_featured(self, request, queryset):
         queryset.update(is_featured=True)
+        bump_version('catalog')
     mark_as_featured.short_description = "Mark selected products as FEATURED"
 
     def mark_as_active(self, request, queryset):
         queryset.update(is_active=True)
+        bump_version('catalog')
     mark_as_active.short_description = "Mark selected products as ACTIVE"
 
     def mark_as_inactive(self, request, queryset):
         queryset.update(is_active=False)
+        bump_version('catalog')
     mark_as_inactive.short_description = "Mark selected products as INACTIVE"
 
 
@@ -158,9 +180,19 @@ class ReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'reject_reviews']
 
     def approve_reviews(self, request, queryset):
-        queryset.update(is_approved=True)
+        pending = queryset.filter(is_approved=False)
+        with transaction.atomic():
+            ratings = list(pending.values_list('product_id', 'rating'))
+            pending.update(is_approved=True)
+            Product.adjust_ratings(ratings, 1)
+        bump_version('catalog')
     approve_reviews.short_description = "Approve selected reviews"
 
     def reject_reviews(self, request, queryset):
-        queryset.update(is_approved=False)
+        approved = queryset.filter(is_approved=True)
+        with transaction.atomic():
+            ratings = list(approved.values_list('product_id', 'rating'))
+            approved.update(is_approved=False)
+            Product.adjust_ratings(ratings, -1)
+        bump_version('catalog')
     reject_reviews.short_description = "Reject selected reviews"
@@ -0,0 +1,235 @@
+"""
+Caching helpers for the product catalog.
+
+Invalidation works through version stamps stored in the Django cache:
+bumping a namespace version makes every entry built under the old version
+unreachable, which keeps invalidation O(1).
+
+Every worker sees a bump only when the cache is shared (Redis, Memcached,
+database, files). With a process-local backend the stamps are per process,
+so cached data is bounded by CATALOG_LOCAL_CACHE_TIMEOUT instead and
+conditional GETs are answered in full.
+"""
+import hashlib
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .models import Category
+
+
+VERSION_KEY = 'products:version:{}'
+MODIFIED_KEY = 'products:modified:{}'
+
+# Backends whose entries are private to one process
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def versions_are_shared():
+    """Whether a version bump is seen by every worker process"""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def catalog_cache_timeout():
+    """Lifetime of cached catalog data, a few seconds when bumps are not shared"""
+    if versions_are_shared():
+        return settings.CATALOG_CACHE_TIMEOUT
+    return min(settings.CATALOG_CACHE_TIMEOUT, settings.CATALOG_LOCAL_CACHE_TIMEOUT)
+
+
+def is_current(copy, version):
+    """
+    Whether a per-process copy (with `version` and a monotonic `loaded_at`)
+    may still be used under the current `version`
+    """
+    if copy is None or copy.version != version:
+        return False
+    return versions_are_shared() or time.monotonic() - copy.loaded_at < catalog_cache_timeout()
+
+
+def _new_version():
+    # Time-based seeds never collide with versions that were evicted
+    return int(time.time() * 1000)
+
+
+def get_version(namespace):
+    """Return the current version stamp for a namespace"""
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_last_modified(namespace):
+    """Return the time (epoch seconds) a namespace was last bumped"""
+    key = MODIFIED_KEY.format(namespace)
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, time.time(), None)
+        modified = cache.get(key)
+    return modified
+
+
+def bump_version(namespace):
+    """Invalidate everything cached under a namespace"""
+    key = VERSION_KEY.format(namespace)
+    cache.set(MODIFIED_KEY.format(namespace), time.time(), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _new_version()
+        cache.set(key, version, None)
+        return version
+
+
+# ============================================
+# RESPONSE CACHE
+# ============================================
+
+def response_cache_key(request, action):
+    """Build a cache key from the catalog version and the normalized request"""
+    params = sorted(
+        (key, sorted(values)) for key, values in request.query_params.lists()
+    )
+    raw = f'{request.build_absolute_uri(request.path)}?{params}'
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'products:response:{get_version("catalog")}:{action}:{digest}'
+
+
+def cache_response(view_func):
+    """
+    Cache successful GET responses of a catalog action under the catalog version.
+    Any change to the catalog bumps the version, so entries never go stale.
+    """
+    @wraps(view_func)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return view_func(self, request, *args, **kwargs)
+
+        key = response_cache_key(request, self.action)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = view_func(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, catalog_cache_timeout())
+        return response
+    return wrapper
+
+
+# ============================================
+# CONDITIONAL GET
+# ============================================
+
+def conditional_response(view_func):
+    """
+    Answer conditional GETs of a catalog action from the catalog version.
+
+    The strong ETag covers the catalog version, the negotiated media type
+    and the full path, so each URL has its own validator. Last-Modified is
+    sent once the last bump is a full second old: at HTTP-date resolution a
+    later change within the same second would otherwise look unmodified.
+    If-None-Match takes precedence over If-Modified-Since, and detail
+    actions only answer 304 for objects that still exist.
+    """
+    @wraps(view_func)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not versions_are_shared():
+            # Validators from a per-process version could 304 another worker's change
+            return view_func(self, request, *args, **kwargs)
+
+        raw = f'{get_version("catalog")}:{request.accepted_media_type}:{request.get_full_path()}'
+        etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+        modified = get_last_modified('catalog')
+        last_modified = int(modified) if time.time() - modified >= 1 else None
+
+        response = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if response is not None and self.detail and not object_exists(self, kwargs):
+            raise Http404
+        if response is None:
+            response = view_func(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+    return wrapper
+
+
+def object_exists(view, kwargs):
+    """Whether the object a detail action addresses is still there"""
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    queryset = view.filter_queryset(view.get_queryset())
+    return queryset.filter(**{view.lookup_field: kwargs[lookup_url_kwarg]}).exists()
+
+
+# ============================================
+# CATEGORY TREE
+# ============================================
+
+class CategoryTree:
+    """All active categories, loaded in one query and indexed by parent"""
+
+    def __init__(self, categories, version=None):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.by_id = {}
+        self.by_slug = {}
+        self._children = defaultdict(list)
+        for category in categories:
+            self.by_id[category.pk] = category
+            self.by_slug[category.slug] = category
+            self._children[category.parent_id].append(category)
+
+    @classmethod
+    def load(cls, version=None):
+        categories = Category.objects.filter(is_active=True).order_by('order', 'name')
+        return cls(categories, version)
+
+    @property
+    def roots(self):
+        """Active top-level categories"""
+        return self.children_of(None)
+
+    def children_of(self, category_id):
+        """Active direct children of a category"""
+        return self._children.get(category_id, [])
+
+
+_category_tree = None
+
+
+def get_category_tree(request=None):
+    """
+    Return the process-wide category tree, rebuilding it when stale.
+
+    With a request the tree is resolved once and shared by every serializer
+    of that request, so the version stamp is read once rather than per node.
+    """
+    global _category_tree
+    http_request = getattr(request, '_request', request)
+    tree = getattr(http_request, '_category_tree', None)
+    if tree is not None:
+        return tree
+
+    version = get_version('categories')
+    tree = _category_tree
+    if not is_current(tree, version):
+        tree = _category_tree = CategoryTree.load(version)
+    if http_request is not None:
+        http_request._category_tree = tree
+    return tree
@@ -0,0 +1,97 @@
+"""
+Buffered product view counter.
+
+Product page views are counted in an in-process buffer and written in
+batches of `UPDATE ... SET views_count = views_count + n` by a background
+thread, so the read path never waits on a write. The increments are
+relative, which keeps counts exact when several workers flush at the same
+time. Views that fail to be written go back into the buffer.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_buffer = Counter()  # product slug -> pending views
+_wake = threading.Event()  # set when the buffer is full before the interval ends
+_flusher_pid = None
+
+
+def record_view(slug):
+    """Count a product page view; a background thread writes it later"""
+    with _lock:
+        _buffer[slug] += 1
+        full = len(_buffer) >= settings.VIEW_COUNT_MAX_PENDING
+    if settings.VIEW_COUNT_FLUSH_INTERVAL <= 0:
+        # Configured to write every view as it happens
+        flush_views()
+        return
+    ensure_flusher()
+    if full:
+        _wake.set()
+
+
+def ensure_flusher():
+    """Start this process's flusher thread (again after a fork)"""
+    global _flusher_pid
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_run_flusher, name='view-count-flusher', daemon=True).start()
+
+
+def _run_flusher():
+    while True:
+        _wake.wait(settings.VIEW_COUNT_FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush_views()
+        except Exception:
+            logger.exception('Cannot write buffered product views')
+        finally:
+            connection.close()
+
+
+def flush_views():
+    """Write buffered views with one UPDATE per distinct increment"""
+    with _lock:
+        pending = dict(_buffer)
+        _buffer.clear()
+
+    by_increment = defaultdict(list)
+    for slug, count in pending.items():
+        by_increment[count].append(slug)
+    written = 0
+    try:
+        for count, slugs in by_increment.items():
+            Product.objects.filter(slug__in=slugs, is_active=True).update(
+                views_count=F('views_count') + count
+            )
+            for slug in slugs:
+                written += pending.pop(slug)
+    except Exception:
+        # Keep what was not written for the next flush
+        with _lock:
+            _buffer.update(pending)
+        raise
+    return written
+
+
+@atexit.register
+def _flush_on_exit():
+    if _buffer:
+        try:
+            flush_views()
+        except Exception:
+            logger.exception('Cannot write buffered product views on exit')
@@ -0,0 +1,24 @@
+from config.exports import Export
+
+from .models import Product
+
+
+PRODUCT_EXPORT = Export('products', Product, (
+    ('id', 'id'),
+    ('slug', 'slug'),
+    ('name', 'name'),
+    ('category', 'category__name'),
+    ('price', 'price'),
+    ('discount_percentage', 'discount_percentage'),
+    ('effective_price', 'effective_price'),
+    ('stock', 'stock'),
+    ('is_active', 'is_active'),
+    ('is_new', 'is_new'),
+    ('is_featured', 'is_featured'),
+    ('tags', 'tags'),
+    ('average_rating', 'average_rating'),
+    ('rating_count', 'rating_count'),
+    ('views_count', 'views_count'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+))
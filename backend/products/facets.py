@@ -0,0 +1,87 @@
+"""
+Facet counts for the product listing.
+
+Every facet value becomes a conditional COUNT in a single aggregate query
+over the filtered product queryset, so the cost is one pass over the
+matching products no matter how many facets the storefront shows.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .cache import get_category_tree
+from .models import Color, Size, Product, variant_condition
+
+
+def price_buckets():
+    """Return (min, max) price ranges; the last bucket is open-ended"""
+    bounds = [Decimal(str(bound)) for bound in settings.PRODUCT_PRICE_BUCKETS]
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+def facet_counts(queryset, request=None):
+    """Count products per category, color, size, price bucket and flag"""
+    categories = list(get_category_tree(request).by_id.values())
+    colors = list(Color.objects.all())
+    sizes = list(Size.objects.all())
+    buckets = price_buckets()
+
+    aggregates = {
+        'total': Count('pk'),
+        'on_sale': Count('pk', filter=Q(discount_percentage__gt=0)),
+        'in_stock': Count('pk', filter=Q(stock__gt=0)),
+    }
+    for category in categories:
+        aggregates[f'category_{category.pk}'] = Count('pk', filter=Q(category_id=category.pk))
+    for color in colors:
+        aggregates[f'color_{color.pk}'] = Count('pk', filter=variant_condition('colors', [color.pk]))
+    for size in sizes:
+        aggregates[f'size_{size.pk}'] = Count('pk', filter=variant_condition('sizes', [size.pk]))
+    for index, (low, high) in enumerate(buckets):
+        in_bucket = (
+            Q(effective_price__gte=low) if high is None
+            else Q(effective_price__gte=low, effective_price__lt=high)
+        )
+        aggregates[f'price_{index}'] = Count('pk', filter=in_bucket)
+
+    # Aggregate over a plain pk subquery so DISTINCT and search annotations
+    # from the filtered queryset don't leak into the conditional counts
+    products = Product.objects.filter(pk__in=queryset.order_by().values('pk'))
+    counts = products.aggregate(**aggregates)
+
+    return {
+        'total': counts['total'],
+        'categories': [
+            {
+                'id': category.pk,
+                'name': category.name,
+                'slug': category.slug,
+                'count': counts[f'category_{category.pk}'],
+            }
+            for category in categories
+        ],
+        'colors': [
+            {
+                'id': color.pk,
+                'name': color.name,
+                'hex_code': color.hex_code,
+                'count': counts[f'color_{color.pk}'],
+            }
+            for color in colors
+        ],
+        'sizes': [
+            {'id': size.pk, 'name': size.name, 'count': counts[f'size_{size.pk}']}
+            for size in sizes
+        ],
+        'price': [
+            {
+                'min': str(low),
+                'max': str(high) if high is not None else None,
+                'count': counts[f'price_{index}'],
+            }
+            for index, (low, high) in enumerate(buckets)
+        ],
+        'on_sale': counts['on_sale'],
+        'in_stock': counts['in_stock'],
+    }
@@ -0,0 +1,37 @@
+from rest_framework import filters
+
+from .search import get_search_backend
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Search products through the full-text index instead of icontains scans.
+    Every match is kept and annotated with `search_rank` (lowest is best).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = ' '.join(self.get_search_terms(request))
+        if not query:
+            return queryset
+        return get_search_backend().filter(queryset, query)
+
+
+class SearchRankOrderingFilter(filters.OrderingFilter):
+    """
+    Order search results by relevance unless an explicit ordering is given.
+    `price` sorts by the stored price after discount, which is what customers pay.
+    """
+    aliases = {'price': 'effective_price'}
+
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) and 'search_rank' in queryset.query.annotations:
+            return ['search_rank']
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        return [self.alias(field) for field in ordering]
+
+    def alias(self, field):
+        descending = field.startswith('-')
+        name = self.aliases.get(field.lstrip('-'), field.lstrip('-'))
+        return f'-{name}' if descending else name
@@ -0,0 +1,259 @@
+"""
+Sized derivatives of product images.
+
+Uploads are served at full resolution, which is far more than a listing
+card needs. Every ProductImage is therefore rendered into a few widths
+(thumb, card, zoom), each as WebP and JPEG:
+
+- Pillow runs in a process pool; storage and database writes stay in the
+  Django process
+- files are saved through the default storage next to the upload
+- the result is recorded on ProductImage.derivatives and copied to
+  Product.primary_image_derivatives with the primary image:
+
+      {'source': 'products/a.jpg',
+       'variants': [{'name': 'thumb', 'width': 200,
+                     'webp': 'products/derived/a_jpg-thumb.webp',
+                     'jpeg': 'products/derived/a_jpg-thumb.jpg'}, ...]}
+
+`source` names the upload the variants were made from, so a replaced image
+is rendered again and late results for an old upload are dropped. Files of
+replaced, deleted or dropped variants are deleted from storage.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import posixpath
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> maximum width in pixels; images are never upscaled
+DERIVATIVE_WIDTHS = (('thumb', 200), ('card', 480), ('zoom', 1200))
+# (key, Pillow format, file extension, save options)
+DERIVATIVE_FORMATS = (
+    ('webp', 'WEBP', '.webp', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', '.jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+DERIVED_DIR = 'derived'
+
+
+def render_derivatives(data):
+    """Render image bytes into [(name, width, {format key: bytes})]; runs in worker processes"""
+    with Image.open(io.BytesIO(data)) as upload:
+        source = ImageOps.exif_transpose(upload)
+        if source.mode in ('RGBA', 'LA') or (source.mode == 'P' and 'transparency' in source.info):
+            # JPEG has no alpha channel: flatten onto white
+            rgba = source.convert('RGBA')
+            source = Image.new('RGB', rgba.size, 'white')
+            source.paste(rgba, mask=rgba.getchannel('A'))
+        elif source.mode != 'RGB':
+            source = source.convert('RGB')
+
+        rendered = []
+        for name, max_width in DERIVATIVE_WIDTHS:
+            width = min(max_width, source.width)
+            if rendered and rendered[-1][1] == width:
+                # A small upload gets fewer variants rather than duplicates
+                continue
+            height = max(1, round(source.height * width / source.width))
+            resized = source if width == source.width else source.resize(
+                (width, height), Image.Resampling.LANCZOS
+            )
+            files = {}
+            for key, pil_format, _, options in DERIVATIVE_FORMATS:
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, **options)
+                files[key] = buffer.getvalue()
+            rendered.append((name, width, files))
+    return rendered
+
+
+def store_derivatives(source_name, rendered):
+    """Save rendered variants next to the upload and return the derivatives record"""
+    directory = posixpath.join(posixpath.dirname(source_name), DERIVED_DIR)
+    stem = posixpath.basename(source_name).replace('.', '_')
+    variants = []
+    for name, width, files in rendered:
+        variant = {'name': name, 'width': width}
+        for key, _, extension, _ in DERIVATIVE_FORMATS:
+            path = f'{directory}/{stem}-{name}{extension}'
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            variant[key] = default_storage.save(path, ContentFile(files[key]))
+        variants.append(variant)
+    return {'source': source_name, 'variants': variants}
+
+
+def record_derivatives(image_id, derivatives):
+    """Attach derivatives to the image if it still shows the same upload"""
+    from .cache import bump_version
+    from .models import Product, ProductImage
+
+    updated = ProductImage.objects.filter(
+        pk=image_id, image=derivatives['source']
+    ).update(derivatives=derivatives)
+    if updated:
+        product = Product.objects.filter(images__pk=image_id).first()
+        if product:
+            product.refresh_primary_image()
+        bump_version('catalog')
+    return bool(updated)
+
+
+def read_source(source_name):
+    with default_storage.open(source_name, 'rb') as handle:
+        return handle.read()
+
+
+def save_derivatives(image_id, source_name, rendered):
+    """Store and record rendered variants, deleting them again if the upload changed meanwhile"""
+    derivatives = store_derivatives(source_name, rendered)
+    recorded = record_derivatives(image_id, derivatives)
+    if not recorded:
+        delete_derivatives(derivatives)
+    return recorded
+
+
+def delete_derivatives(derivatives):
+    """Delete the files of a derivatives record"""
+    for variant in (derivatives or {}).get('variants', ()):
+        for key, _, _, _ in DERIVATIVE_FORMATS:
+            if variant.get(key):
+                try:
+                    default_storage.delete(variant[key])
+                except OSError:
+                    logger.exception('Cannot delete derivative %s', variant[key])
+
+
+def discard(derivatives):
+    """Delete the files of a derivatives record once the current transaction commits"""
+    if (derivatives or {}).get('variants'):
+        transaction.on_commit(lambda: delete_derivatives(derivatives))
+
+
+def generate(image_id, source_name):
+    """Render, store and record the derivatives of one image in this process"""
+    rendered = render_derivatives(read_source(source_name))
+    return save_derivatives(image_id, source_name, rendered)
+
+
+def srcsets(derivatives, media_url):
+    """{'webp': 'url 200w, ...', 'jpeg': ...} for a derivatives record, None until rendered"""
+    variants = (derivatives or {}).get('variants')
+    if not variants:
+        return None
+    return {
+        key: ', '.join(
+            f'{media_url(variant[key])} {variant["width"]}w'
+            for variant in variants
+        )
+        for key, _, _, _ in DERIVATIVE_FORMATS
+    }
+
+
+# ================================
+# Background rendering on upload
+# ================================
+
+_pool = None
+_writer = None
+_lock = threading.Lock()
+
+
+def pool_context():
+    # Spawned workers share no database connections or threads with the server
+    return multiprocessing.get_context('spawn')
+
+
+def get_executors():
+    """The process pool rendering images and the thread recording results"""
+    global _pool, _writer
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS, mp_context=pool_context()
+            )
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-derivatives')
+    return _pool, _writer
+
+
+def schedule(image):
+    """Render derivatives for a saved ProductImage once its transaction commits"""
+    mode = settings.IMAGE_DERIVATIVES
+    if mode == 'off' or not image.image:
+        return
+    image_id, source_name = image.pk, image.image.name
+    if mode == 'inline':
+        transaction.on_commit(lambda: generate(image_id, source_name))
+    else:
+        transaction.on_commit(lambda: submit(image_id, source_name))
+
+
+def submit(image_id, source_name):
+    try:
+        data = read_source(source_name)
+    except OSError:
+        logger.exception('Cannot read %s for derivatives', source_name)
+        return
+    pool, writer = get_executors()
+    future = pool.submit(render_derivatives, data)
+    future.add_done_callback(lambda done: writer.submit(finish, image_id, source_name, done))
+
+
+def finish(image_id, source_name, future):
+    """Store and record a background rendering; runs on the writer thread"""
+    try:
+        save_derivatives(image_id, source_name, future.result())
+    except Exception:
+        logger.exception('Cannot render derivatives for %s', source_name)
+    finally:
+        connection.close()
+
+
+# ================================
+# Backfill
+# ================================
+
+def generate_many(images, workers=None, progress=None):
+    """
+    Render (image id, source name) pairs in a process pool. Only a few
+    uploads are held in memory at a time. Returns (rendered, [(source, error)]).
+    """
+    workers = workers or os.cpu_count() or 1
+    images = iter(images)
+    rendered, failed = 0, []
+    pending = {}
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as pool:
+        while True:
+            while len(pending) < workers * 2:
+                item = next(images, None)
+                if item is None:
+                    break
+                try:
+                    pending[pool.submit(render_derivatives, read_source(item[1]))] = item
+                except OSError as exc:
+                    failed.append((item[1], exc))
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                image_id, source_name = pending.pop(future)
+                try:
+                    save_derivatives(image_id, source_name, future.result())
+                    rendered += 1
+                except Exception as exc:
+                    failed.append((source_name, exc))
+                if progress:
+                    progress(rendered, len(failed))
+    return rendered, failed
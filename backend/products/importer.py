@@ -0,0 +1,312 @@
+"""
+Streaming bulk product import.
+
+Rows are read lazily from CSV or JSON Lines and upserted in batches, each
+in its own transaction:
+
+- categories, colors and sizes are created on first sight (colors and sizes
+  also update their hex code / order when the file provides one)
+- products are upserted on slug with bulk_create(update_conflicts=True)
+- color, size and tag links of imported products are replaced by the file
+
+Derived columns that signals normally maintain (effective price, variant
+masks, tags, search index, cache versions) are written in
+bulk here, since bulk_create sends no signals.
+
+Columns a row leaves out are left untouched on existing products, so rows
+in one file may provide different columns. Empty CSV cells of number and
+flag columns count as left out, while an empty list cell clears the links.
+"""
+import csv
+import json
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .cache import bump_version
+from .models import (
+    Category, Color, Size, Product, ProductTag, Tag, parse_tags, variant_bit
+)
+from .search import get_search_backend
+
+
+def parse_bool(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+# Product columns an import may set, with their parsers
+PRODUCT_FIELDS = {
+    'name': str,
+    'description': str,
+    'short_description': str,
+    'tags': str,
+    'price': Decimal,
+    'discount_percentage': int,
+    'stock': int,
+    'low_stock_threshold': int,
+    'is_active': parse_bool,
+    'is_new': parse_bool,
+    'is_featured': parse_bool,
+}
+REQUIRED_FIELDS = ('name', 'price')
+# Row columns that are not product fields, with the product field each one writes
+LINK_COLUMNS = {'category': 'category', 'colors': 'color_mask', 'sizes': 'size_mask'}
+LIST_SEPARATOR = '|'
+
+
+class RowError(ValueError):
+    """A row that cannot be imported"""
+
+    def __init__(self, line, message):
+        super().__init__(f'Line {line}: {message}')
+
+
+def read_rows(path, file_format=None):
+    """Yield (line number, row dict) from a CSV or JSON Lines file"""
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as handle:
+        if file_format == 'csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line, text in enumerate(handle, start=1):
+                if text.strip():
+                    yield line, json.loads(text)
+
+
+def split_list(value):
+    """CSV cells hold lists as "a|b|c"; JSON rows use real lists"""
+    if value in (None, ''):
+        return []
+    if isinstance(value, list):
+        return value
+    return [item.strip() for item in str(value).split(LIST_SEPARATOR) if item.strip()]
+
+
+def parse_variant(item, detail_field, detail_type):
+    """Parse "Name:detail", "Name" or {"name": ..., detail_field: ...}"""
+    if isinstance(item, dict):
+        detail = item.get(detail_field)
+        return item['name'], detail_type(detail) if detail not in (None, '') else None
+    name, _, detail = str(item).partition(':')
+    return name.strip(), detail_type(detail.strip()) if detail.strip() else None
+
+
+class ProductImporter:
+    """Upserts products and their lookups batch by batch"""
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.colors, self.color_details = self.load_variants(Color, 'hex_code')
+        self.sizes, self.size_details = self.load_variants(Size, 'order')
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.created_categories = False
+        self.imported = 0
+
+    def run(self, rows, progress=None):
+        """Import (line, row) pairs; `progress(imported)` runs after each batch"""
+        batch = []
+        for line, row in rows:
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+                if progress:
+                    progress(self.imported)
+        if batch:
+            self.import_batch(batch)
+        self.finish()
+        return self.imported
+
+    def import_batch(self, batch):
+        parsed = [self.parse(line, row) for line, row in batch]
+        # Last row wins when a slug repeats within a batch
+        parsed = list({product.slug: (product, columns, variants) for product, columns, variants in parsed}.values())
+
+        with transaction.atomic():
+            self.ensure_lookups(parsed)
+            # Rows providing the same columns are upserted together
+            groups = defaultdict(list)
+            for product, columns, (category, colors, sizes) in parsed:
+                if category is not None:
+                    product.category_id = self.categories[category]
+                product.color_mask = self.mask(self.colors, colors)
+                product.size_mask = self.mask(self.sizes, sizes)
+                groups[columns].append((product, (category, colors, sizes)))
+
+            for columns, group in groups.items():
+                Product.objects.bulk_create(
+                    [product for product, _ in group],
+                    update_conflicts=True,
+                    unique_fields=['slug'],
+                    update_fields=self.update_fields(columns),
+                )
+            ids = dict(Product.objects.filter(
+                slug__in=[product.slug for product, _, _ in parsed]
+            ).values_list('slug', 'id'))
+
+            for columns, group in groups.items():
+                if 'colors' in columns:
+                    self.replace_links(Product.colors.through, 'color_id', ids, group, 1, self.colors)
+                if 'sizes' in columns:
+                    self.replace_links(Product.sizes.through, 'size_id', ids, group, 2, self.sizes)
+                if 'tags' in columns:
+                    self.replace_tags(ids, [product for product, _ in group])
+            get_search_backend().index_many(ids.values())
+
+        self.imported += len(parsed)
+
+    def parse(self, line, row):
+        """Return (unsaved Product, provided columns, (category, colors, sizes)) for one row"""
+        row = {key.strip(): value for key, value in row.items() if key}
+        for field in REQUIRED_FIELDS:
+            if row.get(field) in (None, ''):
+                raise RowError(line, f'missing {field}')
+
+        values = {}
+        for field, parse in PRODUCT_FIELDS.items():
+            value = row.get(field)
+            if value is None or (value == '' and parse is not str):
+                continue
+            try:
+                values[field] = parse(value)
+            except (InvalidOperation, TypeError, ValueError):
+                raise RowError(line, f'invalid {field} {value!r}')
+        columns = frozenset([*values, *(column for column in LINK_COLUMNS if row.get(column) is not None)])
+        values.setdefault('description', '')
+        slug = row.get('slug') or slugify(values['name'])
+        if not slug:
+            raise RowError(line, 'cannot derive a slug')
+
+        try:
+            colors = [parse_variant(item, 'hex_code', str) for item in split_list(row.get('colors'))]
+            sizes = [parse_variant(item, 'order', int) for item in split_list(row.get('sizes'))]
+        except (KeyError, ValueError):
+            raise RowError(line, 'invalid colors or sizes')
+        category = (row.get('category') or '').strip() or None
+        return Product(slug=slug, **values), columns, (category, colors, sizes)
+
+    @staticmethod
+    def update_fields(columns):
+        """Product fields an upsert takes from rows providing `columns`"""
+        fields = [field for field in PRODUCT_FIELDS if field in columns]
+        fields += [field for column, field in LINK_COLUMNS.items() if column in columns]
+        return [*fields, 'updated_at']
+
+    def ensure_lookups(self, parsed):
+        """Create missing categories, colors and sizes and refresh provided details"""
+        categories = {category for _, _, (category, _, _) in parsed if category}
+        missing = [name for name in categories if name not in self.categories]
+        if missing:
+            Category.objects.bulk_create(
+                [Category(name=name, slug=slugify(name)) for name in missing],
+                ignore_conflicts=True
+            )
+            # A name whose slug is taken maps to the category owning that slug
+            slugs = {slugify(name): name for name in missing}
+            new = Category.objects.filter(Q(name__in=missing) | Q(slug__in=slugs))
+            for category in new:
+                self.categories[slugs.get(category.slug, category.name)] = category.pk
+                self.categories.setdefault(category.name, category.pk)
+            self.created_categories = True
+
+        self.upsert_variants(Color, self.colors, self.color_details, 'hex_code', '', [
+            variant for _, _, (_, colors, _) in parsed for variant in colors
+        ])
+        self.upsert_variants(Size, self.sizes, self.size_details, 'order', 0, [
+            variant for _, _, (_, _, sizes) in parsed for variant in sizes
+        ])
+
+    @staticmethod
+    def load_variants(model, detail_field):
+        """Return ({name: id}, {name: detail}) for every existing variant"""
+        ids, details = {}, {}
+        for pk, name, detail in model.objects.values_list('id', 'name', detail_field):
+            ids[name] = pk
+            details[name] = detail
+        return ids, details
+
+    def upsert_variants(self, model, known, known_details, detail_field, default, variants):
+        """
+        Insert unseen variants and update details that changed.
+
+        Known rows are never sent through an INSERT: a conflicting insert still
+        consumes an id, and variant ids must stay small to fit the variant masks.
+        """
+        details = {}
+        for name, detail in variants:
+            if detail is not None or name not in details:
+                details[name] = detail
+
+        missing = [name for name in details if name not in known]
+        if missing:
+            model.objects.bulk_create(
+                [model(name=name, **{detail_field: details[name] if details[name] is not None else default})
+                 for name in missing],
+                ignore_conflicts=True
+            )
+            for pk, name, detail in model.objects.filter(name__in=missing).values_list('id', 'name', detail_field):
+                known[name] = pk
+                known_details[name] = detail
+
+        changed = {}
+        for name, detail in details.items():
+            if detail is not None and known_details.get(name) != detail:
+                changed.setdefault(detail, []).append(name)
+                known_details[name] = detail
+        for detail, names in changed.items():
+            model.objects.filter(name__in=names).update(**{detail_field: detail})
+
+    @staticmethod
+    def mask(known, variants):
+        mask = 0
+        for name, _ in variants:
+            mask |= variant_bit(known[name]) or 0
+        return mask
+
+    def replace_links(self, through, column, ids, parsed, position, known):
+        """Make the M2M rows of the parsed products exactly those listed in the file"""
+        product_ids = [ids[product.slug] for product, _ in parsed]
+        through.objects.filter(product_id__in=product_ids).delete()
+        through.objects.bulk_create(
+            [
+                through(product_id=ids[product.slug], **{column: known[name]})
+                for product, variants in parsed
+                for name in {name for name, _ in variants[position]}
+            ],
+            ignore_conflicts=True
+        )
+
+    def replace_tags(self, ids, products):
+        tagged = {product.slug: parse_tags(product.tags) for product in products}
+        names = {slug: name for tags in tagged.values() for slug, name in tags.items()}
+        missing = [slug for slug in names if slug not in self.tags]
+        if missing:
+            Tag.objects.bulk_create(
+                [Tag(name=names[slug], slug=slug) for slug in missing],
+                ignore_conflicts=True
+            )
+            self.tags.update(Tag.objects.filter(slug__in=missing).values_list('slug', 'id'))
+
+        if tagged:
+            ProductTag.objects.filter(product_id__in=[ids[slug] for slug in tagged]).delete()
+            ProductTag.objects.bulk_create(
+                [
+                    ProductTag(product_id=ids[product_slug], tag_id=self.tags[slug])
+                    for product_slug, tags in tagged.items()
+                    for slug in tags
+                ],
+                ignore_conflicts=True
+            )
+
+    def finish(self):
+        """Finish what post_save signals would have maintained row by row"""
+        if self.created_categories:
+            bump_version('categories')
+        if self.imported:
+            bump_version('catalog')
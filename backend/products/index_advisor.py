@@ -0,0 +1,342 @@
+"""
+Index advisor driven by the catalog's own queries.
+
+Representative API requests are replayed through the test client while
+`connection.execute_wrapper` captures every SELECT. Each statement goes
+through EXPLAIN; when the planner scans a project table in full, or sorts
+the main table of a LIMIT query without an index, an index is proposed from the statement's
+own predicates:
+
+- constant boolean predicates (is_active, is_featured, ...) become the
+  condition of a partial index
+- equality predicates lead the index, followed by the ORDER BY columns and
+  at most one range predicate
+"""
+import hashlib
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, migrations, models
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.test import Client
+from django.test.utils import override_settings
+
+
+# Databases whose EXPLAIN output `explain()` understands
+SUPPORTED_VENDORS = ('sqlite', 'postgresql')
+
+# {category}, {product} and {product_id} are filled from the database
+REPRESENTATIVE_REQUESTS = [
+    '/api/home/',
+    '/api/categories/',
+    '/api/products/',
+    '/api/products/?category={category}',
+    '/api/products/?category={category}&min_price=10000&max_price=300000',
+    '/api/products/?is_featured=true',
+    '/api/products/?in_stock=true',
+    '/api/products/?on_sale=true',
+    '/api/products/?is_new=true&ordering=price',
+    '/api/products/?ordering=price',
+    '/api/products/?ordering=-views_count',
+    '/api/products/?ordering=-average_rating',
+    '/api/products/?cursor=',
+    '/api/products/featured/',
+    '/api/products/new_arrivals/',
+    '/api/products/on_sale/',
+    '/api/products/facets/?category={category}',
+    '/api/products/{product}/',
+    '/api/products/{product}/related/',
+    '/api/reviews/?product={product_id}',
+]
+
+COLUMN = r'(?:"(?P<table>\w+)"|(?P<alias>U\d+))\."(?P<column>\w+)"'
+PREDICATE_RE = re.compile(
+    rf'(?P<negated>NOT \(?)?{COLUMN}\s*'
+    r'(?P<op>=|<>|>=|<=|>|<|IN\b|IS NOT NULL|IS NULL|LIKE\b|(?=\s*(?:AND\b|OR\b|ORDER\b|GROUP\b|LIMIT\b|\)|$)))'
+    r'\s*(?P<rhs>"|U\d+\.)?'
+)
+ALIAS_RE = re.compile(r'"(\w+)" (U\d+)')
+ORDER_TERM_RE = re.compile(rf'{COLUMN}(?P<desc> DESC)?')
+RANGE_OPS = {'>', '<', '>=', '<=', 'IN', 'LIKE'}
+
+
+@dataclass
+class Proposal:
+    """A proposed index and the statements that wanted it"""
+    model: type
+    fields: tuple
+    condition: tuple = ()
+    statements: list = field(default_factory=list)
+    # How many leading fields are equality predicates, and the trailing range field
+    equality: int = 0
+    range: str = ''
+
+    @property
+    def key(self):
+        return (self.model._meta.label, self.fields, self.condition)
+
+    @property
+    def name(self):
+        digest = hashlib.md5(repr(self.key).encode()).hexdigest()[:6]
+        table = self.model._meta.db_table[:11]
+        return f'{table}_{self.fields[0].lstrip("-")[:7]}_{digest}_idx'
+
+    def as_index(self):
+        condition = models.Q(**dict(self.condition)) if self.condition else None
+        return models.Index(fields=list(self.fields), condition=condition, name=self.name)
+
+    def as_code(self):
+        parts = [f'fields={list(self.fields)!r}']
+        if self.condition:
+            parts.append('condition=Q({})'.format(
+                ', '.join(f'{name}={value!r}' for name, value in self.condition)
+            ))
+        parts.append(f'name={self.name!r}')
+        return f'models.Index({", ".join(parts)})'
+
+
+def project_models():
+    """db_table -> model for the models of this project's own apps"""
+    base_dir = str(settings.BASE_DIR)
+    return {
+        model._meta.db_table: model
+        for model in apps.get_models()
+        if model._meta.app_config.path.startswith(base_dir)
+    }
+
+
+def representative_paths():
+    Product = apps.get_model('products', 'Product')
+    Category = apps.get_model('products', 'Category')
+    product = Product.objects.filter(is_active=True).order_by('pk').first()
+    category = Category.objects.filter(is_active=True).order_by('pk').first()
+    values = {
+        'product': product.slug if product else 'missing',
+        'product_id': product.pk if product else 0,
+        'category': category.slug if category else 'missing',
+    }
+    return [path.format(**values) for path in REPRESENTATIVE_REQUESTS]
+
+
+def capture_queries(paths):
+    """Replay requests with caching disabled; return [(path, sql, params)]"""
+    statements = []
+    current = {}
+
+    def capture(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            statements.append((current['path'], sql, tuple(params or ())))
+        return execute(sql, params, many, context)
+
+    client = Client(HTTP_HOST='localhost')
+    # A private cache, emptied before every request so nothing is served from it
+    private_cache = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'index-advisor',
+    }}
+    with override_settings(CACHES=private_cache), connection.execute_wrapper(capture):
+        for path in paths:
+            cache.clear()
+            current['path'] = path
+            client.get(path)
+    return statements
+
+
+def explain(sql, params):
+    """Return (tables or aliases scanned in full, whether a sort runs without an index)"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[-1] for row in cursor.fetchall()]
+            scanned = {
+                detail.split()[1] for detail in details
+                if detail.startswith('SCAN ') and 'INDEX' not in detail
+                and not detail.startswith('SCAN CONSTANT')
+            }
+            sorted_ = any('TEMP B-TREE FOR ORDER BY' in detail for detail in details)
+            return scanned, sorted_
+
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0][0]['Plan']
+            scanned, sorted_ = set(), False
+            nodes = [plan]
+            while nodes:
+                node = nodes.pop()
+                if node['Node Type'] == 'Seq Scan':
+                    scanned.add(node.get('Alias') or node['Relation Name'])
+                elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+                    sorted_ = True
+                nodes.extend(node.get('Plans', []))
+            return scanned, sorted_
+
+    raise NotImplementedError(f'EXPLAIN is not supported for {connection.vendor}')
+
+
+def main_table(sql):
+    match = re.search(r'\bFROM "(\w+)"', sql)
+    return match.group(1) if match else None
+
+
+def top_level_order_by(sql):
+    """The ORDER BY clause of the outer statement, if any"""
+    position = sql.rfind(' ORDER BY ')
+    if position == -1:
+        return ''
+    clause = sql[position + len(' ORDER BY '):]
+    # An ORDER BY inside a subquery leaves unbalanced parentheses behind
+    if clause.count(')') > clause.count('('):
+        return ''
+    return re.split(r' LIMIT | OFFSET ', clause)[0]
+
+
+def propose(sql, table, model, aliases, with_ordering):
+    """Build the index proposal for one table of one statement, or None"""
+    columns = {f.column: f for f in model._meta.concrete_fields}
+    pk_column = model._meta.pk.column
+    condition, equality, ranges = {}, [], []
+
+    where = sql.split(' WHERE ', 1)[1] if ' WHERE ' in sql else ''
+    for match in PREDICATE_RE.finditer(where):
+        name = match.group('table') or aliases.get(match.group('alias'))
+        column = match.group('column')
+        if name != table or column not in columns or column == pk_column or match.group('rhs'):
+            continue
+        model_field = columns[column]
+        op = match.group('op').strip()
+        if not op:
+            if isinstance(model_field, models.BooleanField):
+                condition[model_field.name] = not match.group('negated')
+        elif op in ('=', 'IS NULL'):
+            if model_field.name not in equality:
+                equality.append(model_field.name)
+        elif op in RANGE_OPS and model_field.name not in ranges:
+            ranges.append(model_field.name)
+
+    ordering = []
+    if with_ordering:
+        for match in ORDER_TERM_RE.finditer(top_level_order_by(sql)):
+            name = match.group('table') or aliases.get(match.group('alias'))
+            if name != table or match.group('column') not in columns:
+                break
+            model_field = columns[match.group('column')]
+            ordering.append(f'-{model_field.name}' if match.group('desc') else model_field.name)
+
+    if not (condition or equality or ranges) and ' LIMIT ' not in sql:
+        # Reading a whole table in order needs a full scan whatever the index
+        return None
+
+    fields = [name for name in equality if name not in condition]
+    equality_count = len(fields)
+    fields += [name for name in ordering if name.lstrip('-') not in fields and name.lstrip('-') not in condition]
+    leftover = [name for name in ranges if name not in fields and name not in condition]
+    if leftover:
+        fields.append(leftover[0])
+    if not fields:
+        return None
+    return Proposal(model, tuple(fields), tuple(sorted(condition.items())),
+                    equality=equality_count, range=leftover[0] if leftover else '')
+
+
+def existing_indexes(model):
+    """(field names, condition) pairs for the indexes a model already has"""
+    existing = []
+    for index in model._meta.indexes:
+        condition = tuple(sorted(index.condition.children)) if index.condition is not None else ()
+        existing.append(([name.lstrip('-') for name in index.fields], condition))
+    for model_field in model._meta.concrete_fields:
+        if model_field.db_index or model_field.unique or model_field.primary_key:
+            existing.append(([model_field.name], ()))
+    for fields in model._meta.unique_together:
+        existing.append((list(fields), ()))
+    return existing
+
+
+def is_covered(proposal):
+    """
+    True when an existing index already serves the proposal: one with the
+    same condition and leading fields, or a full index led by the condition
+    and equality columns (in any order) and then the ORDER BY columns
+    """
+    wanted = [name.lstrip('-') for name in proposal.fields]
+    pinned = {name for name, _ in proposal.condition} | set(wanted[:proposal.equality])
+    # A trailing range column only filters rows read in index order
+    ordered = wanted[proposal.equality:len(wanted) - bool(proposal.range)]
+    for fields, condition in existing_indexes(proposal.model):
+        if condition == proposal.condition and fields[:len(wanted)] == wanted:
+            return True
+        if (not condition and ordered and set(fields[:len(pinned)]) == pinned
+                and fields[len(pinned):len(pinned) + len(ordered)] == ordered):
+            return True
+    return False
+
+
+def advise(paths=None):
+    """Replay requests and return (statements analysed, uncovered proposals)"""
+    tables = project_models()
+    statements = capture_queries(paths or representative_paths())
+    proposals = {}
+
+    for path, sql, params in statements:
+        scanned, sorted_ = explain(sql, params)
+        aliases = {alias: table for table, alias in ALIAS_RE.findall(sql)}
+        main = main_table(sql)
+        candidates = {aliases.get(name, name) for name in scanned}
+        if sorted_ and main and ' LIMIT ' in sql:
+            # Sorting a handful of prefetched rows is cheap; top-N pages are not
+            candidates.add(main)
+
+        for table in candidates:
+            model = tables.get(table)
+            if model is None:
+                continue
+            proposal = propose(sql, table, model, aliases, with_ordering=table == main)
+            if proposal is None or is_covered(proposal):
+                continue
+            proposal = proposals.setdefault(proposal.key, proposal)
+            proposal.statements.append(path)
+
+    return len(statements), merge_prefixes(list(proposals.values()))
+
+
+def merge_prefixes(proposals):
+    """Drop proposals whose fields lead a longer proposal with the same condition"""
+    kept = []
+    for proposal in sorted(proposals, key=lambda p: -len(p.fields)):
+        for longer in kept:
+            if (longer.model is proposal.model and longer.condition == proposal.condition
+                    and longer.fields[:len(proposal.fields)] == proposal.fields):
+                longer.statements += proposal.statements
+                break
+        else:
+            kept.append(proposal)
+    return kept
+
+
+def write_migrations(proposals, name='advised_indexes'):
+    """Write one AddIndex migration per app; return the written paths"""
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    by_app = {}
+    for proposal in proposals:
+        by_app.setdefault(proposal.model._meta.app_label, []).append(proposal)
+
+    paths = []
+    for app_label, app_proposals in sorted(by_app.items()):
+        leaves = loader.graph.leaf_nodes(app_label)
+        number = max((MigrationAutodetector.parse_number(leaf[1]) or 0 for leaf in leaves), default=0) + 1
+        migration = migrations.Migration(f'{number:04d}_{name}', app_label)
+        migration.dependencies = leaves
+        migration.operations = [
+            migrations.AddIndex(model_name=proposal.model._meta.model_name, index=proposal.as_index())
+            for proposal in app_proposals
+        ]
+        writer = MigrationWriter(migration)
+        Path(writer.path).write_text(writer.as_string())
+        paths.append(writer.path)
+    return paths
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from products.index_advisor import SUPPORTED_VENDORS, advise, write_migrations
+
+
+class Command(BaseCommand):
+    help = 'Replay representative API requests, EXPLAIN their SQL and propose missing indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--write', action='store_true',
+            help='Write a migration with the proposed indexes'
+        )
+        parser.add_argument('--name', default='advised_indexes', help='Name of the generated migration')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in SUPPORTED_VENDORS:
+            raise CommandError(
+                f'Index advice needs {" or ".join(SUPPORTED_VENDORS)}; the default database is {connection.vendor}'
+            )
+
+        self.stdout.write('Replaying representative requests...')
+        analysed, proposals = advise()
+        self.stdout.write(f'Analysed {analysed} statements')
+
+        if not proposals:
+            self.stdout.write(self.style.SUCCESS('✓ No missing indexes found'))
+            return
+
+        for proposal in proposals:
+            self.stdout.write(f'\n{proposal.model._meta.label}: {proposal.as_code()}')
+            for path in sorted(set(proposal.statements)):
+                self.stdout.write(f'  used by {path}')
+
+        if options['write']:
+            for path in write_migrations(proposals, options['name']):
+                self.stdout.write(self.style.SUCCESS(f'✓ Wrote {path}'))
+            self.stdout.write('Add the indexes above to the models\' Meta.indexes to keep makemigrations in sync.')
+        else:
+            self.stdout.write('\nRun with --write to generate the migration.')
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from products.cache import bump_version
+from products.models import Product, ProductTag, Tag, parse_tags
+
+
+class Command(BaseCommand):
+    help = 'Backfill normalized Tag rows from the comma-separated Product.tags strings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        self.stdout.write('Reading product tags...')
+        product_tags = {}
+        names = {}
+        rows = Product.objects.exclude(tags='').values_list('id', 'tags')
+        for product_id, value in rows.iterator(chunk_size=batch_size):
+            tags = parse_tags(value)
+            product_tags[product_id] = list(tags)
+            for slug, name in tags.items():
+                names.setdefault(slug, name)
+
+        self.stdout.write(f'Creating {len(names)} tags...')
+        Tag.objects.bulk_create(
+            [Tag(name=name, slug=slug) for slug, name in names.items()],
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+
+        self.stdout.write(f'Linking {len(product_tags)} products...')
+        ProductTag.objects.bulk_create(
+            [
+                ProductTag(product_id=product_id, tag_id=tag_ids[slug])
+                for product_id, slugs in product_tags.items()
+                for slug in slugs
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+        bump_version('catalog')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Backfilled {ProductTag.objects.count()} product tags'
+        ))
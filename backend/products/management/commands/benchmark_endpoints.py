@@ -0,0 +1,82 @@
+import platform
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from config.benchmarks import BASELINE_PATH, compare, load_baseline, run_benchmarks, write_baseline
+from products.seeding import ScaleSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every API endpoint on a freshly seeded test database and '
+        'compare query counts, latency and memory with the stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, help='Products to seed (default: the baseline\'s scale, else 500)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per endpoint')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH), help='Baseline JSON file')
+        parser.add_argument('--update', action='store_true', help='Write the results as the new baseline')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if not options['update']:
+            try:
+                baseline = load_baseline(options['baseline'])
+            except FileNotFoundError:
+                raise CommandError(f'No baseline at {options["baseline"]}; run with --update first')
+        scale = options['scale'] or (baseline['meta']['scale'] if baseline else 500)
+        if baseline and scale != baseline['meta']['scale']:
+            self.stdout.write(self.style.WARNING(
+                f'Baseline was recorded at scale {baseline["meta"]["scale"]}; latency and memory will not compare'
+            ))
+
+        results = self.benchmark(scale, options['seed'], options['repeat'])
+
+        if options['update']:
+            meta = {
+                'scale': scale,
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+            }
+            write_baseline(results, meta, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f'✓ Baseline written to {options["baseline"]}'))
+            return
+
+        violations = compare(results, baseline)
+        missing = sorted(set(results) - set(baseline['endpoints']))
+        for name in missing:
+            self.stdout.write(self.style.WARNING(f'  {name}: no baseline yet'))
+        if violations:
+            for violation in violations:
+                self.stderr.write(f'  {violation}')
+            raise CommandError(f'{len(violations)} endpoint budgets exceeded')
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(results)} endpoints within budget'))
+
+    def benchmark(self, scale, seed, repeat):
+        """Seed a throwaway test database and benchmark it"""
+        old_name = connection.settings_dict['NAME']
+        media_root = tempfile.mkdtemp()
+        self.stdout.write(f'Seeding a test database with {scale} products...')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(MEDIA_ROOT=media_root, IMAGE_DERIVATIVES='off'):
+                ScaleSeeder(scale, seed=seed, log=lambda message: None).run()
+                self.stdout.write(f'\n{"endpoint":<40}{"status":>7}{"queries":>9}{"p50 ms":>9}{"p95 ms":>9}{"peak KB":>9}')
+                return run_benchmarks(repeat, progress=self.report)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name[:39]:<40}{result["status"]:>7}{result["queries"]:>9}'
+            f'{result["p50_ms"]:>9.1f}{result["p95_ms"]:>9.1f}{result["peak_kb"]:>9}'
+        )
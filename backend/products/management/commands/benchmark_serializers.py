@@ -0,0 +1,71 @@
+import itertools
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from orders.models import Order
+from orders.serializers import OrderSerializer
+from products.models import Product
+from products.serializers import ProductListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare the compiled list serializers with the generic DRF path per page size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='12,24,48,100', help='Comma-separated page sizes')
+        parser.add_argument('--repeat', type=int, default=50, help='Renders timed per page size')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        request = Request(APIRequestFactory().get('/api/products/', SERVER_NAME='localhost'))
+
+        products = list(
+            Product.objects.select_related('category')
+            .prefetch_related('colors', 'sizes', 'images')[:max(sizes)]
+        )
+        orders = list(Order.objects.prefetch_related('items')[:max(sizes)])
+        if not products:
+            raise CommandError('No products to serialize; run seed_products first')
+
+        self.stdout.write(f'{"serializer":<12}{"size":>6}{"drf ms":>10}{"compiled ms":>13}{"speed-up":>10}')
+        for name, rows, child in (
+            ('products', products, ProductListSerializer),
+            ('orders', orders, OrderSerializer),
+        ):
+            if not rows:
+                self.stdout.write(f'{name:<12}  skipped, no rows')
+                continue
+            for size in sizes:
+                # Repeat rows when the database holds fewer than a page
+                page = list(itertools.islice(itertools.cycle(rows), size))
+                context = {'request': request}
+                generic = self.time(
+                    lambda: serializers.ListSerializer(page, child=child(), context=context).data,
+                    options['repeat']
+                )
+                compiled = self.time(
+                    lambda: child(page, many=True, context=context).data,
+                    options['repeat']
+                )
+                self.stdout.write(
+                    f'{name:<12}{size:>6}{generic * 1000:>10.2f}{compiled * 1000:>13.2f}'
+                    f'{generic / compiled:>9.1f}x'
+                )
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete'))
+
+    @staticmethod
+    def time(render, repeat):
+        """Median seconds for rendering one page to JSON"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            JSONRenderer().render(render())
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return timings[len(timings) // 2]
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.images import generate_many
+from products.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Render sized WebP/JPEG derivatives for product images in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+        parser.add_argument('--force', action='store_true', help='Re-render images that already have derivatives')
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.exclude(image='').order_by('pk').values_list('pk', 'image', 'derivatives')
+        todo = [
+            (pk, name) for pk, name, derivatives in images.iterator(chunk_size=2000)
+            if options['force'] or (derivatives or {}).get('source') != name
+        ]
+        if not todo:
+            self.stdout.write(self.style.SUCCESS('✓ All product images have derivatives'))
+            return
+
+        self.stdout.write(f'Rendering derivatives for {len(todo)} images...')
+        started = time.monotonic()
+
+        def progress(rendered, failed):
+            if (rendered + failed) % 100 == 0:
+                self.stdout.write(f'  {rendered + failed}/{len(todo)}')
+
+        rendered, failed = generate_many(todo, workers=options['workers'], progress=progress)
+        for name, error in failed:
+            self.stderr.write(f'  {name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Rendered {rendered} images in {time.monotonic() - started:.1f}s'
+            + (f', {len(failed)} failed' if failed else '')
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import ProductImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream products from a CSV or JSON Lines file and upsert them in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON Lines (.jsonl/.ndjson) file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Override detection by extension')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per batch and transaction')
+
+    def handle(self, *args, **options):
+        importer = ProductImporter(batch_size=options['batch_size'])
+        started = time.monotonic()
+
+        def progress(imported):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'  {imported} rows ({imported / elapsed:.0f} rows/s)')
+
+        self.stdout.write(f'Importing {options["path"]}...')
+        try:
+            imported = importer.run(read_rows(options['path'], options['format']), progress)
+        except (OSError, ValueError) as exc:
+            # Batches before the failing one stay committed
+            raise CommandError(f'{exc} ({importer.imported} rows imported before the error)')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Imported {imported} products in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s)'
+        ))
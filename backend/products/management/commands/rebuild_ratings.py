@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from products.cache import bump_version
+from products.models import Product, Review
+
+
+RATING_FIELDS = [
+    'rating_count', 'rating_sum', 'average_rating',
+    'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+]
+
+
+class Command(BaseCommand):
+    help = 'Recompute product rating aggregates from approved reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        histograms = defaultdict(lambda: [0] * 6)
+        approved = Review.objects.filter(is_approved=True).values('product_id', 'rating')
+        for row in approved.annotate(total=Count('id')).order_by():
+            histograms[row['product_id']][row['rating']] = row['total']
+
+        fixed = []
+        with transaction.atomic():
+            for product in Product.objects.only(*RATING_FIELDS).iterator(chunk_size=batch_size):
+                histogram = histograms.get(product.pk, [0] * 6)
+                count = sum(histogram)
+                total = sum(star * n for star, n in enumerate(histogram))
+                values = {
+                    'rating_count': count,
+                    'rating_sum': total,
+                    'average_rating': total / count if count else 0,
+                }
+                values.update({f'rating_{star}': histogram[star] for star in range(1, 6)})
+
+                if any(getattr(product, field) != value for field, value in values.items()):
+                    for field, value in values.items():
+                        setattr(product, field, value)
+                    fixed.append(product)
+
+            Product.objects.bulk_update(fixed, RATING_FIELDS, batch_size=batch_size)
+
+        if fixed:
+            bump_version('catalog')
+        self.stdout.write(self.style.SUCCESS(f'✓ Fixed ratings on {len(fixed)} products'))
@@ -1,14 +1,29 @@
-from django.core.management.base import BaseCommand
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
 from django.core.files.base import ContentFile
 from products.models import Category, Color, Size, Product, ProductImage
+from products.seeding import ScaleSeeder
 import io
 from PIL import Image
 
 
 class Command(BaseCommand):
-    help = 'Seed database with sample products'
+    help = 'Seed database with sample products, or a benchmark-sized dataset with --scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=int,
+            help='Generate this many products plus categories, users, carts, orders, reviews and wishlists'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for --scale')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert for --scale')
 
     def handle(self, *args, **kwargs):
+        if kwargs['scale']:
+            return self.seed_scale(kwargs['scale'], kwargs['seed'], kwargs['batch_size'])
+
         self.stdout.write('Seeding database with sample data...')
 
         # Create categories
@@ -247,3 +262,15 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('\n✓ Database seeded successfully!'))
         self.stdout.write(f'Created {Product.objects.count()} products')
         self.stdout.write(f'Created {ProductImage.objects.count()} product images')
+
+    def seed_scale(self, scale, seed, batch_size):
+        """Generate a reproducible dataset of `scale` products"""
+        if Product.objects.exists() or get_user_model().objects.filter(username__startswith='seed-user-').exists():
+            raise CommandError('--scale needs an empty catalog; run "manage.py flush" first')
+
+        self.stdout.write(f'Seeding {scale} products (seed {seed})...')
+        started = time.monotonic()
+        ScaleSeeder(scale, seed=seed, batch_size=batch_size, log=self.stdout.write).run()
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✓ Seeded {scale} products in {time.monotonic() - started:.1f}s'
+        ))
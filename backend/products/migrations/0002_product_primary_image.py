@@ -0,0 +1,30 @@
+# Generated by Django 4.2.11 on 2026-10-17 02:16
+
+from django.db import migrations, models
+
+
+def backfill_primary_image(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductImage = apps.get_model('products', 'ProductImage')
+    primary = {}
+    images = ProductImage.objects.order_by('product_id', '-is_primary', 'order', 'pk')
+    for product_id, image in images.values_list('product_id', 'image').iterator():
+        primary.setdefault(product_id, image)
+    for product_id, image in primary.items():
+        Product.objects.filter(pk=product_id).update(primary_image=image)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image',
+            field=models.ImageField(blank=True, editable=False, help_text='Copy of the primary ProductImage used for list thumbnails', upload_to='products/'),
+        ),
+        migrations.RunPython(backfill_primary_image, migrations.RunPython.noop),
+    ]
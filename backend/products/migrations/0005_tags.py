@@ -0,0 +1,76 @@
+# Generated by Django 4.2.11 on 2026-10-17 02:20
+
+from django.db import migrations, models
+from django.utils.text import slugify
+import django.db.models.deletion
+
+
+def backfill_tags(apps, schema_editor):
+    # Same parsing as products.models.parse_tags when this migration was written
+    Product = apps.get_model('products', 'Product')
+    Tag = apps.get_model('products', 'Tag')
+    ProductTag = apps.get_model('products', 'ProductTag')
+
+    product_tags = {}
+    names = {}
+    for product_id, value in Product.objects.exclude(tags='').values_list('id', 'tags').iterator():
+        slugs = []
+        for name in value.split(','):
+            name = name.strip()[:100].strip()
+            slug = slugify(name)[:100].strip('-')
+            if slug and slug not in slugs:
+                slugs.append(slug)
+                names.setdefault(slug, name)
+        product_tags[product_id] = slugs
+
+    Tag.objects.bulk_create(
+        [Tag(name=name, slug=slug) for slug, name in names.items()],
+        batch_size=1000
+    )
+    tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+    ProductTag.objects.bulk_create(
+        [
+            ProductTag(product_id=product_id, tag_id=tag_ids[slug])
+            for product_id, slugs in product_tags.items()
+            for slug in slugs
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_tags', to='products.product')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_tags', to='products.tag')),
+            ],
+            options={
+                'unique_together': {('tag', 'product')},
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, help_text='Normalized copy of tags, kept in sync on save', related_name='products', through='products.ProductTag', to='products.tag'),
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
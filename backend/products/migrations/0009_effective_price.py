@@ -0,0 +1,39 @@
+# Generated by Django 4.2.11 on 2026-10-17 02:31
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Round
+
+
+def backfill_effective_price(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Product.objects.update(effective_price=Round(ExpressionWrapper(
+        F('price') * (Value(100) - F('discount_percentage')) / Value(Decimal('100.00')),
+        output_field=DecimalField(max_digits=10, decimal_places=2)
+    ), 2))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_related_products'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_is_acti_e059f3_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(backfill_effective_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'effective_price', 'id'], name='products_pr_is_acti_ca0b69_idx'),
+        ),
+    ]
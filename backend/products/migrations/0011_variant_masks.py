@@ -0,0 +1,39 @@
+# Generated by Django 4.2.11 on 2026-10-17 02:35
+
+from django.db import migrations, models
+
+
+def backfill_variant_masks(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    for relation, mask_field, variant_field in (
+        ('colors', 'color_mask', 'color_id'),
+        ('sizes', 'size_mask', 'size_id'),
+    ):
+        masks = {}
+        rows = getattr(Product, relation).through.objects.values_list('product_id', variant_field)
+        for product_id, variant_id in rows.iterator():
+            if 0 < variant_id <= 63:
+                masks[product_id] = masks.get(product_id, 0) | (1 << (variant_id - 1))
+        for product_id, mask in masks.items():
+            Product.objects.filter(pk=product_id).update(**{mask_field: mask})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_advised_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='color_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='size_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_variant_masks, migrations.RunPython.noop),
+    ]
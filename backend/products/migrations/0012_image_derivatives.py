@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-17 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_variant_masks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text="Copy of the primary ProductImage's sized derivatives"),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Sized WebP/JPEG variants, see products.images'),
+        ),
+    ]
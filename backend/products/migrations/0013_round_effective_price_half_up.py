@@ -0,0 +1,30 @@
+# Generated by Django 4.2.11 on 2026-10-17 03:19
+
+from django.db import migrations
+from django.db.models import BigIntegerField, DecimalField, ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import Cast, Round
+
+
+def recompute_effective_price(apps, schema_editor):
+    # Half up on integer cents, like Product.compute_effective_price
+    Product = apps.get_model('products', 'Product')
+    cents = Cast(Round(F('price') * Value(100)), BigIntegerField())
+    discounted = ExpressionWrapper(
+        (cents * (Value(100) - F('discount_percentage')) + Value(50)) / Value(100),
+        output_field=BigIntegerField()
+    )
+    Product.objects.update(effective_price=ExpressionWrapper(
+        Cast(discounted, FloatField()) / Value(100),
+        output_field=DecimalField(max_digits=10, decimal_places=2)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_effective_price, migrations.RunPython.noop),
+    ]
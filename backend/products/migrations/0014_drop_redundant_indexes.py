@@ -0,0 +1,37 @@
+# Generated by Django 4.2.11 on 2026-10-17 03:21
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_round_effective_price_half_up'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_created_95a05a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_created_fad208_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_effecti_ca6a63_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_views_c_ddfadd_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_average_a3affa_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='review',
+            name='products_re_product_41ec2b_idx',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-17 03:37
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_drop_redundant_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='category',
+            name='depth',
+        ),
+        migrations.RemoveField(
+            model_name='category',
+            name='path',
+        ),
+    ]
@@ -1,4 +1,12 @@
+import operator
+from collections import Counter
+from decimal import Decimal, ROUND_HALF_UP
+from functools import reduce
+
 from django.db import models
+from django.db.models import BigIntegerField, DecimalField, ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.db.models.lookups import GreaterThan
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -23,6 +31,10 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ['order', 'name']
+        indexes = [
+            # Proposed by advise_indexes
+            models.Index(fields=['order', 'name'], condition=models.Q(is_active=True), name='products_ca_order_e6e823_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -57,6 +69,149 @@ class Size(models.Model):
         return self.name
 
 
+class Tag(models.Model):
+    """Normalized product tag"""
+    MAX_LENGTH = 100
+
+    name = models.CharField(max_length=MAX_LENGTH, unique=True)
+    slug = models.SlugField(max_length=MAX_LENGTH, unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+def parse_tags(value):
+    """
+    Split a comma-separated tag string into {slug: name}. Product.tags is
+    longer than a Tag, so longer tags are cut to Tag.MAX_LENGTH.
+    """
+    tags = {}
+    for name in (value or '').split(','):
+        name = name.strip()[:Tag.MAX_LENGTH].strip()
+        slug = slugify(name)[:Tag.MAX_LENGTH].strip('-')
+        if slug:
+            tags.setdefault(slug, name)
+    return tags
+
+
+def effective_price_expression(price=None, discount_percentage=None):
+    """
+    SQL for the price after discount, rounded half up to cents like
+    Product.compute_effective_price. The rounding runs on integer cents, so
+    backends that store decimals as floats (SQLite) round the same way.
+    """
+    price = F('price') if price is None else price
+    discount = F('discount_percentage') if discount_percentage is None else discount_percentage
+    cents = Cast(Round(price * Value(100)), BigIntegerField())
+    # Integer division: (x + 50) / 100 rounds x / 100 half up for x >= 0
+    discounted = ExpressionWrapper(
+        (cents * (Value(100) - discount) + Value(50)) / Value(100),
+        output_field=BigIntegerField()
+    )
+    # Whole cents convert to floats exactly, and SQLite's NUMERIC cast would
+    # keep them integers
+    return ExpressionWrapper(
+        Cast(discounted, FloatField()) / Value(100),
+        output_field=DecimalField(max_digits=10, decimal_places=2)
+    )
+
+
+# Product.color_mask / size_mask hold bit (id - 1) for variant ids 1..63
+VARIANT_MASK_BITS = 63
+
+
+def variant_bit(pk):
+    """Bit of a color/size id in the variant masks, or None past the mask width"""
+    return 1 << (pk - 1) if 0 < pk <= VARIANT_MASK_BITS else None
+
+
+def _as_expression(value):
+    if value is None or hasattr(value, 'resolve_expression'):
+        return value
+    return Value(value)
+
+
+class ProductQuerySet(models.QuerySet):
+    """Keeps the stored effective price in step with bulk writes"""
+    price_fields = {'price', 'discount_percentage'}
+
+    def update(self, **kwargs):
+        if self.price_fields & kwargs.keys() and 'effective_price' not in kwargs:
+            # SET expressions see the old row, so feed the new values in explicitly
+            kwargs['effective_price'] = effective_price_expression(
+                _as_expression(kwargs.get('price')),
+                _as_expression(kwargs.get('discount_percentage'))
+            )
+        return super().update(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.effective_price = obj.compute_effective_price()
+        update_fields = kwargs.get('update_fields') or []
+        updated_prices = self.price_fields & set(update_fields)
+        if not updated_prices or 'effective_price' in update_fields:
+            return super().bulk_create(objs, *args, **kwargs)
+        if updated_prices == self.price_fields:
+            kwargs['update_fields'] = [*update_fields, 'effective_price']
+            return super().bulk_create(objs, *args, **kwargs)
+
+        # Conflicting rows keep their other price column, which the instances
+        # do not know, so their effective price is recomputed in SQL
+        objs = super().bulk_create(objs, *args, **kwargs)
+        unique_fields = kwargs.get('unique_fields') or ['pk']
+        if len(unique_fields) == 1:
+            rows = Q(**{f'{unique_fields[0]}__in': [getattr(obj, unique_fields[0]) for obj in objs]})
+        else:
+            rows = reduce(operator.or_, (
+                Q(**{field: getattr(obj, field) for field in unique_fields}) for obj in objs
+            ), Q(pk__in=[]))
+        self.filter(rows).update(effective_price=effective_price_expression())
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if self.price_fields & set(fields) and 'effective_price' not in fields:
+            objs = list(objs)
+            for obj in objs:
+                obj.effective_price = obj.compute_effective_price()
+            fields = [*fields, 'effective_price']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def with_any_variant(self, relation, ids):
+        """
+        Products with any of the given colors or sizes (`relation` is 'colors'
+        or 'sizes'), tested against the variant mask instead of joining the
+        M2M table, so no DISTINCT is needed
+        """
+        return self.filter(variant_condition(relation, ids))
+
+
+def variant_condition(relation, ids):
+    """Q matching products that have any of the given colors/sizes"""
+    mask, overflow = 0, []
+    for pk in ids:
+        bit = variant_bit(pk)
+        if bit:
+            mask |= bit
+        else:
+            overflow.append(pk)
+
+    conditions = []
+    if mask:
+        conditions.append(Q(GreaterThan(F(Product.VARIANT_MASKS[relation]).bitand(mask), 0)))
+    if overflow:
+        # Ids past the mask width fall back to a semi-join, still without DISTINCT
+        through = getattr(Product, relation).through
+        variant_column = f'{Product.VARIANT_FIELDS[relation]}_id__in'
+        conditions.append(Q(pk__in=through.objects.filter(**{variant_column: overflow}).values('product_id')))
+    if not conditions:
+        return Q(pk__in=[])
+    return reduce(operator.or_, conditions)
+
+
 class Product(models.Model):
     """Main product model"""
     # Basic information
@@ -73,6 +228,13 @@ class Product(models.Model):
         related_name='products'
     )
     tags = models.CharField(max_length=255, blank=True, help_text="Comma-separated tags")
+    tag_set = models.ManyToManyField(
+        Tag,
+        through='ProductTag',
+        blank=True,
+        related_name='products',
+        help_text="Normalized copy of tags, kept in sync on save"
+    )
 
     # Pricing
     price = models.DecimalField(
@@ -85,6 +247,13 @@ class Product(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(100)],
         help_text="Discount percentage (0-100)"
     )
+    # Price after discount, stored for filtering and sorting in SQL
+    effective_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False
+    )
 
     # Inventory
     stock = models.IntegerField(default=0, validators=[MinValueValidator(0)])
@@ -93,23 +262,72 @@ class Product(models.Model):
     # Variations
     colors = models.ManyToManyField(Color, blank=True, related_name='products')
     sizes = models.ManyToManyField(Size, blank=True, related_name='products')
+    # Variant membership bitmasks, maintained by m2m_changed signals
+    color_mask = models.BigIntegerField(default=0, editable=False)
+    size_mask = models.BigIntegerField(default=0, editable=False)
 
     # Status flags
     is_active = models.BooleanField(default=True)
     is_new = models.BooleanField(default=False, help_text="Mark as New Arrival")
     is_featured = models.BooleanField(default=False, help_text="Featured on homepage")
 
+    # Denormalized primary image, kept in sync by ProductImage signals
+    primary_image = models.ImageField(
+        upload_to='products/',
+        blank=True,
+        editable=False,
+        help_text="Copy of the primary ProductImage used for list thumbnails"
+    )
+    primary_image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Copy of the primary ProductImage's sized derivatives"
+    )
+
+    # Approved review aggregates, maintained by Review signals
+    rating_count = models.IntegerField(default=0, editable=False)
+    rating_sum = models.IntegerField(default=0, editable=False)
+    average_rating = models.FloatField(default=0, editable=False)
+    rating_1 = models.IntegerField(default=0, editable=False)
+    rating_2 = models.IntegerField(default=0, editable=False)
+    rating_3 = models.IntegerField(default=0, editable=False)
+    rating_4 = models.IntegerField(default=0, editable=False)
+    rating_5 = models.IntegerField(default=0, editable=False)
+
     # Metadata
     views_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    VARIANT_MASKS = {'colors': 'color_mask', 'sizes': 'size_mask'}
+    # Columns kept up to date by signals and the view counter with their own
+    # UPDATEs; a full save of an instance loaded earlier must not write its
+    # stale copies back
+    MAINTAINED_FIELDS = frozenset({
+        'color_mask', 'size_mask', 'primary_image', 'primary_image_derivatives',
+        'rating_count', 'rating_sum', 'average_rating',
+        'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5', 'views_count',
+    })
+    VARIANT_FIELDS = {'colors': 'color', 'sizes': 'size'}
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['slug']),
             models.Index(fields=['-created_at']),
-            models.Index(fields=['is_active', '-created_at']),
+            # Composite (ordering, id) indexes back keyset pagination
+            models.Index(fields=['is_active', '-created_at', '-id']),
+            models.Index(fields=['is_active', 'effective_price', 'id']),
+            models.Index(fields=['is_active', 'views_count', 'id']),
+            models.Index(fields=['is_active', 'average_rating', 'id']),
+            # Partial indexes proposed by advise_indexes
+            models.Index(fields=['category', '-created_at'], condition=models.Q(is_active=True), name='products_pr_categor_69ccbb_idx'),
+            models.Index(fields=['stock'], condition=models.Q(is_active=True), name='products_pr_stock_7b0241_idx'),
+            models.Index(fields=['discount_percentage'], condition=models.Q(is_active=True), name='products_pr_discoun_dd1da1_idx'),
+            models.Index(fields=['effective_price'], condition=models.Q(is_active=True, is_new=True), name='products_pr_effecti_5a8836_idx'),
         ]
 
     def __str__(self):
@@ -118,15 +336,111 @@ class Product(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        self.effective_price = self.compute_effective_price()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not args and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            update_fields = kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+                and field.name not in self.MAINTAINED_FIELDS
+            ]
+        if update_fields is not None and ProductQuerySet.price_fields & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'effective_price'}
         super().save(*args, **kwargs)
 
+    def compute_effective_price(self):
+        """Discounted price rounded to cents"""
+        price = Decimal(str(self.price))
+        discounted = price * (100 - int(self.discount_percentage or 0)) / 100
+        return discounted.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    def refresh_primary_image(self):
+        """Re-sync the denormalized primary image from ProductImage rows"""
+        name, derivatives = self.images.order_by('-is_primary', 'order', 'pk').values_list(
+            'image', 'derivatives'
+        ).first() or ('', {})
+        if self.primary_image.name != name or self.primary_image_derivatives != derivatives:
+            self.primary_image = name
+            self.primary_image_derivatives = derivatives
+            Product.objects.filter(pk=self.pk).update(
+                primary_image=name, primary_image_derivatives=derivatives
+            )
+
+    def sync_tags(self):
+        """Re-sync tag_set from the comma-separated tags string"""
+        tags = parse_tags(self.tags)
+        Tag.objects.bulk_create(
+            [Tag(name=name, slug=slug) for slug, name in tags.items()],
+            ignore_conflicts=True
+        )
+        tag_ids = set(Tag.objects.filter(slug__in=tags).values_list('id', flat=True))
+        current = set(self.product_tags.values_list('tag_id', flat=True))
+        if current - tag_ids:
+            self.product_tags.filter(tag_id__in=current - tag_ids).delete()
+        if tag_ids - current:
+            ProductTag.objects.bulk_create(
+                [ProductTag(product=self, tag_id=tag_id) for tag_id in tag_ids - current],
+                ignore_conflicts=True
+            )
+
+    @classmethod
+    def refresh_variant_masks(cls, product_ids, relation):
+        """Recompute the color or size mask of the given products from the M2M rows"""
+        masks = dict.fromkeys(product_ids, 0)
+        if not masks:
+            return
+        through = getattr(cls, relation).through
+        rows = through.objects.filter(product_id__in=masks).values_list(
+            'product_id', f'{cls.VARIANT_FIELDS[relation]}_id'
+        )
+        for product_id, variant_id in rows:
+            masks[product_id] |= variant_bit(variant_id) or 0
+
+        by_mask = {}
+        for product_id, mask in masks.items():
+            by_mask.setdefault(mask, []).append(product_id)
+        for mask, ids in by_mask.items():
+            cls.objects.filter(pk__in=ids).update(**{cls.VARIANT_MASKS[relation]: mask})
+
+    @classmethod
+    def clear_variant_bit(cls, relation, variant_id):
+        """Drop a deleted color or size from every product's mask"""
+        bit = variant_bit(variant_id)
+        if bit:
+            mask = F(cls.VARIANT_MASKS[relation])
+            cls.objects.filter(GreaterThan(mask.bitand(bit), 0)).update(
+                **{cls.VARIANT_MASKS[relation]: mask.bitand(~bit)}
+            )
+
+    @classmethod
+    def adjust_ratings(cls, ratings, delta):
+        """
+        Add (delta=1) or remove (delta=-1) approved ratings given as
+        (product_id, rating) pairs, with one atomic UPDATE per pair
+        """
+        for (product_id, rating), count in Counter(ratings).items():
+            change = delta * count
+            # SET expressions see the old row, so the average uses the new totals explicitly
+            average = Cast(F('rating_sum') + change * rating, FloatField()) / NullIf(
+                F('rating_count') + change, 0
+            )
+            cls.objects.filter(pk=product_id).update(
+                rating_count=F('rating_count') + change,
+                rating_sum=F('rating_sum') + change * rating,
+                average_rating=Coalesce(average, Value(0.0)),
+                **{f'rating_{rating}': F(f'rating_{rating}') + change}
+            )
+
+    @property
+    def rating_histogram(self):
+        """Approved review counts per star"""
+        return {star: getattr(self, f'rating_{star}') for star in range(1, 6)}
+
     @property
     def discounted_price(self):
-        """Calculate price after discount"""
-        if self.discount_percentage > 0:
-            discount = (self.price * self.discount_percentage) / 100
-            return self.price - discount
-        return self.price
+        """Price after discount, rounded to cents like the stored effective_price"""
+        return self.compute_effective_price()
 
     @property
     def is_on_sale(self):
@@ -144,6 +458,50 @@ class Product(models.Model):
         return 0 < self.stock <= self.low_stock_threshold
 
 
+class ProductTag(models.Model):
+    """Through model linking products to normalized tags"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='product_tags'
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='product_tags'
+    )
+
+    class Meta:
+        # (tag, product) doubles as the index for tag filtering
+        unique_together = ['tag', 'product']
+
+    def __str__(self):
+        return f"{self.product.name} - {self.tag.name}"
+
+
+class RelatedProduct(models.Model):
+    """Precomputed "bought together" recommendations, built by build_recommendations"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='recommendations'
+    )
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.IntegerField(help_text="Number of orders containing both products")
+
+    class Meta:
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'rank']
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank})"
+
+
 class ProductImage(models.Model):
     """Product images with multiple images per product"""
     product = models.ForeignKey(
@@ -152,6 +510,12 @@ class ProductImage(models.Model):
         related_name='images'
     )
     image = models.ImageField(upload_to='products/')
+    derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Sized WebP/JPEG variants, see products.images"
+    )
     alt_text = models.CharField(max_length=255, blank=True)
     is_primary = models.BooleanField(default=False)
     order = models.IntegerField(default=0)
@@ -188,6 +552,25 @@ class Review(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['product', 'user']  # One review per user per product
+        indexes = [
+            models.Index(fields=['is_approved', '-created_at', '-id']),
+            models.Index(fields=['product', 'is_approved', '-created_at', '-id']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.product.name} ({self.rating}/5)"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Read the loaded values directly: rating_state would fetch deferred
+        # fields, which loads another instance and recurses
+        loaded = instance.__dict__
+        if all(name in loaded for name in ('product_id', 'rating', 'is_approved')):
+            instance._rating_state = (loaded['product_id'], loaded['rating']) if loaded['is_approved'] else None
+        return instance
+
+    @property
+    def rating_state(self):
+        """(product_id, rating) when this review counts towards the product rating"""
+        return (self.product_id, self.rating) if self.is_approved else None
@@ -0,0 +1,98 @@
+"""
+Co-purchase ("bought together") recommendations.
+
+Order lines are streamed in chunks into a sparse orders x products incidence
+matrix B; the product x product co-occurrence matrix is accumulated as
+C += B_chunk.T @ B_chunk, so memory depends on the number of products and
+co-purchased pairs, never on the number of order lines.
+"""
+import numpy as np
+from scipy import sparse
+
+from django.apps import apps
+from django.db import transaction
+
+from .models import Product, RelatedProduct
+
+
+def stream_order_chunks(chunk_size):
+    """Yield lists of (order_id, product_id) rows without splitting an order"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    rows = OrderItem.objects.filter(product__isnull=False).order_by('order_id').values_list(
+        'order_id', 'product_id'
+    )
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        if len(chunk) >= chunk_size and row[0] != chunk[-1][0]:
+            yield chunk
+            chunk = []
+        chunk.append(row)
+    if chunk:
+        yield chunk
+
+
+def build_co_occurrence(product_ids, chunk_size=50000):
+    """Return the sparse co-occurrence matrix indexed like `product_ids`"""
+    index = {product_id: position for position, product_id in enumerate(product_ids)}
+    size = len(product_ids)
+    co_occurrence = sparse.csr_matrix((size, size), dtype=np.int64)
+
+    for chunk in stream_order_chunks(chunk_size):
+        orders = {}
+        rows, cols = [], []
+        for order_id, product_id in chunk:
+            if product_id in index:
+                rows.append(orders.setdefault(order_id, len(orders)))
+                cols.append(index[product_id])
+        if not rows:
+            continue
+
+        incidence = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (rows, cols)),
+            shape=(len(orders), size)
+        )
+        # Count a product once per order, whatever its color/size lines
+        incidence.data[:] = 1
+        co_occurrence = co_occurrence + incidence.T @ incidence
+
+    co_occurrence.setdiag(0)
+    co_occurrence.eliminate_zeros()
+    return co_occurrence
+
+
+def top_k(co_occurrence, k):
+    """Yield (row, [(col, score), ...]) with the k best-scoring columns per row"""
+    co_occurrence = co_occurrence.tocsr()
+    for row in range(co_occurrence.shape[0]):
+        start, end = co_occurrence.indptr[row], co_occurrence.indptr[row + 1]
+        if start == end:
+            continue
+        cols = co_occurrence.indices[start:end]
+        scores = co_occurrence.data[start:end]
+        # Highest score first, lower column (older product) on ties
+        best = np.lexsort((cols, -scores))[:k]
+        yield row, [(int(cols[i]), int(scores[i])) for i in best]
+
+
+def rebuild_recommendations(k=8, chunk_size=50000, batch_size=5000):
+    """Recompute every product's top-k co-purchased products"""
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    co_occurrence = build_co_occurrence(product_ids, chunk_size)
+
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        batch = []
+        for row, neighbors in top_k(co_occurrence, k):
+            for rank, (col, score) in enumerate(neighbors):
+                batch.append(RelatedProduct(
+                    product_id=product_ids[row],
+                    related_id=product_ids[col],
+                    rank=rank,
+                    score=score
+                ))
+            if len(batch) >= batch_size:
+                RelatedProduct.objects.bulk_create(batch)
+                batch = []
+        RelatedProduct.objects.bulk_create(batch)
+
+    return RelatedProduct.objects.count()
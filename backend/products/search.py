@@ -0,0 +1,396 @@
+"""
+Full-text product search.
+
+Products are kept in an inverted index that is updated incrementally when a
+product is saved or deleted:
+
+- SQLite: an FTS5 virtual table ranked with bm25()
+- PostgreSQL: a weighted tsvector table with a GIN index ranked with ts_rank()
+- anything else: an in-process inverted index ranked with BM25
+
+Every backend matches all query terms as word prefixes ("hood" finds
+"hoodie"). Unlike the icontains SearchFilter it replaces, text inside a word
+does not match ("oodie" finds nothing). `filter()` restricts a product
+queryset to the matches and annotates `search_rank` (lower is better); the
+SQL backends do both in the database, so every match is counted and paged.
+"""
+import bisect
+import math
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, F, FloatField, Func, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+
+from .cache import bump_version, catalog_cache_timeout, get_version, versions_are_shared
+from .models import Product
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Field weights: name matches rank above tags, tags above description
+SEARCH_FIELDS = (('name', 3.0), ('tags', 2.0), ('description', 1.0))
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class JoinCondition(Func):
+    """
+    WHERE condition joining a search table, added with extra(tables=...),
+    to the product row: `{pk}` in the SQL becomes the product's primary key
+    column, compiled under whatever alias the query (or an enclosing one)
+    gives the product table.
+    """
+    output_field = BooleanField()
+
+    def __init__(self, sql, params):
+        super().__init__(F('pk'))
+        self.sql = sql
+        self.params = params
+
+    def as_sql(self, compiler, connection, **extra_context):
+        pk_sql, pk_params = compiler.compile(self.source_expressions[0])
+        return f'({self.sql.replace("{pk}", pk_sql)})', [*self.params, *pk_params]
+
+
+class SearchBackend(ABC):
+    """Base class for product search backends"""
+
+    @abstractmethod
+    def filter(self, queryset, query):
+        """Restrict `queryset` to products matching `query`, annotated with `search_rank`"""
+
+    @abstractmethod
+    def index(self, product):
+        pass
+
+    @abstractmethod
+    def index_many(self, product_ids):
+        """(Re)index several products at once, e.g. after a bulk import"""
+
+    @abstractmethod
+    def remove(self, product_id):
+        pass
+
+    @abstractmethod
+    def rebuild(self):
+        pass
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """SQLite FTS5 index ranked with bm25()"""
+    table = 'products_product_fts'
+
+    weights = ', '.join(str(weight) for _, weight in SEARCH_FIELDS)
+
+    @staticmethod
+    def match(query):
+        terms = tokenize(query)
+        return ' '.join(f'"{term}"*' for term in terms) if terms else None
+
+    def filter(self, queryset, query):
+        match = self.match(query)
+        if match is None:
+            return queryset.none()
+        # One MATCH joined on rowid; bm25() is negative, best match lowest
+        return queryset.extra(tables=[self.table]).filter(JoinCondition(
+            f'{self.table}.rowid = {{pk}} AND {self.table} MATCH %s', [match]
+        )).annotate(search_rank=RawSQL(
+            f'bm25({self.table}, {self.weights})', [], output_field=FloatField()
+        ))
+
+    def index(self, product):
+        self.remove(product.pk)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, tags, description) '
+                f'VALUES (%s, %s, %s, %s)',
+                [product.pk, product.name, product.tags, product.description]
+            )
+
+    def index_many(self, product_ids):
+        product_ids = list(product_ids)
+        rows = Product.objects.filter(pk__in=product_ids).values_list('pk', 'name', 'tags', 'description')
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in product_ids])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, name, tags, description) '
+                f'VALUES (%s, %s, %s, %s)',
+                list(rows)
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [product_id])
+
+    def rebuild(self):
+        rows = Product.objects.values_list('pk', 'name', 'tags', 'description')
+        # One transaction: in autocommit every inserted row would commit on its own
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, name, tags, description) '
+                f'VALUES (%s, %s, %s, %s)',
+                list(rows.iterator())
+            )
+
+
+class PostgresSearchBackend(SearchBackend):
+    """PostgreSQL tsvector index (GIN) ranked with ts_rank()"""
+    table = 'products_product_search'
+    document = (
+        "setweight(to_tsvector('simple', coalesce(%s, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(%s, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(%s, '')), 'C')"
+    )
+
+    @staticmethod
+    def tsquery(query):
+        terms = tokenize(query)
+        return ' & '.join(f'{term}:*' for term in terms) if terms else None
+
+    def filter(self, queryset, query):
+        tsquery = self.tsquery(query)
+        if tsquery is None:
+            return queryset.none()
+        # Negated so that, as with the other backends, the best match ranks lowest
+        return queryset.extra(tables=[self.table]).filter(JoinCondition(
+            f"{self.table}.product_id = {{pk}} AND {self.table}.document @@ to_tsquery('simple', %s)",
+            [tsquery]
+        )).annotate(search_rank=RawSQL(
+            f"-ts_rank({self.table}.document, to_tsquery('simple', %s))", [tsquery],
+            output_field=FloatField()
+        ))
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.table} (product_id, document) VALUES (%s, {self.document}) '
+                f'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                [product.pk, product.name, product.tags, product.description]
+            )
+
+    def index_many(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.table} (product_id, document) '
+                f'SELECT id, {self.document % ("name", "tags", "description")} '
+                f'FROM products_product WHERE id = ANY(%s) '
+                f'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                [list(product_ids)]
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE product_id = %s', [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (product_id, document) '
+                f'SELECT id, {self.document % ("name", "tags", "description")} '
+                f'FROM products_product'
+            )
+
+
+class InMemorySearchBackend(SearchBackend):
+    """
+    Pure-Python inverted index ranked with BM25, for databases without a
+    native full-text index. Each process keeps its own copy. Every change
+    bumps the 'search' version and records the changed product ids under
+    it, so other processes re-read just those products; they reload
+    everything only when the log has gaps.
+    """
+    k1 = 1.2
+    b = 0.75
+    CHANGES_KEY = 'products:search:changes:{}'
+    # Beyond this many unseen versions a reload is cheaper than catching up
+    max_catch_up = 100
+
+    def __init__(self):
+        self.version = None
+        self.loaded_at = None
+        self._clear()
+
+    def _clear(self):
+        self.postings = defaultdict(dict)  # term -> {product_id: weighted tf}
+        self.documents = {}  # product_id -> terms, for incremental removal
+        self.lengths = {}
+        self.terms = []  # sorted vocabulary for prefix lookups
+
+    def _add(self, product_id, fields):
+        terms = set()
+        length = 0
+        for (_, weight), text in zip(SEARCH_FIELDS, fields):
+            for token in tokenize(text):
+                postings = self.postings[token]
+                if not postings:
+                    bisect.insort(self.terms, token)
+                postings[product_id] = postings.get(product_id, 0) + weight
+                terms.add(token)
+                length += 1
+        self.documents[product_id] = terms
+        self.lengths[product_id] = length
+
+    def _discard(self, product_id):
+        self.lengths.pop(product_id, None)
+        for term in self.documents.pop(product_id, ()):
+            del self.postings[term][product_id]
+            if not self.postings[term]:
+                del self.postings[term]
+                del self.terms[bisect.bisect_left(self.terms, term)]
+
+    def _load(self):
+        self._clear()
+        fields = [field for field, _ in SEARCH_FIELDS]
+        for row in Product.objects.values_list('pk', *fields).iterator(chunk_size=2000):
+            self._add(row[0], row[1:])
+        self.loaded_at = time.monotonic()
+
+    def _reindex(self, product_ids):
+        """Re-read products from the database; ids no longer there are dropped"""
+        product_ids = set(product_ids)
+        fields = [field for field, _ in SEARCH_FIELDS]
+        for row in Product.objects.filter(pk__in=product_ids).values_list('pk', *fields):
+            self._discard(row[0])
+            self._add(row[0], row[1:])
+            product_ids.discard(row[0])
+        for product_id in product_ids:
+            self._discard(product_id)
+
+    def _changes_since(self, version):
+        """Product ids changed by the versions after ours, or None when unknown"""
+        if not isinstance(self.version, int) or not 0 < version - self.version <= self.max_catch_up:
+            return None
+        keys = [self.CHANGES_KEY.format(number) for number in range(self.version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return {product_id for ids in changes.values() for product_id in ids}
+
+    def _ensure_loaded(self):
+        version = get_version('search')
+        if self.version is not None and not versions_are_shared() and (
+            time.monotonic() - self.loaded_at >= catalog_cache_timeout()
+        ):
+            # Other processes' changes are invisible with a process-local cache
+            self.version = None
+        if version == self.version:
+            return
+        changed = self._changes_since(version)
+        if changed is None:
+            self._load()
+        else:
+            self._reindex(changed)
+        self.version = version
+
+    def _changed(self, product_ids):
+        """Publish a local change to the other processes"""
+        version = bump_version('search')
+        cache.set(self.CHANGES_KEY.format(version), list(product_ids), catalog_cache_timeout())
+        if version == (self.version or 0) + 1:
+            self.version = version
+        # Otherwise another process changed the index meanwhile: the next
+        # _ensure_loaded() catches up on both changes
+
+    def _expand(self, prefix):
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + '\uffff')
+        return self.terms[start:end]
+
+    def search(self, query, limit):
+        """Return up to `limit` product ids, best match first"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        self._ensure_loaded()
+
+        total = len(self.lengths) or 1
+        avg_length = sum(self.lengths.values()) / total or 1
+        scores = None
+        for prefix in terms:
+            term_scores = defaultdict(float)
+            for term in self._expand(prefix):
+                postings = self.postings[term]
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for product_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[product_id] / avg_length)
+                    term_scores[product_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {pid: score + term_scores[pid] for pid, score in scores.items() if pid in term_scores}
+            if not scores:
+                return []
+
+        return sorted(scores, key=scores.get, reverse=True)[:limit]
+
+    def filter(self, queryset, query):
+        ids = self.search(query, None)
+        if not ids:
+            return queryset.none()
+        # Every match is kept; only the best ones get a rank of their own
+        ranked = ids[:settings.PRODUCT_SEARCH_MAX_RESULTS]
+        rank = Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ranked)],
+            default=Value(len(ranked)),
+            output_field=IntegerField()
+        )
+        return queryset.filter(pk__in=ids).annotate(search_rank=rank)
+
+    def index(self, product):
+        self._ensure_loaded()
+        self._discard(product.pk)
+        self._add(product.pk, [getattr(product, field) for field, _ in SEARCH_FIELDS])
+        self._changed([product.pk])
+
+    def index_many(self, product_ids):
+        product_ids = list(product_ids)
+        self._ensure_loaded()
+        self._reindex(product_ids)
+        self._changed(product_ids)
+
+    def remove(self, product_id):
+        self._ensure_loaded()
+        self._discard(product_id)
+        self._changed([product_id])
+
+    def rebuild(self):
+        self._load()
+        # No change log entry: every process reloads
+        self.version = bump_version('search')
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the search backend configured for the default database"""
+    global _backend
+    if _backend is None:
+        name = getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'auto')
+        if name == 'auto':
+            name = {'sqlite': 'sqlite', 'postgresql': 'postgres'}.get(connection.vendor, 'python')
+            if name == 'sqlite' and not _table_exists(SQLiteFTSBackend.table):
+                # SQLite built without FTS5
+                name = 'python'
+        _backend = {
+            'sqlite': SQLiteFTSBackend,
+            'postgres': PostgresSearchBackend,
+            'python': InMemorySearchBackend,
+        }[name]()
+    return _backend
+
+
+def _table_exists(table):
+    with connection.cursor() as cursor:
+        return table in connection.introspection.table_names(cursor)
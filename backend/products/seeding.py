@@ -0,0 +1,348 @@
+"""
+Benchmark-sized datasets for `seed_products --scale N`.
+
+Everything is drawn from one `random.Random(seed)`, so the same scale and
+seed always produce the same rows on an empty database. Rows are written
+with bulk_create in batches, each batch in its own transaction, and the
+columns that signals normally maintain (category paths, effective price,
+variant masks, tags, primary images, rating aggregates, search index) are
+filled in directly, since bulk_create sends no signals.
+
+Per N products the dataset holds roughly:
+
+- N / 200 categories (at least 6) in a three-level tree
+- 1-3 images per product, all pointing at a few shared placeholder files
+- N / 10 users, a third of them with a cart
+- N / 5 orders with 1-4 items each
+- up to 5 reviews per product and up to 5 wishlist items per user
+"""
+import io
+import random
+import uuid
+from array import array
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from PIL import Image
+
+from orders.models import Cart, CartItem, Order, OrderItem
+from wishlist.models import Wishlist
+
+from .cache import bump_version
+from .images import render_derivatives, store_derivatives
+from .models import (
+    Category, Color, Size, Tag, Product, ProductImage, ProductTag, Review, parse_tags, variant_bit
+)
+from .search import get_search_backend
+
+
+COLORS = [
+    ('Black', '#000000'), ('White', '#FFFFFF'), ('Navy', '#1F3A93'), ('Red', '#E74C3C'),
+    ('Green', '#27AE60'), ('Blue', '#3498DB'), ('Gray', '#95A5A6'), ('Yellow', '#F1C40F'),
+    ('Orange', '#E67E22'), ('Purple', '#8E44AD'), ('Pink', '#FF69B4'), ('Brown', '#8B4513'),
+]
+SIZES = [('XS', 1), ('S', 2), ('M', 3), ('L', 4), ('XL', 5), ('XXL', 6)]
+ADJECTIVES = [
+    'Classic', 'Vintage', 'Essential', 'Oversized', 'Slim', 'Heavyweight', 'Organic',
+    'Everyday', 'Campus', 'Retro', 'Premium', 'Lightweight', 'Cozy', 'Athletic',
+]
+NOUNS = [
+    'T-Shirt', 'Hoodie', 'Sweatshirt', 'Cap', 'Beanie', 'Backpack', 'Tote Bag', 'Mug',
+    'Jacket', 'Polo', 'Scarf', 'Socks', 'Notebook', 'Water Bottle', 'Sticker Pack',
+]
+TAGS = [
+    'cotton', 'fleece', 'unisex', 'limited', 'eco', 'gift', 'winter', 'summer', 'logo',
+    'embroidered', 'printed', 'sport', 'casual', 'university', 'alumni', 'bestseller',
+]
+PLACEHOLDER_COLORS = ['#1F3A93', '#FFFFFF', '#000000', '#95A5A6', '#E74C3C', '#27AE60', '#F1C40F', '#8E44AD']
+ORDER_STATUSES = ['PENDING', 'PROCESSING', 'SHIPPED', 'DELIVERED', 'COMPLETED', 'CANCELLED']
+PAYMENT_METHODS = ['CLICK', 'PAYME', 'COD']
+CITIES = ['Tashkent', 'Samarkand', 'Bukhara', 'Namangan', 'Andijan', 'Fergana', 'Nukus']
+
+
+class ScaleSeeder:
+    """Generates a reproducible catalog, customers and order history"""
+
+    def __init__(self, scale, seed=0, batch_size=5000, log=print):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log
+        self.now = timezone.now()
+
+    def run(self):
+        self.seed_lookups()
+        self.seed_categories()
+        self.seed_placeholders()
+        self.seed_users()
+        self.seed_products()
+        self.seed_carts()
+        self.seed_orders()
+        self.seed_wishlists()
+        self.log('Indexing products for search...')
+        get_search_backend().rebuild()
+        bump_version('categories')
+        bump_version('catalog')
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield range(start, min(start + self.batch_size, total))
+
+    # ================================
+    # Catalog
+    # ================================
+
+    def seed_lookups(self):
+        Color.objects.bulk_create([Color(name=n, hex_code=h) for n, h in COLORS], ignore_conflicts=True)
+        Size.objects.bulk_create([Size(name=n, order=o) for n, o in SIZES], ignore_conflicts=True)
+        Tag.objects.bulk_create(
+            [Tag(name=name, slug=slugify(name)) for name in TAGS], ignore_conflicts=True
+        )
+        self.colors = list(Color.objects.filter(name__in=[n for n, _ in COLORS]).order_by('name').values_list('id', 'name'))
+        self.sizes = list(Size.objects.filter(name__in=[n for n, _ in SIZES]).order_by('name').values_list('id', 'name'))
+        self.tags = dict(Tag.objects.filter(slug__in=[slugify(name) for name in TAGS]).values_list('slug', 'id'))
+
+    def seed_categories(self):
+        """A three-level tree; products are attached to the leaves"""
+        total = max(6, self.scale // 200)
+        roots = max(2, round(total ** (1 / 3)))
+        per_parent = max(1, round(((total - roots) / roots) ** 0.5))
+        self.log(f'Creating {total} categories...')
+
+        parents, created = [None], 0
+        for _ in range(3):
+            level = []
+            for parent in parents:
+                for _ in range(roots if parent is None else per_parent):
+                    if created >= total:
+                        break
+                    created += 1
+                    level.append(Category(
+                        name=f'{self.rng.choice(ADJECTIVES)} {self.rng.choice(NOUNS)}s {created}',
+                        slug=f'seed-category-{created}',
+                        description=f'Seeded category {created}',
+                        parent=parent,
+                        order=created,
+                    ))
+            if not level:
+                break
+            Category.objects.bulk_create(level)
+            self.leaves = level
+            parents = level
+        self.leaf_ids = [category.pk for category in self.leaves]
+
+    def seed_placeholders(self):
+        """A few shared image files, with derivatives rendered once"""
+        self.placeholders = []
+        for index, color in enumerate(PLACEHOLDER_COLORS):
+            buffer = io.BytesIO()
+            Image.new('RGB', (800, 1000), color=color).save(buffer, format='JPEG', quality=85)
+            name = f'products/seed/placeholder-{index + 1}.jpg'
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            derivatives = store_derivatives(name, render_derivatives(buffer.getvalue()))
+            self.placeholders.append((name, derivatives))
+
+    def product_name(self, index):
+        return f'{ADJECTIVES[index % len(ADJECTIVES)]} {NOUNS[index // len(ADJECTIVES) % len(NOUNS)]} {index + 1}'
+
+    def seed_products(self):
+        self.log(f'Creating {self.scale} products...')
+        rng = self.rng
+        self.product_ids = array('q')
+        self.price_cents = array('q')
+        self.discounts = array('b')
+
+        for batch in self.batches(self.scale):
+            products, links = [], []
+            for index in batch:
+                name = self.product_name(index)
+                colors = rng.sample(self.colors, rng.randint(1, 4))
+                sizes = rng.sample(self.sizes, rng.randint(0, 5))
+                tags = ', '.join(rng.sample(TAGS, rng.randint(1, 4)))
+                reviews = self.plan_reviews(rng.choices(range(6), weights=[30, 25, 20, 12, 8, 5])[0])
+                image = rng.randrange(len(self.placeholders))
+                cents = rng.randint(10, 5000) * 1000
+                discount = rng.choice([0, 0, 0, 0, 10, 15, 20, 30, 50])
+
+                color_mask = size_mask = 0
+                for pk, _ in colors:
+                    color_mask |= variant_bit(pk) or 0
+                for pk, _ in sizes:
+                    size_mask |= variant_bit(pk) or 0
+                histogram = Counter(rating for _, rating in reviews)
+                rating_sum = sum(rating for _, rating in reviews)
+                products.append(Product(
+                    name=name,
+                    slug=slugify(name),
+                    description=f'{name}. Seeded product for profiling the catalog.',
+                    short_description=name,
+                    category_id=rng.choice(self.leaf_ids),
+                    tags=tags,
+                    price=Decimal(cents) / 100,
+                    discount_percentage=discount,
+                    stock=rng.choice([0, rng.randint(1, 9), rng.randint(10, 500)]),
+                    color_mask=color_mask,
+                    size_mask=size_mask,
+                    is_active=rng.random() > 0.05,
+                    is_new=rng.random() < 0.1,
+                    is_featured=rng.random() < 0.02,
+                    primary_image=self.placeholders[image][0],
+                    primary_image_derivatives=self.placeholders[image][1],
+                    views_count=rng.randint(0, 10000),
+                    rating_count=len(reviews),
+                    rating_sum=rating_sum,
+                    average_rating=rating_sum / len(reviews) if reviews else 0,
+                    **{f'rating_{star}': histogram[star] for star in range(1, 6)},
+                ))
+                links.append((colors, sizes, image, reviews))
+                self.price_cents.append(cents)
+                self.discounts.append(discount)
+
+            with transaction.atomic():
+                Product.objects.bulk_create(products)
+                self.seed_product_rows(products, links)
+            self.product_ids.extend(product.pk for product in products)
+            self.log(f'  {batch.stop} products')
+
+    def plan_reviews(self, count):
+        """(user index, rating) pairs from distinct users"""
+        users = self.rng.sample(range(self.user_count), min(count, self.user_count))
+        return [(user, self.rng.choices(range(1, 6), weights=[5, 5, 15, 35, 40])[0]) for user in users]
+
+    def seed_product_rows(self, products, links):
+        colors, sizes, images, tags, reviews = [], [], [], [], []
+        for product, (product_colors, product_sizes, image, product_reviews) in zip(products, links):
+            colors += [Product.colors.through(product_id=product.pk, color_id=pk) for pk, _ in product_colors]
+            sizes += [Product.sizes.through(product_id=product.pk, size_id=pk) for pk, _ in product_sizes]
+            for order in range(self.rng.randint(1, 3)):
+                name, derivatives = self.placeholders[(image + order) % len(self.placeholders)]
+                images.append(ProductImage(
+                    product_id=product.pk, image=name, derivatives=derivatives,
+                    alt_text=f'{product.name} - Image {order + 1}', is_primary=order == 0, order=order,
+                ))
+            tags += [ProductTag(product_id=product.pk, tag_id=self.tags[slug]) for slug in parse_tags(product.tags)]
+            reviews += [
+                Review(product_id=product.pk, user_id=self.user_ids[user], rating=rating,
+                       comment=f'Rated {rating} of 5', is_approved=True)
+                for user, rating in product_reviews
+            ]
+        Product.colors.through.objects.bulk_create(colors)
+        Product.sizes.through.objects.bulk_create(sizes)
+        ProductImage.objects.bulk_create(images)
+        ProductTag.objects.bulk_create(tags)
+        Review.objects.bulk_create(reviews)
+
+    # ================================
+    # Customers
+    # ================================
+
+    def seed_users(self):
+        User = get_user_model()
+        self.user_count = max(10, self.scale // 10)
+        self.log(f'Creating {self.user_count} users...')
+        # Hashing once keeps millions of users affordable; every seeded user logs in with "password"
+        password = make_password('password')
+        self.user_ids = array('q')
+        for batch in self.batches(self.user_count):
+            users = [
+                User(
+                    username=f'seed-user-{index + 1}',
+                    email=f'seed-user-{index + 1}@example.com',
+                    first_name=self.rng.choice(['Aziz', 'Dilnoza', 'Jasur', 'Malika', 'Timur', 'Nodira']),
+                    last_name=f'User{index + 1}',
+                    password=password,
+                    phone_number=f'+998{self.rng.randint(900000000, 999999999)}',
+                    city=self.rng.choice(CITIES),
+                )
+                for index in batch
+            ]
+            User.objects.bulk_create(users)
+            self.user_ids.extend(user.pk for user in users)
+
+    def seed_carts(self):
+        self.log('Creating carts...')
+        rng = self.rng
+        for batch in self.batches(len(self.user_ids)):
+            users = [self.user_ids[index] for index in batch if rng.random() < 1 / 3]
+            with transaction.atomic():
+                carts = Cart.objects.bulk_create([Cart(user_id=user_id) for user_id in users])
+                CartItem.objects.bulk_create([
+                    CartItem(
+                        cart_id=cart.pk,
+                        product_id=self.product_ids[product],
+                        quantity=rng.randint(1, 3),
+                        color_id=rng.choice(self.colors)[0],
+                        size_id=rng.choice(self.sizes)[0],
+                    )
+                    for cart in carts
+                    for product in rng.sample(range(len(self.product_ids)), rng.randint(1, 4))
+                ])
+
+    def seed_orders(self):
+        rng = self.rng
+        total = max(10, self.scale // 5)
+        self.log(f'Creating {total} orders...')
+        for batch in self.batches(total):
+            orders, lines = [], []
+            for _ in batch:
+                items = []
+                for product in rng.sample(range(len(self.product_ids)), rng.randint(1, 4)):
+                    price = Decimal(self.price_cents[product]) / 100
+                    discount = self.discounts[product]
+                    quantity = rng.randint(1, 3)
+                    items.append(OrderItem(
+                        product_id=self.product_ids[product],
+                        product_name=self.product_name(product),
+                        product_price=price,
+                        color=rng.choice(self.colors)[1],
+                        size=rng.choice(self.sizes)[1],
+                        quantity=quantity,
+                        discount_percentage=discount,
+                        subtotal=(price * (100 - discount) / 100 * quantity).quantize(Decimal('0.01')),
+                    ))
+                subtotal = sum(item.subtotal for item in items)
+                status = rng.choice(ORDER_STATUSES)
+                paid = status in ('SHIPPED', 'DELIVERED', 'COMPLETED')
+                user = rng.randrange(len(self.user_ids)) if rng.random() < 0.8 else None
+                orders.append(Order(
+                    order_number=uuid.UUID(int=rng.getrandbits(128), version=4),
+                    user_id=self.user_ids[user] if user is not None else None,
+                    email=f'seed-user-{user + 1}@example.com' if user is not None else 'guest@example.com',
+                    phone_number=f'+998{rng.randint(900000000, 999999999)}',
+                    full_name=f'Seed Customer {user + 1}' if user is not None else 'Guest Customer',
+                    address=f'{rng.randint(1, 200)} University Street',
+                    city=rng.choice(CITIES),
+                    status=status,
+                    payment_status='COMPLETED' if paid else 'PENDING',
+                    payment_method=rng.choice(PAYMENT_METHODS),
+                    subtotal=subtotal,
+                    total=subtotal,
+                    paid_at=self.now if paid else None,
+                ))
+                lines.append(items)
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                for order, items in zip(orders, lines):
+                    for item in items:
+                        item.order_id = order.pk
+                OrderItem.objects.bulk_create([item for items in lines for item in items])
+
+    def seed_wishlists(self):
+        self.log('Creating wishlists...')
+        rng = self.rng
+        for batch in self.batches(len(self.user_ids)):
+            Wishlist.objects.bulk_create([
+                Wishlist(user_id=self.user_ids[user], product_id=self.product_ids[product])
+                for user in batch
+                for product in rng.sample(range(len(self.product_ids)), rng.randint(0, 5))
+            ])
@@ -1,7 +1,115 @@
+from decimal import ROUND_HALF_UP
+
 from rest_framework import serializers
+
+from config.fastpath import CompiledListSerializer, decimal_formatter, format_datetime
+from config.media import media_url_resolver
+
+from .cache import get_category_tree
+from .images import srcsets
 from .models import Category, Color, Size, Product, ProductImage, Review
 
 
+def requested_names(request, param, path=''):
+    """
+    Names requested at `path` by a comma-separated query param such as
+    ?fields=id,product.name, or None when the param is absent
+    """
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    tokens = [token.strip() for token in value.split(',')]
+    return {
+        token[len(path):].split('.')[0]
+        for token in tokens
+        if token.startswith(path) and len(token) > len(path)
+    }
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin for ?fields= and ?expand=.
+
+    `fields` limits the keys in the payload and `expand` lists the relations
+    to embed; relations that are requested but not expanded are rendered as
+    primary keys. Nested serializers are addressed with dotted paths
+    (?fields=id,product.name&expand=product). Without ?expand= every
+    relation is embedded, as before.
+    """
+    # Relation name -> factory for its primary-key representation
+    expandable_fields = {}
+    # Field name -> ('select' | 'prefetch', lookup) needed to render it
+    related_lookups = {}
+    # Relation name -> serializer class embedded when expanded
+    nested_serializers = {}
+
+    @property
+    def sparse_path(self):
+        """Dotted path of this serializer below the outermost sparse serializer"""
+        names = []
+        node = self
+        while True:
+            parent = node.parent
+            if isinstance(parent, serializers.ListSerializer):
+                # many=True: the list serializer carries the field name
+                node, parent = parent, parent.parent
+            if not isinstance(parent, SparseFieldsMixin):
+                break
+            names.insert(0, node.field_name)
+            node = parent
+        return ''.join(f'{name}.' for name in names)
+
+    @classmethod
+    def requested(cls, request, path=''):
+        """(fields, expand) requested at `path`; None means no restriction"""
+        only = requested_names(request, 'fields', path)
+        if path and not only:
+            only = None
+        return only, requested_names(request, 'expand', path)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None:
+            return fields
+
+        only, expand = self.requested(request, self.sparse_path)
+        if only is not None:
+            fields = {name: field for name, field in fields.items() if name in only}
+        if expand is not None:
+            for name, factory in self.expandable_fields.items():
+                if name in fields and name not in expand:
+                    fields[name] = factory()
+        return fields
+
+    @classmethod
+    def get_lookups(cls, request, path=''):
+        """(select_related, prefetch_related) lookups the requested fields need"""
+        only, expand = cls.requested(request, path)
+        select, prefetch = [], []
+        for name, (kind, lookup) in cls.related_lookups.items():
+            if only is not None and name not in only:
+                continue
+            if name in cls.expandable_fields and expand is not None and name not in expand:
+                # Primary keys of a foreign key need no join
+                if kind == 'select':
+                    continue
+            lookups = select if kind == 'select' else prefetch
+            if lookup not in lookups:
+                lookups.append(lookup)
+
+        for name, nested in cls.nested_serializers.items():
+            if (only is None or name in only) and (expand is None or name in expand):
+                kind, lookup = cls.related_lookups[name]
+                nested_select, nested_prefetch = nested.get_lookups(request, f'{path}{name}.')
+                if kind == 'select':
+                    select += [f'{lookup}__{related}' for related in nested_select]
+                else:
+                    prefetch += [f'{lookup}__{related}' for related in nested_select]
+                prefetch += [f'{lookup}__{related}' for related in nested_prefetch]
+        return select, prefetch
+
+
 class ColorSerializer(serializers.ModelSerializer):
     """Serializer for Color model"""
 
@@ -38,38 +146,38 @@ class CategorySerializer(serializers.ModelSerializer):
         )
 
     def get_children(self, obj):
-        """Get child categories"""
-        if obj.children.exists():
-            return CategorySerializer(obj.children.filter(is_active=True), many=True, context=self.context).data
+        """Get active child categories from the cached category tree"""
+        children = get_category_tree(self.context.get('request')).children_of(obj.pk)
+        if children:
+            return CategorySerializer(children, many=True, context=self.context).data
         return []
 
     def get_image(self, obj):
         """Get absolute URL for category image"""
         if obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+            return media_url_resolver(self.context.get('request'))(obj.image.name)
         return None
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
     """Serializer for ProductImage model"""
     image = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
-        fields = ('id', 'image', 'alt_text', 'is_primary', 'order')
+        fields = ('id', 'image', 'srcset', 'alt_text', 'is_primary', 'order')
 
     def get_image(self, obj):
         """Get absolute URL for image"""
         if obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+            return media_url_resolver(self.context.get('request'))(obj.image.name)
         return None
 
+    def get_srcset(self, obj):
+        """WebP and JPEG srcsets of the sized derivatives, null until rendered"""
+        return srcsets(obj.derivatives, media_url_resolver(self.context.get('request')))
+
 
 class ReviewSerializer(serializers.ModelSerializer):
     """Serializer for Review model"""
@@ -95,26 +203,143 @@ class ReviewSerializer(serializers.ModelSerializer):
     def get_user_avatar(self, obj):
         """Get absolute URL for user avatar"""
         if obj.user and obj.user.avatar:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.user.avatar.url)
-            return obj.user.avatar.url
+            return media_url_resolver(self.context.get('request'))(obj.user.avatar.name)
         return None
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+PRODUCT_EXPANDABLE_FIELDS = {
+    'category': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+    'colors': lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+    'sizes': lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+    'images': lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+}
+
+PRODUCT_RELATED_LOOKUPS = {
+    'category': ('select', 'category'),
+    'colors': ('prefetch', 'colors'),
+    'sizes': ('prefetch', 'sizes'),
+    'images': ('prefetch', 'images'),
+}
+
+
+class CompiledProductListSerializer(CompiledListSerializer):
+    """Renders product listings without DRF's per-field machinery"""
+
+    def use_compiled(self):
+        request = self.context.get('request')
+        if request is not None and (
+            'fields' in request.query_params or 'expand' in request.query_params
+        ):
+            return False
+        return super().use_compiled()
+
+    def compile(self):
+        media_url = media_url_resolver(self.context.get('request'))
+        tree = get_category_tree(self.context.get('request'))
+        price = decimal_formatter(10, 2)
+        discounted_price = decimal_formatter(10, 2, ROUND_HALF_UP)
+        categories = {}
+
+        def image_url(image):
+            return media_url(image.name) if image else None
+
+        def category(obj):
+            # Categories repeat across a page: render each one once
+            data = categories.get(obj.pk)
+            if data is None:
+                data = categories[obj.pk] = {
+                    'id': obj.pk,
+                    'name': obj.name,
+                    'slug': obj.slug,
+                    'description': obj.description,
+                    'image': image_url(obj.image),
+                    'parent': obj.parent_id,
+                    'children': [category(child) for child in tree.children_of(obj.pk)],
+                    'is_active': obj.is_active,
+                    'order': obj.order,
+                }
+            return data
+
+        def primary_image(obj):
+            image, derivatives = obj.primary_image, obj.primary_image_derivatives
+            if not image and 'images' in getattr(obj, '_prefetched_objects_cache', {}):
+                images = sorted(obj.images.all(), key=lambda i: (not i.is_primary, i.order))
+                if images:
+                    image, derivatives = images[0].image, images[0].derivatives
+                else:
+                    image = None
+            return image_url(image), srcsets(derivatives, media_url) if image else None
+
+        def render(obj):
+            primary, primary_srcset = primary_image(obj)
+            data = {
+                'id': obj.pk,
+                'name': obj.name,
+                'slug': obj.slug,
+                'short_description': obj.short_description,
+                'category': None,
+            }
+            if obj.category is not None:
+                # Like the generic serializer, category_name is left out without a category
+                data['category'] = category(obj.category)
+                data['category_name'] = obj.category.name
+            data.update({
+                'price': price(obj.price),
+                'discount_percentage': obj.discount_percentage,
+                'discounted_price': discounted_price(obj.discounted_price),
+                'is_on_sale': obj.is_on_sale,
+                'is_new': obj.is_new,
+                'is_featured': obj.is_featured,
+                'is_in_stock': obj.is_in_stock,
+                'average_rating': obj.average_rating if obj.rating_count else None,
+                'total_reviews': obj.rating_count,
+                'primary_image': primary,
+                'primary_image_srcset': primary_srcset,
+                'colors': [
+                    {'id': color.pk, 'name': color.name, 'hex_code': color.hex_code}
+                    for color in obj.colors.all()
+                ],
+                'sizes': [
+                    {'id': size.pk, 'name': size.name, 'order': size.order}
+                    for size in obj.sizes.all()
+                ],
+                'images': [
+                    {
+                        'id': image.pk,
+                        'image': image_url(image.image),
+                        'srcset': srcsets(image.derivatives, media_url),
+                        'alt_text': image.alt_text,
+                        'is_primary': image.is_primary,
+                        'order': image.order,
+                    }
+                    for image in obj.images.all()
+                ],
+                'created_at': format_datetime(obj.created_at),
+            })
+            return data
+        return render
+
+
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Lightweight serializer for product listings"""
+    expandable_fields = PRODUCT_EXPANDABLE_FIELDS
+    related_lookups = dict(PRODUCT_RELATED_LOOKUPS, category_name=('select', 'category'))
+
     category_name = serializers.CharField(source='category.name', read_only=True)
     category = CategorySerializer(read_only=True)
     colors = ColorSerializer(many=True, read_only=True)
     sizes = SizeSerializer(many=True, read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     primary_image = serializers.SerializerMethodField()
+    primary_image_srcset = serializers.SerializerMethodField()
     discounted_price = serializers.DecimalField(
         max_digits=10,
         decimal_places=2,
+        rounding=ROUND_HALF_UP,
         read_only=True
     )
+    average_rating = serializers.SerializerMethodField()
+    total_reviews = serializers.IntegerField(source='rating_count', read_only=True)
 
     class Meta:
         model = Product
@@ -132,43 +357,67 @@ class ProductListSerializer(serializers.ModelSerializer):
             'is_new',
             'is_featured',
             'is_in_stock',
+            'average_rating',
+            'total_reviews',
             'primary_image',
+            'primary_image_srcset',
             'colors',
             'sizes',
             'images',
             'created_at'
         )
+        list_serializer_class = CompiledProductListSerializer
+
+    def get_average_rating(self, obj):
+        """Average approved rating, from the stored aggregates"""
+        return obj.average_rating if obj.rating_count else None
+
+    def resolve_primary_image(self, obj):
+        """(image, derivatives) of the primary image without querying ProductImage"""
+        if obj.primary_image:
+            return obj.primary_image, obj.primary_image_derivatives
+        if 'images' in getattr(obj, '_prefetched_objects_cache', {}):
+            # Not synced yet: resolve from the prefetched images in memory
+            images = sorted(obj.images.all(), key=lambda i: (not i.is_primary, i.order))
+            if images:
+                return images[0].image, images[0].derivatives
+        return None, None
 
     def get_primary_image(self, obj):
-        """Get primary product image"""
-        primary = obj.images.filter(is_primary=True).first()
-        if primary:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(primary.image.url)
-            return primary.image.url
-        # Fallback to first image
-        first_image = obj.images.first()
-        if first_image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(first_image.image.url)
-            return first_image.image.url
+        """Get primary product image without querying ProductImage"""
+        image, _ = self.resolve_primary_image(obj)
+        if image:
+            return media_url_resolver(self.context.get('request'))(image.name)
+        return None
+
+    def get_primary_image_srcset(self, obj):
+        """WebP and JPEG srcsets of the primary image, null until rendered"""
+        image, derivatives = self.resolve_primary_image(obj)
+        if image:
+            return srcsets(derivatives, media_url_resolver(self.context.get('request')))
         return None
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+CompiledProductListSerializer.compiled_child_class = ProductListSerializer
+
+
+class ProductDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Detailed serializer for single product view"""
+    expandable_fields = PRODUCT_EXPANDABLE_FIELDS
+    related_lookups = PRODUCT_RELATED_LOOKUPS
+
     category = CategorySerializer(read_only=True)
     colors = ColorSerializer(many=True, read_only=True)
     sizes = SizeSerializer(many=True, read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     reviews = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
-    total_reviews = serializers.SerializerMethodField()
+    total_reviews = serializers.IntegerField(source='rating_count', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     discounted_price = serializers.DecimalField(
         max_digits=10,
         decimal_places=2,
+        rounding=ROUND_HALF_UP,
         read_only=True
     )
 
@@ -197,26 +446,19 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'reviews',
             'average_rating',
             'total_reviews',
+            'rating_histogram',
             'views_count',
             'created_at'
         )
 
     def get_reviews(self, obj):
         """Get approved reviews"""
-        approved_reviews = obj.reviews.filter(is_approved=True)[:5]
+        approved_reviews = obj.reviews.filter(is_approved=True).select_related('user')[:5]
         return ReviewSerializer(approved_reviews, many=True).data
 
     def get_average_rating(self, obj):
-        """Calculate average rating"""
-        approved_reviews = obj.reviews.filter(is_approved=True)
-        if approved_reviews.exists():
-            from django.db.models import Avg
-            return approved_reviews.aggregate(Avg('rating'))['rating__avg']
-        return None
-
-    def get_total_reviews(self, obj):
-        """Count total approved reviews"""
-        return obj.reviews.filter(is_approved=True).count()
+        """Average approved rating, from the stored aggregates"""
+        return obj.average_rating if obj.rating_count else None
 
 
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
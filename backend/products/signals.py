@@ -0,0 +1,160 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import images, snapshot
+from .cache import bump_version
+from .models import Category, Color, Size, Product, ProductImage, Review
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=ProductImage)
+def render_image_derivatives(sender, instance, **kwargs):
+    """Render sized variants when an image is uploaded or replaced"""
+    if instance.derivatives.get('source') != instance.image.name:
+        if instance.derivatives:
+            # Stale variants of the previous upload must not be served meanwhile
+            images.discard(instance.derivatives)
+            instance.derivatives = {}
+            ProductImage.objects.filter(pk=instance.pk).update(derivatives={})
+        images.schedule(instance)
+
+
+@receiver(post_delete, sender=ProductImage)
+def delete_image_derivatives(sender, instance, **kwargs):
+    """Delete the sized variants of a deleted image"""
+    images.discard(instance.derivatives)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def sync_primary_image(sender, instance, **kwargs):
+    """Keep Product.primary_image in sync with its images"""
+    product = Product.objects.filter(pk=instance.product_id).first()
+    if product:
+        product.refresh_primary_image()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """Drop the cached category tree in every process"""
+    bump_version('categories')
+
+
+@receiver(post_save, sender=Product)
+def sync_product_tags(sender, instance, update_fields=None, **kwargs):
+    """Keep the normalized Tag rows in sync with Product.tags"""
+    if update_fields is None or 'tags' in update_fields:
+        instance.sync_tags()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    """Update the product's entry in the full-text search index"""
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Remove the product from the full-text search index"""
+    get_search_backend().remove(instance.pk)
+
+
+@receiver(pre_save, sender=Review)
+@receiver(pre_delete, sender=Review)
+def load_rating_state(sender, instance, **kwargs):
+    """Read the stored rating state of a review loaded with deferred fields"""
+    if not hasattr(instance, '_rating_state') and not instance._state.adding:
+        row = Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating', 'is_approved').first()
+        instance._rating_state = row[:2] if row and row[2] else None
+
+
+@receiver(post_save, sender=Review)
+def update_product_rating(sender, instance, **kwargs):
+    """Move the review's rating in or out of the product aggregates"""
+    old, new = getattr(instance, '_rating_state', None), instance.rating_state
+    if old != new:
+        if old:
+            Product.adjust_ratings([old], -1)
+        if new:
+            Product.adjust_ratings([new], 1)
+    instance._rating_state = new
+
+
+@receiver(post_delete, sender=Review)
+def remove_product_rating(sender, instance, **kwargs):
+    """Drop a deleted review from the product aggregates"""
+    state = getattr(instance, '_rating_state', None)
+    if state:
+        Product.adjust_ratings([state], -1)
+
+
+@receiver(m2m_changed, sender=Product.colors.through)
+@receiver(m2m_changed, sender=Product.sizes.through)
+def sync_variant_masks(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep Product.color_mask / size_mask in sync with the M2M rows"""
+    relation = 'colors' if sender is Product.colors.through else 'sizes'
+    if reverse and action == 'pre_clear':
+        # post_clear no longer knows which products lost the variant
+        instance._variant_product_ids = list(instance.products.values_list('pk', flat=True))
+    if not action.startswith('post_'):
+        return
+
+    if not reverse:
+        product_ids = [instance.pk]
+    elif action == 'post_clear':
+        product_ids = instance.__dict__.pop('_variant_product_ids', [])
+    else:
+        product_ids = pk_set
+    Product.refresh_variant_masks(product_ids, relation)
+
+
+@receiver(post_delete, sender=Color)
+@receiver(post_delete, sender=Size)
+def clear_variant_bit(sender, instance, **kwargs):
+    """Remove a deleted color or size from the variant masks"""
+    Product.clear_variant_bit('colors' if sender is Color else 'sizes', instance.pk)
+
+
+# Registered last so derived data above is up to date before the version changes
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Color)
+@receiver(post_delete, sender=Color)
+@receiver(post_save, sender=Size)
+@receiver(post_delete, sender=Size)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(m2m_changed, sender=Product.colors.through)
+@receiver(m2m_changed, sender=Product.sizes.through)
+def invalidate_catalog(sender, **kwargs):
+    """Invalidate cached catalog responses"""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        version = bump_version('catalog')
+        product_ids = changed_product_ids(sender, **kwargs)
+        if product_ids is not None:
+            snapshot.record_changes(version, product_ids)
+
+
+def changed_product_ids(sender, instance, **kwargs):
+    """Products whose listing snapshot columns a signal changed, or None when unknown"""
+    if sender is Product:
+        return [instance.pk]
+    if sender is Review:
+        # Not fetched for a deleted review loaded without its product
+        product_id = instance.__dict__.get('product_id')
+        return None if product_id is None else [product_id]
+    if sender in (Product.colors.through, Product.sizes.through):
+        if not kwargs['reverse']:
+            return [instance.pk]
+        return kwargs['pk_set']  # None after a reverse clear
+    if sender is ProductImage:
+        return []
+    if sender in (Color, Size) and 'created' in kwargs:
+        # A saved color or size keeps its bit; a deleted one changes many masks
+        return []
+    return None
@@ -0,0 +1,263 @@
+"""
+In-process columnar snapshot of the active catalog.
+
+ProductViewSet.list filters, orders and pages active products on a handful
+of columns. With CATALOG_SNAPSHOT enabled, each process keeps those columns
+as NumPy arrays loaded with one values_list query:
+
+- id, category id, effective price (in cents), stock, rating, created_at
+- is_new / is_featured / on sale flags
+- the color and size variant bitmasks
+
+The snapshot is stamped with the catalog version. Signals that change known
+products (a product, its reviews or its variants) record their ids under
+the version they bump, so a snapshot behind by a few versions re-reads just
+those rows; anything else (categories, deleted variants, bulk writes)
+leaves a gap in that log and the snapshot is loaded again. Other workers'
+changes are only seen with a shared cache; with a process-local one a
+snapshot is reloaded after CATALOG_LOCAL_CACHE_TIMEOUT. View counts are
+written without signals, so ordering by views takes the queryset path.
+
+A listing evaluates its filters and ordering as array operations and only
+loads the model instances of the requested page.
+
+Requests the snapshot cannot answer exactly (search, tags, cursor pages,
+variant ids past the mask width, malformed parameters) return None from
+`select()` and take the queryset path.
+"""
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from rest_framework.settings import api_settings
+
+from .cache import bump_version, catalog_cache_timeout, get_version, is_current, versions_are_shared
+from .models import Category, Product, variant_bit
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# Filters only the queryset path understands
+UNSUPPORTED_PARAMS = (api_settings.SEARCH_PARAM, 'tags')
+
+COLUMNS = (
+    ('id', 'id', np.int64),
+    ('category', 'category_id', np.int64),
+    ('effective_price', 'effective_price', np.int64),
+    ('stock', 'stock', np.int64),
+    ('average_rating', 'average_rating', np.float64),
+    ('created_at', 'created_at', np.int64),
+    ('is_new', 'is_new', np.bool_),
+    ('is_featured', 'is_featured', np.bool_),
+    ('on_sale', 'discount_percentage', np.bool_),
+    ('color_mask', 'color_mask', np.int64),
+    ('size_mask', 'size_mask', np.int64),
+)
+# Columns a listing may be ordered by
+ORDERING_COLUMNS = {'effective_price', 'created_at', 'average_rating'}
+FIELDS = tuple(field for _, field, _ in COLUMNS)
+
+CHANGES_KEY = 'products:snapshot:changes:{}'
+# Beyond this many unseen versions a reload is cheaper than catching up
+MAX_CATCH_UP = 100
+
+
+def to_column(name, values, dtype):
+    """Convert one values_list column into its array"""
+    if name == 'category':
+        values = (-1 if value is None else value for value in values)
+    elif name == 'effective_price':
+        values = (int(value * 100) for value in values)
+    elif name == 'created_at':
+        values = ((value - EPOCH) // MICROSECOND for value in values)
+    elif name == 'on_sale':
+        values = (value > 0 for value in values)
+    return np.fromiter(values, dtype=dtype, count=len(values) if isinstance(values, tuple) else -1)
+
+
+def is_true(value):
+    return bool(value) and value.lower() == 'true'
+
+
+class CatalogSnapshot:
+    """Columns of every active product, in primary key order"""
+
+    def __init__(self, rows, category_slugs, version=None):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.category_slugs = category_slugs
+        columns = list(zip(*rows)) or [()] * len(COLUMNS)
+        for (name, _, dtype), values in zip(COLUMNS, columns):
+            setattr(self, name, to_column(name, values, dtype))
+
+    @classmethod
+    def load(cls, version=None):
+        rows = list(Product.objects.filter(is_active=True).order_by('pk').values_list(*FIELDS))
+        category_slugs = dict(Category.objects.values_list('slug', 'id'))
+        return cls(rows, category_slugs, version)
+
+    def patched(self, product_ids, version):
+        """A copy with the given products re-read from the database"""
+        product_ids = list(product_ids)
+        rows = list(
+            Product.objects.filter(pk__in=product_ids, is_active=True).order_by('pk').values_list(*FIELDS)
+        )
+        fresh = CatalogSnapshot(rows, self.category_slugs, version)
+        kept = ~np.isin(self.id, np.array(product_ids, dtype=np.int64))
+        order = np.argsort(np.concatenate([self.id[kept], fresh.id]), kind='stable')
+        for name, _, _ in COLUMNS:
+            setattr(fresh, name, np.concatenate([getattr(self, name)[kept], getattr(fresh, name)])[order])
+        # Changes of other processes are only caught up on with a shared cache
+        fresh.loaded_at = self.loaded_at
+        return fresh
+
+    def __len__(self):
+        return len(self.id)
+
+    def select(self, params, ordering):
+        """Ordered ids of the products matching the listing parameters, or None"""
+        if 'cursor' in params or any(params.get(param) for param in UNSUPPORTED_PARAMS):
+            # Keyset pages and search rank need the queryset
+            return None
+        try:
+            matches = self.matches(params)
+        except (InvalidOperation, ValueError):
+            # Left to the queryset path, which reports malformed input its own way
+            return None
+        if matches is None:
+            return None
+        return self.order(np.flatnonzero(matches), ordering)
+
+    def matches(self, params):
+        """Boolean mask of the products passing the filters of ProductViewSet.get_queryset"""
+        matches = np.ones(len(self), dtype=bool)
+
+        category = params.get('category')
+        if category:
+            matches &= self.category == self.category_slugs.get(category, -2)
+
+        for relation, column in (('colors', self.color_mask), ('sizes', self.size_mask)):
+            ids = params.get(relation)
+            if ids:
+                mask = 0
+                for pk in (int(value) for value in ids.split(',')):
+                    bit = variant_bit(pk)
+                    if bit is None:
+                        # Past the mask width only the M2M table knows
+                        return None
+                    mask |= bit
+                matches &= (column & mask) > 0
+
+        min_price, max_price = params.get('min_price'), params.get('max_price')
+        if min_price:
+            matches &= self.effective_price >= math.ceil(self.cents(min_price))
+        if max_price:
+            matches &= self.effective_price <= math.floor(self.cents(max_price))
+
+        for param, column in (('is_new', self.is_new), ('on_sale', self.on_sale),
+                              ('is_featured', self.is_featured), ('in_stock', self.stock > 0)):
+            if is_true(params.get(param)):
+                matches &= column
+        return matches
+
+    @staticmethod
+    def cents(value):
+        price = Decimal(value)
+        if not price.is_finite():
+            raise ValueError(f'Invalid price {value!r}')
+        return price * 100
+
+    def order(self, positions, ordering):
+        """Product ids at `positions`, sorted like ORDER BY `ordering`, ties broken on id"""
+        keys = []
+        for field in ordering:
+            name = field.lstrip('-')
+            if name not in ORDERING_COLUMNS:
+                return None
+            column = getattr(self, name)[positions]
+            keys.append(-column if field.startswith('-') else column)
+        descending = bool(ordering) and ordering[-1].startswith('-')
+        ids = self.id[positions]
+        keys.append(-ids if descending else ids)
+        # lexsort sorts by the last key first
+        return ids[np.lexsort(keys[::-1])]
+
+
+class SnapshotResults:
+    """Ordered product ids that load their instances when a page is sliced"""
+
+    def __init__(self, ids, queryset):
+        self.ids = ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        ids = self.ids[index].tolist()
+        products = self.queryset.in_bulk(ids)
+        # A product deactivated since the snapshot was built is left out
+        return [products[pk] for pk in ids if pk in products]
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def record_changes(version, product_ids, committed=False):
+    """
+    Record the products a catalog version changed, so snapshots re-read
+    those rows instead of loading the catalog again. Inside a transaction
+    the change is published once more after commit: a process catching up
+    before then still reads the old rows.
+    """
+    if not settings.CATALOG_SNAPSHOT:
+        return
+    product_ids = list(product_ids)
+    cache.set(CHANGES_KEY.format(version), product_ids, catalog_cache_timeout())
+    if product_ids and not committed and connection.in_atomic_block:
+        transaction.on_commit(lambda: record_changes(bump_version('catalog'), product_ids, committed=True))
+
+
+def changes_since(snapshot, version):
+    """Product ids changed by the versions after the snapshot's, or None when unknown"""
+    if snapshot is None or not isinstance(snapshot.version, int):
+        return None
+    if not versions_are_shared() and time.monotonic() - snapshot.loaded_at >= catalog_cache_timeout():
+        # Other processes' changes are invisible with a process-local cache
+        return None
+    if not 0 < version - snapshot.version <= MAX_CATCH_UP:
+        return None
+    keys = [CHANGES_KEY.format(number) for number in range(snapshot.version + 1, version + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    return {product_id for ids in changes.values() for product_id in ids}
+
+
+def get_catalog_snapshot():
+    """Return the process-wide snapshot, brought up to date when stale; None when disabled"""
+    global _snapshot
+    if not settings.CATALOG_SNAPSHOT:
+        return None
+    version = get_version('catalog')
+    snapshot = _snapshot
+    if not is_current(snapshot, version):
+        # One update per version, however many requests notice it
+        with _lock:
+            snapshot = _snapshot
+            if not is_current(snapshot, version):
+                changed = changes_since(snapshot, version)
+                if changed is None:
+                    snapshot = CatalogSnapshot.load(version)
+                else:
+                    snapshot = snapshot.patched(changed, version)
+                _snapshot = snapshot
+    return snapshot
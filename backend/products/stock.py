@@ -0,0 +1,32 @@
+"""
+Relative stock adjustments.
+
+Orders take and return stock with `UPDATE ... SET stock = stock + n` rather
+than saving the product, so concurrent checkouts don't overwrite each
+other's decrements and a stale product instance can't roll the count back.
+The update bypasses the model signals, so the catalog caches and the
+listing snapshot are invalidated here.
+"""
+from collections import Counter
+
+from django.db.models import F
+
+from . import snapshot
+from .cache import bump_version
+from .models import Product
+
+
+def adjust_stock(quantities, delta):
+    """
+    Add (delta=1) or remove (delta=-1) stock given as (product_id, quantity)
+    pairs, with one atomic UPDATE per product
+    """
+    totals = Counter()
+    for product_id, quantity in quantities:
+        if product_id is not None:
+            totals[product_id] += quantity
+    if not totals:
+        return
+    for product_id, quantity in totals.items():
+        Product.objects.filter(pk=product_id).update(stock=F('stock') + delta * quantity)
+    snapshot.record_changes(bump_version('catalog'), list(totals))
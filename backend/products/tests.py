@@ -1,3 +1,918 @@
-from django.test import TestCase
+import base64
+import json
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO
+from urllib.parse import parse_qs, urlsplit
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.db.models import F
+from django.test import TestCase, override_settings
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from PIL import Image
+from rest_framework.test import APIRequestFactory
+
+from config.media import media_url_resolver
+
+from . import cache as catalog_cache, counters
+from .facets import facet_counts
+from .images import generate, record_derivatives
+from .importer import ProductImporter, RowError, read_rows
+from .models import Category, Color, Size, Product, ProductImage, Review, Tag, variant_bit
+from .search import InMemorySearchBackend, get_search_backend
+from .seeding import ScaleSeeder
+from .serializers import ProductListSerializer
+from .snapshot import COLUMNS, CatalogSnapshot, get_catalog_snapshot
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CompiledProductListSerializerTests(TestCase):
+    """The compiled listing path must render exactly what DRF renders"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        root = Category.objects.create(name='Clothing', description=None)
+        child = Category.objects.create(name='Hoodies', parent=root, description='Warm')
+        red = Color.objects.create(name='Red', hex_code='#FF0000')
+        large = Size.objects.create(name='L', order=3)
+
+        sale = Product.objects.create(
+            name='Hoodie', category=child, description='Soft hoodie',
+            price=Decimal('199999.99'), discount_percentage=15, stock=4
+        )
+        sale.colors.add(red)
+        sale.sizes.add(large)
+        front = ProductImage.objects.create(
+            product=sale, alt_text='Front', is_primary=True,
+            image=SimpleUploadedFile('front.jpg', b'jpeg', content_type='image/jpeg')
+        )
+        record_derivatives(front.pk, {'source': front.image.name, 'variants': [
+            {'name': 'thumb', 'width': 200, 'webp': 'products/derived/t.webp', 'jpeg': 'products/derived/t.jpg'},
+            {'name': 'card', 'width': 480, 'webp': 'products/derived/c.webp', 'jpeg': 'products/derived/c.jpg'},
+        ]})
+        Product.objects.create(
+            name='Scarf', category=root, description='Wool scarf', price=Decimal('0.10'), stock=1
+        )
+        Product.objects.create(
+            name='Cap', category=None, description='Plain cap',
+            price=Decimal('49000.00'), stock=0, rating_count=2, rating_sum=9, average_rating=4.5
+        )
+
+    def render(self, products, request, compiled):
+        context = {'request': request}
+        if compiled:
+            serializer = ProductListSerializer(products, many=True, context=context)
+        else:
+            serializer = serializers.ListSerializer(
+                products, child=ProductListSerializer(), context=context
+            )
+        return JSONRenderer().render(serializer.data)
+
+    def test_parity(self):
+        request = Request(APIRequestFactory().get('/api/products/'))
+        products = list(
+            Product.objects.select_related('category')
+            .prefetch_related('colors', 'sizes', 'images')
+            .order_by('pk')
+        )
+        compiled = self.render(products, request, compiled=True)
+        self.assertEqual(compiled, self.render(products, request, compiled=False))
+        self.assertIn(b'"children":[{', compiled)
+        self.assertNotIn(b'"category_name":null', compiled)
+        self.assertIn(b'/media/products/derived/c.webp 480w', compiled)
+
+    def test_sparse_requests_use_generic_path(self):
+        request = Request(APIRequestFactory().get('/api/products/', {'fields': 'id,name'}))
+        products = list(Product.objects.order_by('pk'))
+        self.assertEqual(
+            self.render(products, request, compiled=True),
+            self.render(products, request, compiled=False),
+        )
+
+
+SHARED_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': tempfile.mkdtemp(),
+}}
+
+
+class CatalogCacheTests(TestCase):
+    """Cached catalog data only outlives other workers' changes with a shared cache"""
+
+    def setUp(self):
+        cache.clear()
+        Product.objects.create(name='Hoodie', description='Soft', price=Decimal('10.00'))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(SHARED_CACHES['default']['LOCATION'], ignore_errors=True)
+
+    def cache_timeouts(self):
+        with mock.patch.object(catalog_cache.cache, 'set', wraps=catalog_cache.cache.set) as cache_set:
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        return response, [call.args[2] for call in cache_set.call_args_list if 'response' in call.args[0]]
+
+    @override_settings(CATALOG_CACHE_TIMEOUT=3600, CATALOG_LOCAL_CACHE_TIMEOUT=5)
+    def test_process_local_cache(self):
+        response, timeouts = self.cache_timeouts()
+        self.assertEqual(timeouts, [5])
+        self.assertNotIn('ETag', response)
+
+        tree = catalog_cache.get_category_tree()
+        with override_settings(CATALOG_LOCAL_CACHE_TIMEOUT=0):
+            self.assertIsNot(catalog_cache.get_category_tree(), tree)
+
+    @override_settings(CATALOG_CACHE_TIMEOUT=3600, CACHES=SHARED_CACHES)
+    def test_shared_cache(self):
+        cache.clear()
+        response, timeouts = self.cache_timeouts()
+        self.assertEqual(timeouts, [3600])
+        self.assertIn('ETag', response)
+
+        tree = catalog_cache.get_category_tree()
+        with override_settings(CATALOG_LOCAL_CACHE_TIMEOUT=0):
+            self.assertIs(catalog_cache.get_category_tree(), tree)
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class ConditionalResponseTests(TestCase):
+    """Conditional GETs answer 304 only for the same URL of an unchanged catalog"""
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Beanie', description='Warm', price=Decimal('8.00'))
+        # Far enough in the past for Last-Modified to be sent
+        cache.set(catalog_cache.MODIFIED_KEY.format('catalog'), time.time() - 10, None)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(SHARED_CACHES['default']['LOCATION'], ignore_errors=True)
+
+    def test_etag_per_url(self):
+        etags = {url: self.client.get(url)['ETag'] for url in (
+            '/api/products/', '/api/products/?ordering=price', f'/api/products/{self.product.slug}/'
+        )}
+        self.assertEqual(len(set(etags.values())), 3)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        other = self.client.get('/api/products/?ordering=price', HTTP_IF_NONE_MATCH=etags['/api/products/'])
+        self.assertEqual(other.status_code, 200)
+
+        catalog_cache.bump_version('catalog')
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etags['/api/products/'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_object_is_not_modified(self):
+        url = f'/api/products/{self.product.slug}/'
+        etag = self.client.get(url)['ETag']
+        Product.objects.filter(pk=self.product.pk).update(is_active=False)
+        with mock.patch('products.views.record_view') as record_view:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+            self.assertEqual(self.client.get('/api/products/missing/', HTTP_IF_NONE_MATCH='*').status_code, 404)
+        record_view.assert_not_called()
+
+    def test_last_modified(self):
+        response = self.client.get('/api/products/')
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        # An ETag that does not match wins over a matching date
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH='"stale"',
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+        # Within a second of a change the date cannot tell it apart from an earlier one
+        catalog_cache.bump_version('catalog')
+        response = self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('ETag', response)
+
+
+class SearchTests(TestCase):
+    """Search keeps every match, best first, on each backend"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(5):
+            Product.objects.create(
+                name=f'Hoodie {index}', description='hoodie ' * index or 'Warm', price=Decimal('10.00')
+            )
+        Product.objects.create(name='Scarf', description='Wool', price=Decimal('5.00'))
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get('/api/products/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @override_settings(PRODUCT_SEARCH_MAX_RESULTS=2)
+    def test_every_match_is_counted(self):
+        for backend in (get_search_backend(), InMemorySearchBackend()):
+            with self.subTest(backend=type(backend).__name__), \
+                    mock.patch('products.filters.get_search_backend', return_value=backend):
+                cache.clear()
+                data = self.search('hood')
+                self.assertEqual(data['count'], 5)
+                names = [item['name'] for item in data['results']]
+                self.assertEqual(names[0], 'Hoodie 4')
+                self.assertEqual(sorted(names), [f'Hoodie {index}' for index in range(5)])
+
+                facets = self.client.get('/api/products/facets/', {'search': 'hood'}).json()
+                self.assertEqual(facets['total'], 5)
+
+    def test_in_memory_index_catches_up_per_product(self):
+        mine, other = InMemorySearchBackend(), InMemorySearchBackend()
+        self.assertEqual(len(other.search('hoodie', None)), 5)
+
+        parka = Product.objects.create(name='Parka', description='Rain', price=Decimal('20.00'))
+        mine.index(parka)
+        with mock.patch.object(other, '_load', side_effect=AssertionError('full reload')):
+            self.assertEqual(other.search('parka', None), [parka.pk])
+            Product.objects.filter(pk=parka.pk).delete()
+            mine.remove(parka.pk)
+            self.assertEqual(other.search('parka', None), [])
+
+
+class TagFilterTests(TestCase):
+    """?tags= matches all listed tags, or any with tag_match=any"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name, tags in (('Hoodie', 'Winter, Cotton'), ('Scarf', 'Winter'), ('Tee', 'Cotton')):
+            Product.objects.create(name=name, description=name, price=Decimal('10.00'), tags=tags)
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, **params):
+        response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(item['name'] for item in response.json()['results'])
+
+    def test_all_tags(self):
+        self.assertEqual(self.names(tags='winter,cotton'), ['Hoodie'])
+        self.assertEqual(self.names(tags='winter'), ['Hoodie', 'Scarf'])
+
+    def test_any_tag(self):
+        self.assertEqual(self.names(tags='winter,cotton', tag_match='any'), ['Hoodie', 'Scarf', 'Tee'])
+
+    def test_duplicate_tags(self):
+        self.assertEqual(self.names(tags='Winter,winter, WINTER'), ['Hoodie', 'Scarf'])
+        self.assertEqual(self.names(tags='winter,cotton,Cotton'), ['Hoodie'])
+
+    def test_separators_only(self):
+        self.assertEqual(self.names(tags=','), ['Hoodie', 'Scarf', 'Tee'])
+        self.assertEqual(self.names(tags=' , ,'), ['Hoodie', 'Scarf', 'Tee'])
+
+    def test_long_tag_is_truncated(self):
+        long_tag = 'Heavyweight ' * 20
+        product = Product.objects.create(name='Parka', description='Parka', price=Decimal('90.00'), tags=long_tag)
+        tag = product.tag_set.get()
+        self.assertEqual(len(tag.name), Tag.MAX_LENGTH)
+        self.assertLessEqual(len(tag.slug), Tag.MAX_LENGTH)
+        self.assertEqual(self.names(tags=long_tag), ['Parka'])
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=30, VIEW_COUNT_MAX_PENDING=2)
+class ViewCounterTests(TestCase):
+    """Views are buffered off the read path and never lost to a failed flush"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Mug', description='Mug', price=Decimal('5.00'))
+        counters._buffer.clear()
+        counters._wake.clear()
+        self.addCleanup(counters._buffer.clear)
+        patcher = mock.patch.object(counters, 'ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_record_view_does_not_write(self):
+        with self.assertNumQueries(0):
+            counters.record_view(self.product.slug)
+            counters.record_view(self.product.slug)
+        self.assertFalse(counters._wake.is_set())
+        counters.record_view('other')
+        self.assertTrue(counters._wake.is_set())
+
+        self.assertEqual(counters.flush_views(), 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views_count, 2)
+        self.assertFalse(counters._buffer)
+
+    def test_failed_flush_keeps_views(self):
+        counters.record_view(self.product.slug)
+        with mock.patch.object(counters.Product.objects, 'filter', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                counters.flush_views()
+        counters.record_view(self.product.slug)
+        self.assertEqual(counters._buffer[self.product.slug], 2)
+
+        counters.flush_views()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views_count, 2)
+
+
+class EffectivePriceTests(TestCase):
+    """Every write path stores the discounted price rounded half up to cents"""
+
+    # (price, discount, expected): halfway cents round up
+    CASES = [
+        ('0.15', 50, '0.08'),
+        ('1.13', 50, '0.57'),
+        ('0.25', 10, '0.23'),
+        ('2.05', 30, '1.44'),
+        ('19.99', 15, '16.99'),
+        ('100.00', 0, '100.00'),
+        ('9.99', 100, '0.00'),
+        # Cents times the discount factor overflow a 32-bit integer
+        ('350000.15', 15, '297500.13'),
+        ('99999999.99', 1, '98999999.99'),
+    ]
+
+    def assertPrices(self, pks):
+        products = Product.objects.in_bulk(pks)
+        for pk, (price, discount, expected) in zip(pks, self.CASES):
+            product = products[pk]
+            with self.subTest(price=price, discount=discount):
+                self.assertEqual(product.effective_price, Decimal(expected))
+                self.assertEqual(product.discounted_price, Decimal(expected))
+                self.assertEqual(ProductListSerializer(product).data['discounted_price'], expected)
+
+    def create(self, index, price='1.00', discount=0):
+        return Product(name=f'Glove {index}', slug=f'glove-{index}', description='Glove',
+                       price=Decimal(price), discount_percentage=discount)
+
+    def test_save(self):
+        pks = []
+        for index, (price, discount, _) in enumerate(self.CASES):
+            product = self.create(index, price, discount)
+            product.save()
+            pks.append(product.pk)
+        self.assertPrices(pks)
+
+    def test_update(self):
+        pks = []
+        for index, (price, discount, _) in enumerate(self.CASES):
+            product = self.create(index)
+            product.save()
+            Product.objects.filter(pk=product.pk).update(price=Decimal(price))
+            Product.objects.filter(pk=product.pk).update(discount_percentage=discount)
+            pks.append(product.pk)
+        self.assertPrices(pks)
+
+    def test_bulk_create(self):
+        products = Product.objects.bulk_create(
+            self.create(index, price, discount) for index, (price, discount, _) in enumerate(self.CASES)
+        )
+        self.assertPrices([product.pk for product in products])
+
+    def test_bulk_update(self):
+        products = Product.objects.bulk_create(self.create(index) for index in range(len(self.CASES)))
+        for product, (price, discount, _) in zip(products, self.CASES):
+            product.price, product.discount_percentage = Decimal(price), discount
+        Product.objects.bulk_update(products, ['price', 'discount_percentage'])
+        self.assertPrices([product.pk for product in products])
+
+
+class VariantMaskTests(TestCase):
+    """Variant bitmasks follow the M2M rows and filters past the mask width still match"""
+
+    def setUp(self):
+        self.red, self.blue, self.green = (Color.objects.create(name=name, hex_code='#000000')
+                                           for name in ('Red', 'Blue', 'Green'))
+        self.small = Size.objects.create(name='S')
+        self.shirt = Product.objects.create(name='Shirt', description='Shirt', price=Decimal('10.00'))
+        self.dress = Product.objects.create(name='Dress', description='Dress', price=Decimal('30.00'))
+
+    def assertMask(self, product, field, *variants):
+        product.refresh_from_db()
+        expected = 0
+        for variant in variants:
+            expected |= variant_bit(variant.pk)
+        self.assertEqual(getattr(product, field), expected)
+
+    def test_forward_changes(self):
+        self.shirt.colors.add(self.red, self.blue)
+        self.shirt.sizes.add(self.small)
+        self.assertMask(self.shirt, 'color_mask', self.red, self.blue)
+        self.assertMask(self.shirt, 'size_mask', self.small)
+
+        self.shirt.colors.remove(self.red)
+        self.assertMask(self.shirt, 'color_mask', self.blue)
+        self.shirt.colors.clear()
+        self.assertMask(self.shirt, 'color_mask')
+        self.assertMask(self.shirt, 'size_mask', self.small)
+
+    def test_reverse_changes(self):
+        self.shirt.colors.add(self.blue)
+        self.green.products.add(self.shirt, self.dress)
+        self.assertMask(self.shirt, 'color_mask', self.blue, self.green)
+        self.assertMask(self.dress, 'color_mask', self.green)
+
+        self.green.products.remove(self.dress)
+        self.assertMask(self.dress, 'color_mask')
+        self.green.products.add(self.dress)
+        self.green.products.clear()
+        self.assertMask(self.shirt, 'color_mask', self.blue)
+        self.assertMask(self.dress, 'color_mask')
+
+    def test_variant_delete_clears_bit(self):
+        self.shirt.colors.add(self.red, self.blue)
+        self.dress.colors.add(self.red)
+        self.red.delete()
+        self.assertMask(self.shirt, 'color_mask', self.blue)
+        self.assertMask(self.dress, 'color_mask')
+
+    def test_ids_past_mask_width(self):
+        wide = Color.objects.create(pk=70, name='Teal', hex_code='#008080')
+        self.assertIsNone(variant_bit(wide.pk))
+        self.shirt.colors.add(wide)
+        self.dress.colors.add(self.red)
+        self.assertMask(self.shirt, 'color_mask')
+
+        products = Product.objects.with_any_variant
+        self.assertEqual(list(products('colors', [wide.pk])), [self.shirt])
+        self.assertEqual(set(products('colors', [wide.pk, self.red.pk])), {self.shirt, self.dress})
+        self.assertEqual(products('colors', [wide.pk, self.red.pk]).count(), 2)
+        response = self.client.get(f'/api/products/?colors={wide.pk}')
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.shirt.pk])
+
+
+class ProductImporterTests(TestCase):
+    """Imports upsert products, their derived columns and their links"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def run_import(self, name, text, batch_size=1000):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(text)
+        return ProductImporter(batch_size=batch_size).run(read_rows(path))
+
+    @staticmethod
+    def links(product):
+        return (
+            sorted(product.colors.values_list('name', flat=True)),
+            sorted(product.sizes.values_list('name', flat=True)),
+            sorted(product.tag_set.values_list('slug', flat=True)),
+        )
+
+    def test_create_and_update(self):
+        imported = self.run_import('products.csv', (
+            'slug,name,price,discount_percentage,stock,category,colors,sizes,tags\n'
+            'tee,Tee,1.13,50,4,Shirts,Red:#ff0000|Blue,S:1|M:2,"cotton, summer"\n'
+            'polo,Polo,20.00,0,0,Shirts,,,\n'
+        ))
+        self.assertEqual(imported, 2)
+        tee = Product.objects.get(slug='tee')
+        self.assertEqual((tee.name, tee.stock, tee.category.name), ('Tee', 4, 'Shirts'))
+        self.assertEqual(tee.effective_price, Decimal('0.57'))
+        self.assertEqual(self.links(tee), (['Blue', 'Red'], ['M', 'S'], ['cotton', 'summer']))
+        self.assertEqual(Color.objects.get(name='Red').hex_code, '#ff0000')
+        self.assertMasks(tee)
+
+        self.run_import('update.csv', (
+            'slug,name,price,discount_percentage,stock,category,colors,sizes,tags\n'
+            'tee,Tee v2,2.00,25,9,Shirts,Blue,L,cotton\n'
+        ))
+        tee.refresh_from_db()
+        self.assertEqual((tee.name, tee.stock, tee.effective_price), ('Tee v2', 9, Decimal('1.50')))
+        self.assertEqual(self.links(tee), (['Blue'], ['L'], ['cotton']))
+        self.assertMasks(tee)
+        self.assertEqual(Product.objects.count(), 2)
+
+    def assertMasks(self, product):
+        color_mask = size_mask = 0
+        for pk in product.colors.values_list('pk', flat=True):
+            color_mask |= variant_bit(pk)
+        for pk in product.sizes.values_list('pk', flat=True):
+            size_mask |= variant_bit(pk)
+        self.assertEqual((product.color_mask, product.size_mask), (color_mask, size_mask))
+
+    def test_partial_columns_keep_the_rest(self):
+        self.run_import('products.csv', (
+            'slug,name,price,discount_percentage,stock,colors\n'
+            'cap,Cap,10.00,20,7,Red\n'
+        ))
+        self.run_import('prices.csv', 'slug,name,price\ncap,Cap,15.00\n')
+        cap = Product.objects.get(slug='cap')
+        self.assertEqual((cap.price, cap.discount_percentage, cap.stock), (Decimal('15.00'), 20, 7))
+        self.assertEqual(cap.effective_price, Decimal('12.00'))
+        self.assertEqual(self.links(cap)[0], ['Red'])
+
+        self.run_import('discounts.jsonl', '{"slug": "cap", "name": "Cap", "price": "15.00", "discount_percentage": 50}\n')
+        cap.refresh_from_db()
+        self.assertEqual(cap.effective_price, Decimal('7.50'))
+
+    def test_rows_with_different_columns(self):
+        self.run_import('products.csv', (
+            'slug,name,price,discount_percentage,stock,colors,tags\n'
+            'cap,Cap,10.00,20,7,Red,wool\n'
+            'scarf,Scarf,30.00,10,2,Blue,wool\n'
+        ))
+        # Each JSON row only touches the keys it has, whichever row comes first
+        self.run_import('mixed.jsonl', (
+            '{"slug": "cap", "name": "Cap", "price": "12.00"}\n'
+            '{"slug": "scarf", "name": "Scarf", "price": "30.00", "stock": 5, "colors": ["Green"]}\n'
+            '{"slug": "beanie", "name": "Beanie", "price": "8.00", "tags": "wool, winter"}\n'
+        ))
+        cap, scarf, beanie = (Product.objects.get(slug=slug) for slug in ('cap', 'scarf', 'beanie'))
+        self.assertEqual((cap.price, cap.discount_percentage, cap.stock), (Decimal('12.00'), 20, 7))
+        self.assertEqual(self.links(cap), (['Red'], [], ['wool']))
+        self.assertEqual((scarf.stock, scarf.effective_price), (5, Decimal('27.00')))
+        self.assertEqual(self.links(scarf), (['Green'], [], ['wool']))
+        self.assertEqual(self.links(beanie), ([], [], ['winter', 'wool']))
+        self.assertMasks(cap)
+        self.assertMasks(scarf)
+
+    def test_empty_cells_are_absent(self):
+        self.run_import('products.csv', 'slug,name,price,discount_percentage,stock\ncap,Cap,10.00,20,7\n')
+        self.run_import('update.csv', (
+            'slug,name,price,discount_percentage,stock,is_featured\n'
+            'cap,Cap,10.00,,3,\n'
+            'mitten,Mitten,4.00,,,\n'
+        ))
+        cap, mitten = Product.objects.get(slug='cap'), Product.objects.get(slug='mitten')
+        self.assertEqual((cap.discount_percentage, cap.stock, cap.effective_price), (20, 3, Decimal('8.00')))
+        self.assertEqual((mitten.discount_percentage, mitten.stock, mitten.is_featured), (0, 0, False))
+
+    def test_bad_rows(self):
+        for text, message in (
+            ('slug,name\nbad,Bad\n', 'Line 2: missing price'),
+            ('slug,name,price\nbad,Bad,cheap\n', "Line 2: invalid price 'cheap'"),
+            ('slug,name,price,sizes\nbad,Bad,1,S:big\n', 'Line 2: invalid colors or sizes'),
+        ):
+            with self.subTest(message=message):
+                with self.assertRaisesMessage(RowError, message):
+                    self.run_import('bad.csv', text)
+        self.assertFalse(Product.objects.exists())
+
+        # Batches before the failing row stay imported
+        with self.assertRaises(RowError):
+            self.run_import('mixed.csv', 'name,price\nOne,1\nTwo,2\nThree,\n', batch_size=2)
+        self.assertEqual(sorted(Product.objects.values_list('slug', flat=True)), ['one', 'two'])
+
+    def test_jsonl_links(self):
+        self.run_import('products.jsonl', (
+            '{"name": "Scarf", "price": 12, "colors": [{"name": "Teal", "hex_code": "#008080"}],'
+            ' "sizes": [{"name": "One", "order": 3}], "tags": "wool"}\n'
+        ))
+        scarf = Product.objects.get(slug='scarf')
+        self.assertEqual(self.links(scarf), (['Teal'], ['One'], ['wool']))
+        self.assertEqual(Size.objects.get(name='One').order, 3)
+        self.assertMasks(scarf)
+
+
+class RatingAggregateTests(TestCase):
+    """Review signals maintain the rating columns and product saves leave them alone"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Hat', description='Hat', price=Decimal('20.00'))
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+
+    def review(self, user, rating, is_approved=True):
+        return Review.objects.create(product=self.product, user=user, rating=rating,
+                                     comment='Fine', is_approved=is_approved)
+
+    def assertRatings(self, count, average, histogram):
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.rating_count, count)
+        self.assertEqual(product.rating_sum, sum(star * n for star, n in histogram.items()))
+        self.assertAlmostEqual(product.average_rating, average)
+        self.assertEqual(product.rating_histogram, {star: histogram.get(star, 0) for star in range(1, 6)})
+
+    def test_review_lifecycle(self):
+        first = self.review(self.alice, 5)
+        pending = self.review(self.bob, 2, is_approved=False)
+        self.assertRatings(1, 5.0, {5: 1})
+
+        pending.is_approved = True
+        pending.save()
+        self.assertRatings(2, 3.5, {5: 1, 2: 1})
+
+        first.rating = 3
+        first.save()
+        self.assertRatings(2, 2.5, {3: 1, 2: 1})
+
+        pending.is_approved = False
+        pending.save()
+        self.assertRatings(1, 3.0, {3: 1})
+
+        first.delete()
+        self.assertRatings(0, 0.0, {})
+
+    def test_stale_product_save_keeps_aggregates(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.review(self.alice, 4)
+        Product.objects.filter(pk=self.product.pk).update(views_count=F('views_count') + 7)
+        stale.name = 'Wool hat'
+        stale.stock = 3
+        stale.save()
+
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.name, product.stock, product.views_count), ('Wool hat', 3, 7))
+        self.assertRatings(1, 4.0, {4: 1})
+
+    def test_deferred_reviews(self):
+        first = self.review(self.alice, 5)
+        self.review(self.bob, 3)
+        self.assertEqual(len(Review.objects.only('id')), 2)
+
+        deferred = Review.objects.only('id', 'comment').get(pk=first.pk)
+        deferred.rating = 1
+        deferred.save()
+        self.assertRatings(2, 2.0, {1: 1, 3: 1})
+
+        Review.objects.only('id').get(pk=first.pk).delete()
+        self.assertRatings(1, 3.0, {3: 1})
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages walk the listing exactly once and reject foreign cursors"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Five products per price, so 12-row pages split runs of equal keys
+        for index in range(30):
+            Product.objects.create(
+                name=f'Sock {index}', description='Sock', price=Decimal(10 + index // 5)
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @staticmethod
+    def cursor(url):
+        return parse_qs(urlsplit(url).query)['cursor'][0]
+
+    def expected(self, *ordering):
+        return list(Product.objects.order_by(*ordering).values_list('pk', flat=True))
+
+    def walk(self, url):
+        pages = [self.page(url)]
+        while pages[-1]['next']:
+            pages.append(self.page(pages[-1]['next']))
+        return pages
+
+    def test_round_trip(self):
+        pages = self.walk('/api/products/?cursor=')
+        ids = [item['id'] for page in pages for item in page['results']]
+        self.assertEqual(ids, self.expected('-created_at', '-pk'))
+        self.assertNotIn('count', pages[0])
+        self.assertIsNone(pages[0]['previous'])
+
+        backwards = [pages[-1]]
+        while backwards[-1]['previous']:
+            backwards.append(self.page(backwards[-1]['previous']))
+        self.assertEqual(
+            [[item['id'] for item in page['results']] for page in backwards],
+            [[item['id'] for item in page['results']] for page in reversed(pages)]
+        )
+
+    def test_ties_on_ordering_column(self):
+        for ordering in ('price', '-price'):
+            with self.subTest(ordering=ordering):
+                pages = self.walk(f'/api/products/?cursor=&ordering={ordering}')
+                ids = [item['id'] for page in pages for item in page['results']]
+                self.assertEqual(ids, self.expected(ordering, f'{ordering[:-5]}pk'))
+
+    def test_cursor_from_another_ordering(self):
+        next_url = self.page('/api/products/?cursor=&ordering=price')['next']
+        response = self.client.get(f'/api/products/?ordering=-created_at&cursor={self.cursor(next_url)}')
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        def encode(cursor):
+            return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+        ordering = ['-created_at', '-pk']
+        for cursor in ('!!!', encode([1]), encode({'o': ordering, 'r': 0}),
+                       encode({'o': ordering, 'p': 'x', 'r': 0}),
+                       encode({'o': ordering, 'p': [1], 'r': 0}),
+                       encode({'o': ordering, 'p': ['yesterday', 1], 'r': 0}),
+                       encode({'o': ordering, 'p': [None, 1], 'r': 0}),
+                       encode({'o': ordering, 'p': ['2024-01-01T00:00:00Z', 'x'], 'r': 0})):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/products/?cursor={cursor}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.json())
+
+
+class CategoryTreeTests(TestCase):
+    """The category tree is resolved once per request, not once per node"""
+
+    def test_one_version_lookup_per_request(self):
+        for index in range(3):
+            root = Category.objects.create(name=f'Root {index}')
+            child = Category.objects.create(name=f'Child {index}', parent=root)
+            Category.objects.create(name=f'Leaf {index}', parent=child)
+
+        with mock.patch.object(catalog_cache, 'get_version', wraps=catalog_cache.get_version) as get_version:
+            response = self.client.get('/api/categories/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['children'][0]['children'][0]['name'], 'Leaf 0')
+        namespaces = [call.args[0] for call in get_version.call_args_list]
+        self.assertEqual(namespaces.count('categories'), 1)
+
+    def test_facets_use_the_request_tree(self):
+        root = Category.objects.create(name='Root')
+        Product.objects.create(name='Tee', description='Tee', price=Decimal('10.00'), category=root)
+        request = Request(APIRequestFactory().get('/api/products/facets/'))
+        tree = catalog_cache.get_category_tree(request)
+
+        with mock.patch.object(catalog_cache, 'get_version', wraps=catalog_cache.get_version) as get_version:
+            counts = facet_counts(Product.objects.all(), request)
+        self.assertIs(request._request._category_tree, tree)
+        self.assertNotIn('categories', [call.args[0] for call in get_version.call_args_list])
+        self.assertEqual(counts['categories'][0]['count'], 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_DERIVATIVES='inline')
+class ImageDerivativeTests(TestCase):
+    """Uploads are rendered into sized WebP/JPEG variants"""
+
+    def upload(self, name, size, mode='RGBA'):
+        buffer = BytesIO()
+        Image.new(mode, size, 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_renders_variants_and_primary_copy(self):
+        product = Product.objects.create(name='Tee', description='Tee', price=Decimal('10.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=product, image=self.upload('tee.png', (800, 1000)))
+
+        image.refresh_from_db()
+        product.refresh_from_db()
+        variants = image.derivatives['variants']
+        self.assertEqual(image.derivatives['source'], image.image.name)
+        self.assertEqual([(v['name'], v['width']) for v in variants], [('thumb', 200), ('card', 480), ('zoom', 800)])
+        self.assertEqual(product.primary_image_derivatives, image.derivatives)
+        with default_storage.open(variants[0]['webp']) as handle, Image.open(handle) as thumb:
+            self.assertEqual((thumb.format, thumb.size), ('WEBP', (200, 250)))
+
+    def test_replaced_upload_drops_stale_results(self):
+        product = Product.objects.create(name='Cap', description='Cap', price=Decimal('10.00'))
+        image = ProductImage.objects.create(product=product, image=self.upload('cap.png', (100, 100), 'RGB'))
+        old_name = image.image.name
+        image.image = self.upload('cap2.png', (100, 100), 'RGB')
+        image.save()
+
+        self.assertFalse(generate(image.pk, old_name))
+        self.assertTrue(generate(image.pk, image.image.name))
+        image.refresh_from_db()
+        self.assertEqual(len(image.derivatives['variants']), 1)
+        # The dropped rendering left no files behind
+        self.assertEqual(self.stored(image.derivatives), [True, True])
+        old_stem = old_name.rsplit('/', 1)[-1].replace('.', '_') + '-'
+        self.assertFalse([name for name in default_storage.listdir('products/derived')[1]
+                          if name.startswith(old_stem)])
+
+    @staticmethod
+    def stored(derivatives):
+        return [default_storage.exists(variant[key])
+                for variant in derivatives['variants'] for key in ('webp', 'jpeg')]
+
+    def test_replaced_and_deleted_uploads_remove_files(self):
+        product = Product.objects.create(name='Bag', description='Bag', price=Decimal('10.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=product, image=self.upload('bag.png', (300, 300), 'RGB'))
+        image.refresh_from_db()
+        old = image.derivatives
+        self.assertEqual(self.stored(old), [True] * 4)
+
+        image.image = self.upload('bag2.png', (300, 300), 'RGB')
+        with self.captureOnCommitCallbacks(execute=True):
+            image.save()
+        image.refresh_from_db()
+        self.assertEqual(self.stored(old), [False] * 4)
+        self.assertEqual(self.stored(image.derivatives), [True] * 4)
+
+        new = image.derivatives
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(self.stored(new), [False] * 4)
+
+
+class MediaURLResolverTests(TestCase):
+    """The per-request resolver must emit the URLs build_absolute_uri did"""
+
+    def test_matches_storage_urls(self):
+        request = Request(APIRequestFactory().get('/api/products/'))
+        resolver = media_url_resolver(request)
+        self.assertIs(media_url_resolver(request), resolver)
+        for name in ('products/a.jpg', 'products/my shirt (1).jpg', 'products/футболка.webp', 'a/b?c#d.png'):
+            self.assertEqual(resolver(name), request.build_absolute_uri(default_storage.url(name)))
+            self.assertEqual(media_url_resolver()(name), default_storage.url(name))
+
+    @override_settings(MEDIA_BASE_URL='https://cdn.example.com/media')
+    def test_configured_prefix(self):
+        request = Request(APIRequestFactory().get('/api/products/'))
+        self.assertEqual(
+            media_url_resolver(request)('products/a b.jpg'),
+            'https://cdn.example.com/media/products/a%20b.jpg'
+        )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_DERIVATIVES='off')
+class CatalogSnapshotTests(TestCase):
+    """Listings served from the NumPy snapshot match the queryset path"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ScaleSeeder(200, log=lambda message: None).run()
+
+    def listing(self, query, snapshot):
+        cache.clear()
+        with override_settings(CATALOG_SNAPSHOT=snapshot):
+            response = self.client.get(f'/api/products/?{query}')
+        if response.status_code != 200:
+            return response.status_code
+        return response.json()['count'], [item['id'] for item in response.json()['results']]
+
+    def test_parity(self):
+        category = Category.objects.filter(products__isnull=False).first()
+        color, size = Color.objects.first(), Size.objects.last()
+        queries = [
+            '',
+            'page=3',
+            'page=99',
+            f'category={category.slug}',
+            f'category={category.slug}&ordering=price',
+            f'colors={color.pk}&sizes={size.pk}&ordering=-price',
+            'min_price=50000&max_price=200000.5&ordering=-average_rating,price',
+            'on_sale=true&in_stock=true&ordering=views_count,-created_at',
+            'is_new=true&is_featured=true&ordering=-created_at',
+            'category=missing',
+        ]
+        for query in queries:
+            with self.subTest(query=query):
+                self.assertEqual(self.listing(query, True), self.listing(query, False))
+
+    @override_settings(CATALOG_SNAPSHOT=True)
+    def test_changes_patch_snapshot(self):
+        def cheapest():
+            return self.client.get('/api/products/?ordering=price').json()['results'][0]['id']
+
+        cache.clear()
+        first = cheapest()
+        product = Product.objects.filter(is_active=True).exclude(pk=first).first()
+        with mock.patch.object(CatalogSnapshot, 'load', wraps=CatalogSnapshot.load) as load:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.price, product.discount_percentage = Decimal('0.01'), 0
+                product.save()
+                self.assertEqual(cheapest(), product.pk)
+            # Published again after commit, and patched again
+            self.assertEqual(cheapest(), product.pk)
+            with self.captureOnCommitCallbacks(execute=True):
+                product.is_active = False
+                product.save()
+            self.assertEqual(cheapest(), first)
+            patched = get_catalog_snapshot()
+            load.assert_not_called()
+
+            Category.objects.create(name='Outlet')
+            cheapest()
+            load.assert_called_once()
+        loaded = CatalogSnapshot.load()
+        for name, _, _ in COLUMNS:
+            self.assertEqual(getattr(patched, name).tolist(), getattr(loaded, name).tolist())
+
+    @override_settings(CATALOG_SNAPSHOT=True)
+    def test_unsignalled_columns_and_local_cache(self):
+        snapshot = get_catalog_snapshot()
+        self.assertIsNone(snapshot.select({}, ['-views_count']))
+        self.assertIs(get_catalog_snapshot(), snapshot)
+        with override_settings(CATALOG_LOCAL_CACHE_TIMEOUT=0):
+            self.assertIsNot(get_catalog_snapshot(), snapshot)
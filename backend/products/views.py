@@ -1,11 +1,18 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Avg
+from django.db.models import Q, Avg, Count
+from django.http import Http404
 
-from .models import Category, Color, Size, Product, Review
+from config.pagination import KeysetPagination
+
+from .cache import cache_response, conditional_response, get_category_tree
+from .counters import record_view
+from .facets import facet_counts
+from .filters import FullTextSearchFilter, SearchRankOrderingFilter
+from .models import Category, Color, Size, Product, ProductTag, Review, parse_tags
 from .serializers import (
     CategorySerializer,
     ColorSerializer,
@@ -15,6 +22,7 @@ from .serializers import (
     ProductCreateUpdateSerializer,
     ReviewSerializer
 )
+from .snapshot import SnapshotResults, get_catalog_snapshot
 
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
@@ -28,33 +36,65 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
             return [IsAdminUser()]
         return [AllowAny()]
 
+    @conditional_response
+    def list(self, request, *args, **kwargs):
+        """List top-level categories from the cached category tree"""
+        roots = get_category_tree(request).roots
+        page = self.paginate_queryset(roots)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(roots, many=True)
+        return Response(serializer.data)
+
+    @conditional_response
+    def retrieve(self, request, slug=None):
+        """Get a top-level category from the cached category tree"""
+        category = get_category_tree(request).by_slug.get(slug)
+        if category is None or category.parent_id is not None:
+            raise Http404
+        serializer = self.get_serializer(category)
+        return Response(serializer.data)
+
 
 class ColorViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for colors"""
     queryset = Color.objects.all()
     serializer_class = ColorSerializer
 
+    @conditional_response
+    def list(self, request, *args, **kwargs):
+        """List colors; unchanged catalogs answer 304"""
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class SizeViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for sizes"""
     queryset = Size.objects.all()
     serializer_class = SizeSerializer
 
+    @conditional_response
+    def list(self, request, *args, **kwargs):
+        """List sizes; unchanged catalogs answer 304"""
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class ProductViewSet(viewsets.ModelViewSet):
     """
     ViewSet for products with comprehensive filtering and search
     """
-    queryset = Product.objects.filter(is_active=True).select_related(
-        'category'
-    ).prefetch_related(
-        'colors',
-        'sizes',
-        'images'
-    )
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['name', 'description', 'tags']
-    ordering_fields = ['price', 'created_at', 'views_count']
+    queryset = Product.objects.filter(is_active=True)
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, SearchRankOrderingFilter]
+    pagination_class = KeysetPagination
+    ordering_fields = ['price', 'effective_price', 'created_at', 'views_count', 'average_rating']
     ordering = ['-created_at']
     lookup_field = 'slug'
 
@@ -78,32 +118,37 @@ class ProductViewSet(viewsets.ModelViewSet):
         if category_slug:
             queryset = queryset.filter(category__slug=category_slug)
 
-        # Filter by colors
+        # Filter by colors (variant bitmask, no join or DISTINCT)
         colors = self.request.query_params.get('colors', None)
         if colors:
             color_ids = [int(c) for c in colors.split(',')]
-            queryset = queryset.filter(colors__id__in=color_ids).distinct()
+            queryset = queryset.with_any_variant('colors', color_ids)
 
         # Filter by sizes
         sizes = self.request.query_params.get('sizes', None)
         if sizes:
             size_ids = [int(s) for s in sizes.split(',')]
-            queryset = queryset.filter(sizes__id__in=size_ids).distinct()
+            queryset = queryset.with_any_variant('sizes', size_ids)
 
-        # Filter by price range
+        # Filter by price range (the price after discount)
         min_price = self.request.query_params.get('min_price', None)
         max_price = self.request.query_params.get('max_price', None)
         if min_price:
-            queryset = queryset.filter(price__gte=min_price)
+            queryset = queryset.filter(effective_price__gte=min_price)
         if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+            queryset = queryset.filter(effective_price__lte=max_price)
 
-        # Filter by tags
+        # Filter by tags (all tags by default, any with tag_match=any)
         tags = self.request.query_params.get('tags', None)
-        if tags:
-            tag_list = tags.split(',')
-            for tag in tag_list:
-                queryset = queryset.filter(tags__icontains=tag)
+        slugs = list(parse_tags(tags))  # unique slugs; separators alone yield none
+        if slugs:
+            matches = ProductTag.objects.filter(tag__slug__in=slugs).values('product_id')
+            tag_match = self.request.query_params.get('tag_match', 'all')
+            if tag_match.lower() != 'any':
+                matches = matches.annotate(
+                    matched=Count('tag_id')
+                ).filter(matched=len(slugs)).values('product_id')
+            queryset = queryset.filter(pk__in=matches)
 
         # Filter for new arrivals
         is_new = self.request.query_params.get('is_new', None)
@@ -125,17 +170,46 @@ class ProductViewSet(viewsets.ModelViewSet):
         if in_stock and in_stock.lower() == 'true':
             queryset = queryset.filter(stock__gt=0)
 
+        return self.optimize_queryset(queryset)
+
+    def optimize_queryset(self, queryset):
+        """Load only the relations needed by the requested fields (?fields=, ?expand=)"""
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'get_lookups'):
+            select, prefetch = serializer_class.get_lookups(self.request)
+            queryset = queryset.select_related(*select).prefetch_related(*prefetch)
         return queryset
 
+    @conditional_response
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        """List products, cached under the catalog version"""
+        snapshot = get_catalog_snapshot()
+        if snapshot is not None:
+            ordering = SearchRankOrderingFilter().get_ordering(request, self.queryset, self)
+            ids = snapshot.select(request.query_params, ordering or [])
+            if ids is not None:
+                # Filtered and ordered in memory; only the page's rows are loaded
+                page = self.paginate_queryset(SnapshotResults(ids, self.optimize_queryset(self.queryset)))
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response
+    @cache_response
     def retrieve(self, request, *args, **kwargs):
-        """Increment view count on product detail view"""
-        instance = self.get_object()
-        instance.views_count += 1
-        instance.save(update_fields=['views_count'])
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        """Product detail; the view is counted even when served from cache"""
+        return super().retrieve(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.action == 'retrieve' and response.status_code in (200, 304):
+            # Buffered and flushed in batches, off the read path
+            record_view(kwargs.get(self.lookup_field))
+        return super().finalize_response(request, response, *args, **kwargs)
 
     @action(detail=False, methods=['get'])
+    @conditional_response
+    @cache_response
     def featured(self, request):
         """Get featured products"""
         products = self.get_queryset().filter(is_featured=True)[:8]
@@ -143,6 +217,8 @@ class ProductViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @conditional_response
+    @cache_response
     def new_arrivals(self, request):
         """Get new arrival products"""
         products = self.get_queryset().filter(is_new=True)[:8]
@@ -150,28 +226,92 @@ class ProductViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @conditional_response
+    @cache_response
     def on_sale(self, request):
         """Get products on sale"""
         products = self.get_queryset().filter(discount_percentage__gt=0)[:8]
         serializer = ProductListSerializer(products, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    @conditional_response
+    @cache_response
+    def facets(self, request):
+        """Get facet counts for the current filters, in one aggregate query"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(facet_counts(queryset, request))
+
     @action(detail=True, methods=['get'])
+    @conditional_response
+    @cache_response
     def related(self, request, slug=None):
-        """Get related products (same category)"""
+        """Get related products (bought together, then same category)"""
         product = self.get_object()
-        related_products = Product.objects.filter(
-            category=product.category,
-            is_active=True
-        ).exclude(id=product.id)[:4]
+        limit = 4
+
+        # Precomputed by the build_recommendations command
+        related_ids = list(
+            product.recommendations.filter(related__is_active=True).values_list('related_id', flat=True)[:limit]
+        )
+        queryset = self.optimize_queryset(self.queryset)
+        products = {p.pk: p for p in queryset.filter(pk__in=related_ids)}
+        related_products = [products[pk] for pk in related_ids if pk in products]
+
+        if len(related_products) < limit:
+            related_products += queryset.filter(
+                category=product.category
+            ).exclude(id__in=related_ids + [product.id])[:limit - len(related_products)]
+
         serializer = ProductListSerializer(related_products, many=True, context={'request': request})
         return Response(serializer.data)
 
 
+class HomeViewSet(viewsets.ViewSet):
+    """
+    Homepage sections (featured, new arrivals, on sale, categories) in one
+    response. Section ids come from three indexed id queries; the union is
+    loaded with one batched prefetch and every product is serialized once.
+    """
+    permission_classes = [AllowAny]
+    section_size = 8
+    sections = {
+        'featured': Q(is_featured=True),
+        'new_arrivals': Q(is_new=True),
+        'on_sale': Q(discount_percentage__gt=0),
+    }
+
+    @conditional_response
+    @cache_response
+    def list(self, request):
+        """Get all homepage sections, cached under the catalog version"""
+        products = Product.objects.filter(is_active=True)
+        section_ids = {
+            name: list(products.filter(condition).values_list('pk', flat=True)[:self.section_size])
+            for name, condition in self.sections.items()
+        }
+        unique_ids = {pk for ids in section_ids.values() for pk in ids}
+
+        select, prefetch = ProductListSerializer.get_lookups(request)
+        queryset = products.filter(pk__in=unique_ids).select_related(*select).prefetch_related(*prefetch)
+        loaded = list(queryset)
+        context = {'request': request}
+        rendered = dict(zip(
+            (product.pk for product in loaded),
+            ProductListSerializer(loaded, many=True, context=context).data
+        ))
+
+        data = {name: [rendered[pk] for pk in ids if pk in rendered] for name, ids in section_ids.items()}
+        data['categories'] = CategorySerializer(get_category_tree(request).roots, many=True, context=context).data
+        return Response(data)
+
+
 class ReviewViewSet(viewsets.ModelViewSet):
     """ViewSet for product reviews"""
-    queryset = Review.objects.filter(is_approved=True)
+    # user_name and user_avatar read the author of every review
+    queryset = Review.objects.filter(is_approved=True).select_related('user')
     serializer_class = ReviewSerializer
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
         if self.action in ['create']:
@@ -1,10 +1,19 @@
 from rest_framework import serializers
 from .models import Wishlist
-from products.serializers import ProductListSerializer
+from products.serializers import ProductListSerializer, SparseFieldsMixin
 
 
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for wishlist items"""
+    expandable_fields = {
+        'product': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+    }
+    related_lookups = {
+        'product': ('select', 'product'),
+    }
+    nested_serializers = {
+        'product': ProductListSerializer,
+    }
     product = ProductListSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
 
@@ -16,11 +16,11 @@ class WishlistViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Get wishlist items for current user"""
+        select, prefetch = WishlistSerializer.get_lookups(self.request)
         return Wishlist.objects.filter(user=self.request.user).select_related(
-            'product'
+            *select
         ).prefetch_related(
-            'product__images',
-            'product__category'
+            *prefetch
         )
 
     def create(self, request):